@@ -1,12 +1,40 @@
 # ai/__init__.py
-from .rule_engine import apply_rules
-from .intent_classifier import predict_intent
-from .risk_tgn import predict_risk_advanced
-from .assignment_bandit import suggest_assignee_bandit
-from .task_ordering import suggest_task_order
-from .db_integration import get_task_context
-from .llm_client import generate_response
+# Import lười: `from ai import predict_intent` chỉ load submodule chứa hàm đó ở lần dùng đầu,
+# đường rule / intent không phải kéo theo torch, ollama... của các module khác.
+import importlib
 
+_EXPORTS = {
+    "apply_rules": "rule_engine",
+    "apply_rules_batch": "rule_engine",
+    "predict_intent": "intent_classifier",
+    "predict_intents": "intent_classifier",
+    "predict_risk_advanced": "risk_tgn",
+    "predict_risk_bulk": "risk_tgn",
+    "suggest_assignee_bandit": "assignment_bandit",
+    "suggest_task_order": "task_ordering",
+    "get_task_context": "db_integration",
+    "get_task_contexts": "db_integration",
+    "generate_response": "llm_client",
+}
 
-predict_risk = predict_risk_advanced
-suggest_assignee = suggest_assignee_bandit
\ No newline at end of file
+# Tên cũ
+_ALIASES = {
+    "predict_risk": "predict_risk_advanced",
+    "suggest_assignee": "suggest_assignee_bandit",
+}
+
+__all__ = list(_EXPORTS) + list(_ALIASES)
+
+
+def __getattr__(name: str):
+    target = _ALIASES.get(name, name)
+    module = _EXPORTS.get(target)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), target)
+    globals()[name] = value  # lần sau lấy thẳng, không qua __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -4,18 +4,39 @@ import pickle
 import os
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Tuple
 import logging
+import time
 from sqlalchemy import text
 import pytz
 
+from .linucb_engine import BatchLinUCB
+from .model_registry import registry
+from .candidate_index import candidate_index
+from .bandit_store import load_agent, migrate_pickle, store_lock
+from .bandit_retrain import retrain_from_history
+from metrics import stage
+
 MODEL_DIR = "models"
-MODEL_PATH = os.path.join(MODEL_DIR, "linucb_assignment.pkl")
+MODEL_PATH = os.path.join(MODEL_DIR, "linucb_assignment.pkl")  # định dạng cũ, chỉ còn dùng để migrate
+STORE_PATH = os.path.join(MODEL_DIR, "linucb_assignment.lucb")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def _load_linucb() -> BatchLinUCB:
+    # Không nuốt lỗi như BatchLinUCB.load: file hỏng → registry giữ bản cũ
+    if not os.path.exists(STORE_PATH):
+        if not os.path.exists(MODEL_PATH):
+            return BatchLinUCB(n_features=5, alpha=1.5)
+        with store_lock(STORE_PATH):
+            if not os.path.exists(STORE_PATH):  # RewardApplier có thể vừa migrate xong
+                migrate_pickle(MODEL_PATH, STORE_PATH)
+    return load_agent(STORE_PATH)
+
+registry.register("linucb", [STORE_PATH, MODEL_PATH], _load_linucb)
+
 class LinUCB:
     def __init__(self, n_features: int, alpha: float = 1.0):
         self.alpha = alpha
@@ -77,6 +98,20 @@ class LinUCB:
             return cls(n_features=5, alpha=1.5)
 
 
+def _urgency(due_date) -> float:
+    if not due_date:
+        return 1.0
+    # ← FIX: Đồng bộ timezone
+    now = datetime.now(pytz.UTC)  # hoặc pytz.timezone('Asia/Ho_Chi_Minh')
+    if due_date.tzinfo is None:
+        due_date = pytz.UTC.localize(due_date)  # nếu DB trả naive
+    days_left = (due_date - now).days
+    if days_left == -1:
+        # Quá hạn 1 ngày: công thức chia cho 0 → cùng giá trị 0.1 như mọi task quá hạn khác
+        return 0.1
+    return max(0.1, min(1.0, 10.0 / (days_left + 1)))
+
+
 def get_context_vector(db: Session, user_id: int, task_id: int) -> np.ndarray:
     try:
         # 1. Skill match
@@ -94,14 +129,7 @@ def get_context_vector(db: Session, user_id: int, task_id: int) -> np.ndarray:
 
         # 3. Urgency
         due_date = db.execute(text("SELECT due_date FROM Tasks WHERE task_id = :tid"), {"tid": task_id}).scalar()
-        urgency = 1.0
-        if due_date:
-            # ← FIX: Đồng bộ timezone
-            now = datetime.now(pytz.UTC)  # hoặc pytz.timezone('Asia/Ho_Chi_Minh')
-            if due_date.tzinfo is None:
-                due_date = pytz.UTC.localize(due_date)  # nếu DB trả naive
-            days_left = (due_date - now).days
-            urgency = max(0.1, min(1.0, 10.0 / (days_left + 1)))
+        urgency = _urgency(due_date)
 
         # 4. Department match
         dept_match = db.execute(text("""
@@ -137,26 +165,119 @@ def get_context_vector(db: Session, user_id: int, task_id: int) -> np.ndarray:
         return np.array([0.0, 0.5, 0.0, 0.0, 0.5], dtype=float)
 
 
+# Cùng 5 feature như get_context_vector nhưng tính cho mọi ứng viên của 1 task trong 1 câu SQL
+CONTEXT_MATRIX_QUERY = text("""
+    WITH cand AS (
+        SELECT u.user_id, u.department_id
+        FROM Users u
+        WHERE u.user_id = ANY(:uids)
+    ),
+    skill AS (
+        SELECT us.user_id, AVG(us.level) AS skill_match
+        FROM User_Skills us
+        JOIN Task_Required_Skills trs ON us.skill_name = trs.skill_name
+        WHERE trs.task_id = :tid AND us.level >= trs.required_level
+          AND us.user_id = ANY(:uids)
+        GROUP BY us.user_id
+    ),
+    load AS (
+        SELECT user_id, COUNT(*) AS workload
+        FROM TaskAssignments
+        WHERE user_id = ANY(:uids)
+        GROUP BY user_id
+    ),
+    dept AS (
+        SELECT u2.department_id, COUNT(*) AS n
+        FROM Users u2
+        JOIN TaskAssignments ta ON ta.user_id = u2.user_id
+        WHERE ta.task_id = :tid
+        GROUP BY u2.department_id
+    ),
+    hist AS (
+        SELECT th.user_id,
+               AVG(CASE WHEN th.status_after_update = 'done' THEN 1.0 ELSE 0.0 END) AS past_success
+        FROM Taskhistories th
+        JOIN TaskAssignments ta ON th.task_id = ta.task_id AND ta.user_id = th.user_id
+        WHERE th.user_id = ANY(:uids)
+        GROUP BY th.user_id
+    )
+    SELECT c.user_id,
+           COALESCE(s.skill_match, 0.0) AS skill_match,
+           COALESCE(l.workload, 0) AS workload,
+           COALESCE(d.n, 0) AS dept_match,
+           h.past_success
+    FROM cand c
+    LEFT JOIN skill s ON s.user_id = c.user_id
+    LEFT JOIN load l ON l.user_id = c.user_id
+    LEFT JOIN dept d ON d.department_id = c.department_id
+    LEFT JOIN hist h ON h.user_id = c.user_id
+""")
+
+
+def get_context_matrix(db: Session, task_id: int, user_ids=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Bản set-based của get_context_vector: trả về (user_ids, X) với X có shape (N, 5).
+
+    user_ids=None → lấy toàn bộ Users. Thứ tự hàng của X khớp với user_ids trả về.
+    """
+    if user_ids is None:
+        user_ids = [r[0] for r in db.execute(text("SELECT user_id FROM Users ORDER BY user_id")).fetchall()]
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    X = np.tile(np.array([0.0, 0.5, 0.0, 0.0, 0.5], dtype=float), (len(user_ids), 1))
+    if len(user_ids) == 0:
+        return user_ids, X
+
+    try:
+        due_date = db.execute(text("SELECT due_date FROM Tasks WHERE task_id = :tid"), {"tid": task_id}).scalar()
+        rows = db.execute(CONTEXT_MATRIX_QUERY, {"tid": task_id, "uids": user_ids.tolist()}).fetchall()
+    except Exception as e:
+        logger.error(f"get_context_matrix error: {e}")
+        return user_ids, X
+
+    pos = {uid: i for i, uid in enumerate(user_ids.tolist())}
+    X[:, 2] = _urgency(due_date)
+    for uid, skill_match, workload, dept_match, past_success in rows:
+        i = pos[uid]
+        X[i, 0] = float(skill_match or 0.0)
+        X[i, 1] = min(float(workload or 0) / 10.0, 1.0)
+        X[i, 3] = float(dept_match or 0)
+        # giống get_context_vector: NULL hoặc 0 đều về 0.5
+        X[i, 4] = float(past_success or 0.5)
+    return user_ids, X
+
+
 def suggest_assignee_bandit(task_id: int, db: Session, top_k: int = 3) -> List[Dict]:
     # Kiểm tra task tồn tại
     exists = db.execute(text("SELECT 1 FROM Tasks WHERE task_id = :tid"), {"tid": task_id}).fetchone()
     if not exists:
         return []
 
-    agent = LinUCB.load(MODEL_PATH)
-    users = db.execute(text("SELECT user_id, first_name || ' ' || last_name AS name FROM Users")).fetchall()
+    agent = registry.get("linucb")
+    # Chỉ chấm điểm user Active có skill task cần / cùng phòng ban (+ vài user khám phá)
+    candidates = candidate_index.candidates(db, task_id)
+    if len(candidates) == 0:
+        return []
+
+    t0 = time.perf_counter()
+    users = db.execute(text("""
+        SELECT user_id, first_name || ' ' || last_name AS name FROM Users WHERE user_id = ANY(:uids)
+    """), {"uids": candidates.tolist()}).fetchall()
+    names = {user_id: name for user_id, name in users}
+
+    with stage("features.assignment"):
+        user_ids, X = get_context_matrix(db, task_id, [user_id for user_id, _ in users])
+    with stage("inference.assignment"):
+        scores = agent.predict_batch(user_ids, X)
+    candidate_index.record_scoring(len(user_ids), time.perf_counter() - t0)
 
     scored = []
-    for user_id, name in users:
-        context = get_context_vector(db, user_id, task_id)
-        ucb_score = agent.predict(user_id, context)
+    for user_id, context, ucb_score in zip(user_ids.tolist(), X, scores):
         reason = "Tiềm năng khám phá"
         if context[0] > 0.6: reason = "Kỹ năng phù hợp"
         if context[3] > 0: reason += ", Cùng phòng ban"
         if context[4] > 0.7: reason += ", Lịch sử tốt"
         scored.append({
             "user_id": user_id,
-            "name": name,
+            "name": names[user_id],
             "ucb_score": float(ucb_score),
             "reason": reason.strip(", ")
         })
@@ -164,25 +285,94 @@ def suggest_assignee_bandit(task_id: int, db: Session, top_k: int = 3) -> List[D
     scored.sort(key=lambda x: x["ucb_score"], reverse=True)
     return scored[:top_k]
 
-def retrain_bandit_from_history(db: Session):
-    history = db.execute(text("""
-        SELECT ta.user_id, th.task_id, 
-               CASE WHEN th.status_after_update = 'done' THEN 1.0 
-                    WHEN th.status_after_update = 'in_progress' THEN 0.5 
-                    ELSE 0.0 END AS reward
-        FROM TaskAssignments ta
-        JOIN Taskhistories th ON ta.task_id = th.task_id AND ta.user_id = th.user_id
-        WHERE th.status_after_update IS NOT NULL
-    """)).fetchall()
-
-    agent = LinUCB.load(MODEL_PATH) if os.path.exists(MODEL_PATH) else LinUCB(n_features=5)
-
-    for row in history:
-        user_id = row.user_id
-        task_id = row.task_id
-        reward = float(row.reward)  # ← CHUYỂN Decimal → float
-        context = get_context_vector(db, user_id, task_id)
-        agent.update(user_id, context, reward)
-
-    agent.save(MODEL_PATH)
-    logger.info("Bandit model retrained from history!")
\ No newline at end of file
+# Lịch sử → reward, đọc theo history_id để retrain tiếp từ watermark (ai/bandit_retrain.py)
+HISTORY_QUERY = text("""
+    SELECT th.history_id, ta.user_id, th.task_id,
+           CASE WHEN th.status_after_update = 'done' THEN 1.0
+                WHEN th.status_after_update = 'in_progress' THEN 0.5
+                ELSE 0.0 END AS reward
+    FROM Taskhistories th
+    JOIN TaskAssignments ta ON ta.task_id = th.task_id AND ta.user_id = th.user_id
+    WHERE th.status_after_update IS NOT NULL AND th.history_id > :after
+    ORDER BY th.history_id
+""")
+
+# Cùng feature như CONTEXT_MATRIX_QUERY nhưng cho 1 tập cặp (user_id, task_id) bất kỳ (cả chunk lịch sử)
+CONTEXT_PAIRS_QUERY = text("""
+    WITH pairs AS (
+        SELECT DISTINCT p.user_id, p.task_id
+        FROM unnest(CAST(:uids AS INTEGER[]), CAST(:tids AS INTEGER[])) AS p(user_id, task_id)
+    ),
+    skill AS (
+        SELECT p.user_id, p.task_id, AVG(us.level) AS skill_match
+        FROM pairs p
+        JOIN Task_Required_Skills trs ON trs.task_id = p.task_id
+        JOIN User_Skills us ON us.user_id = p.user_id AND us.skill_name = trs.skill_name
+                           AND us.level >= trs.required_level
+        GROUP BY p.user_id, p.task_id
+    ),
+    load AS (
+        SELECT user_id, COUNT(*) AS workload
+        FROM TaskAssignments
+        WHERE user_id IN (SELECT user_id FROM pairs)
+        GROUP BY user_id
+    ),
+    dept AS (
+        SELECT p.user_id, p.task_id, COUNT(*) AS n
+        FROM pairs p
+        JOIN Users u1 ON u1.user_id = p.user_id
+        JOIN TaskAssignments ta ON ta.task_id = p.task_id
+        JOIN Users u2 ON u2.user_id = ta.user_id AND u2.department_id = u1.department_id
+        GROUP BY p.user_id, p.task_id
+    ),
+    hist AS (
+        SELECT th.user_id,
+               AVG(CASE WHEN th.status_after_update = 'done' THEN 1.0 ELSE 0.0 END) AS past_success
+        FROM Taskhistories th
+        JOIN TaskAssignments ta ON th.task_id = ta.task_id AND ta.user_id = th.user_id
+        WHERE th.user_id IN (SELECT user_id FROM pairs)
+        GROUP BY th.user_id
+    )
+    SELECT p.user_id, p.task_id, t.due_date,
+           COALESCE(s.skill_match, 0.0) AS skill_match,
+           COALESCE(l.workload, 0) AS workload,
+           COALESCE(d.n, 0) AS dept_match,
+           h.past_success
+    FROM pairs p
+    LEFT JOIN Tasks t ON t.task_id = p.task_id
+    LEFT JOIN skill s ON s.user_id = p.user_id AND s.task_id = p.task_id
+    LEFT JOIN load l ON l.user_id = p.user_id
+    LEFT JOIN dept d ON d.user_id = p.user_id AND d.task_id = p.task_id
+    LEFT JOIN hist h ON h.user_id = p.user_id
+""")
+
+
+def get_context_pairs(db: Session, user_ids, task_ids) -> np.ndarray:
+    """Feature của get_context_matrix cho từng cặp (user_ids[i], task_ids[i]) → X (N, 5), 1 truy vấn."""
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    task_ids = np.asarray(task_ids, dtype=np.int64)
+    X = np.tile(np.array([0.0, 0.5, 0.0, 0.0, 0.5], dtype=float), (len(user_ids), 1))
+    if len(user_ids) == 0:
+        return X
+    rows = db.execute(CONTEXT_PAIRS_QUERY, {"uids": user_ids.tolist(), "tids": task_ids.tolist()}).fetchall()
+    features = {}
+    urgency = {}
+    for uid, tid, due_date, skill_match, workload, dept_match, past_success in rows:
+        if tid not in urgency:
+            urgency[tid] = _urgency(due_date)
+        features[(uid, tid)] = (float(skill_match or 0.0), min(float(workload or 0) / 10.0, 1.0),
+                                urgency[tid], float(dept_match or 0), float(past_success or 0.5))
+    for i, key in enumerate(zip(user_ids.tolist(), task_ids.tolist())):
+        f = features.get(key)
+        if f is not None:
+            X[i] = f
+    return X
+
+
+def retrain_bandit_from_history(db: Session, full: bool = False) -> dict:
+    # Stream lịch sử theo chunk, feature set-based, cộng thống kê đủ rồi nghịch đảo 1 lần (ai/bandit_retrain.py).
+    # Mặc định chỉ cộng lịch sử mới hơn watermark trong file .lucb; full=True → train lại từ đầu
+    summary = retrain_from_history(db, HISTORY_QUERY, get_context_pairs, STORE_PATH, _load_linucb, full=full)
+    registry.invalidate("linucb")
+    logger.info("Bandit model retrained from history!")
+    return summary
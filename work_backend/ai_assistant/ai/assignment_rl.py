@@ -3,13 +3,19 @@ import numpy as np
 import pickle
 import os
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List, Dict, Tuple
 import logging
 from sqlalchemy import text
 
+from .linucb_engine import BatchLinUCB
+from .bandit_store import load_agent, save_agent, migrate_pickle, store_lock
+from .bandit_retrain import retrain_from_history
+from .reward_log import append_reward
+
 MODEL_DIR = "models"
 MODEL_PATH = os.path.join(MODEL_DIR, "linucb_assignment.pkl")
+STORE_PATH = os.path.join(MODEL_DIR, "linucb_assignment.lucb")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 logging.basicConfig(level=logging.INFO)
@@ -146,8 +152,10 @@ def get_context_vector(db: Session, user_id: int, task_id: int) -> np.ndarray:
 
 def suggest_assignee_bandit(task_id: int, db: Session, top_k: int = 3) -> List[Dict]:
     # Load or init model
-    if os.path.exists(MODEL_PATH):
-        agent = LinUCB.load(MODEL_PATH)
+    if not os.path.exists(STORE_PATH) and os.path.exists(MODEL_PATH):
+        migrate_pickle(MODEL_PATH, STORE_PATH)
+    if os.path.exists(STORE_PATH):
+        agent = load_agent(STORE_PATH)
     else:
         agent = LinUCB(n_features=5, alpha=1.5)
 
@@ -186,53 +194,123 @@ def suggest_assignee_bandit(task_id: int, db: Session, top_k: int = 3) -> List[D
     return top_results
 
 def update_bandit_on_completion(db: Session, task_id: int, user_id: int, is_success: bool):
-    if not os.path.exists(MODEL_PATH):
-        return
-
-    agent = LinUCB.load(MODEL_PATH)
+    # Chỉ ghi reward vào log; RewardApplier (ai/reward_log.py) gom theo batch rồi cập nhật model
     context = get_context_vector(db, user_id, task_id)
     reward = 1.0 if is_success else 0.2
-    agent.update(user_id, context, reward)
-    agent.save(MODEL_PATH)
-    logger.info(f"Updated LinUCB for user {user_id}, task {task_id}, reward: {reward}")
-
-def retrain_bandit_from_history(db: Session):
-    agent = LinUCB(n_features=5, alpha=1.5)
-
-    # SỬA: Dùng text() để SQLAlchemy hiểu đây là SQL
-    query = text("""
-        SELECT 
-            th.task_id, 
-            ta.user_id,
-            CASE 
-                WHEN th.status_after_update = 'done' AND th.action LIKE '%Hoàn thành%' THEN 1 
-                ELSE 0 
-            END as success
+    append_reward(user_id, task_id, reward, context)
+    logger.info(f"Logged LinUCB reward for user {user_id}, task {task_id}, reward: {reward}")
+
+HISTORY_QUERY = text("""
+    SELECT
+        th.history_id,
+        ta.user_id,
+        th.task_id,
+        CASE
+            WHEN th.status_after_update = 'done' AND th.action LIKE '%Hoàn thành%' THEN 1.0
+            ELSE 0.1
+        END as reward
+    FROM Taskhistories th
+    JOIN TaskAssignments ta ON th.task_id = ta.task_id AND ta.user_id = th.user_id
+    WHERE th.action IN ('Hoàn thành', 'Cập nhật tiến độ', 'Quá hạn') AND th.history_id > :after
+    ORDER BY th.history_id
+""")
+
+# 5 feature của get_context_vector (bản này) cho cả 1 chunk cặp (user_id, task_id) trong 1 câu SQL
+CONTEXT_PAIRS_QUERY = text("""
+    WITH pairs AS (
+        SELECT DISTINCT p.user_id, p.task_id
+        FROM unnest(CAST(:uids AS INTEGER[]), CAST(:tids AS INTEGER[])) AS p(user_id, task_id)
+    ),
+    skill AS (
+        SELECT p.user_id, p.task_id,
+               AVG(GREATEST(0, COALESCE(us.level, 0) - trs.required_level + 1)) AS skill_match
+        FROM pairs p
+        JOIN Task_Required_Skills trs ON trs.task_id = p.task_id
+        LEFT JOIN User_skills us ON us.user_id = p.user_id AND us.skill_name = trs.skill_name
+        GROUP BY p.user_id, p.task_id
+    ),
+    active AS (
+        SELECT ta.user_id, COUNT(*) AS n
+        FROM TaskAssignments ta
+        JOIN TaskStatuses ts ON ts.task_id = ta.task_id AND ts.is_current = TRUE
+        WHERE ta.user_id IN (SELECT user_id FROM pairs)
+          AND ts.status_name NOT IN ('done', 'archived')
+        GROUP BY ta.user_id
+    ),
+    hist AS (
+        SELECT ta.user_id, AVG(CASE WHEN th.status_after_update = 'done' THEN 1.0 ELSE 0.0 END) AS past_success
         FROM Taskhistories th
-        JOIN TaskAssignments ta ON th.task_id = ta.task_id AND ta.user_id = th.user_id
-        WHERE th.action IN ('Hoàn thành', 'Cập nhật tiến độ', 'Quá hạn')
-        LIMIT 1000
-    """)
-
-    try:
-        history = db.execute(query).fetchall()
-        if not history:
-            logger.info("Không có dữ liệu lịch sử để train LinUCB → tạo model mới")
+        JOIN TaskAssignments ta ON th.task_id = ta.task_id
+        WHERE ta.user_id IN (SELECT user_id FROM pairs) AND th.action LIKE '%Hoàn thành%'
+        GROUP BY ta.user_id
+    )
+    SELECT p.user_id, p.task_id, t.due_date,
+           COALESCE(s.skill_match, 0.0) AS skill_match,
+           COALESCE(a.n, 0) AS active_tasks,
+           (pp.department_id IS NOT NULL AND pp.department_id = u.department_id) AS dept_match,
+           h.past_success
+    FROM pairs p
+    LEFT JOIN Tasks t ON t.task_id = p.task_id
+    LEFT JOIN ProjectParts pp ON pp.part_id = t.part_id
+    LEFT JOIN Users u ON u.user_id = p.user_id
+    LEFT JOIN skill s ON s.user_id = p.user_id AND s.task_id = p.task_id
+    LEFT JOIN active a ON a.user_id = p.user_id
+    LEFT JOIN hist h ON h.user_id = p.user_id
+""")
+
+
+def get_context_pairs(db: Session, user_ids, task_ids) -> np.ndarray:
+    # get_context_vector cho từng cặp (user_ids[i], task_ids[i]) → (N, 5) float32, 1 truy vấn cho cả chunk
+    user_ids = np.asarray(user_ids, dtype=np.int64)
+    task_ids = np.asarray(task_ids, dtype=np.int64)
+    X = np.tile(np.array([0.5, 0.0, 0.0, 0.0, 0.5], dtype=np.float32), (len(user_ids), 1))
+    if len(user_ids) == 0:
+        return X
+    rows = db.execute(CONTEXT_PAIRS_QUERY, {"uids": user_ids.tolist(), "tids": task_ids.tolist()}).fetchall()
+    now = datetime.now(timezone.utc)
+    features = {}
+    for uid, tid, due_date, skill_match, active_tasks, dept_match, past_success in rows:
+        if due_date is None:
+            days_left = 999
         else:
-            for task_id, user_id, success in history:
-                context = get_context_vector(db, user_id, task_id)
-                reward = 1.0 if success else 0.1
-                A, b = agent._get_user_params(user_id)
-                A += np.outer(context, context)
-                b += reward * context.reshape(-1, 1)
-            logger.info(f"LinUCB retrained từ {len(history)} bản ghi lịch sử!")
-
-        # Luôn save model (dù có dữ liệu hay không)
-        agent.save(MODEL_PATH)
-        logger.info("LinUCB model đã được lưu thành công!")
+            if due_date.tzinfo is None:
+                due_date = due_date.replace(tzinfo=timezone.utc)
+            days_left = (due_date - now).days
+        urgency = 1.0 if days_left < 3 else 0.5 if days_left < 7 else 0.0
+        workload = max(0, active_tasks - 3) * 0.3
+        features[(uid, tid)] = (float(skill_match), -workload, urgency, 1.0 if dept_match else 0.0,
+                                float(past_success or 0.5))
+    for i, key in enumerate(zip(user_ids.tolist(), task_ids.tolist())):
+        f = features.get(key)
+        if f is not None:
+            X[i] = f
+    return X
+
+
+def _load_agent() -> BatchLinUCB:
+    if not os.path.exists(STORE_PATH):
+        if not os.path.exists(MODEL_PATH):
+            return BatchLinUCB(n_features=5, alpha=1.5)
+        migrate_pickle(MODEL_PATH, STORE_PATH)
+    return load_agent(STORE_PATH)
+
+
+def retrain_bandit_from_history(db: Session) -> dict:
+    # Stream lịch sử theo chunk + feature set-based (ai/bandit_retrain.py) thay vì get_context_vector
+    # (5 query) cho từng dòng. Luôn train lại từ đầu như trước: file .lucb và history_watermark dùng chung
+    # với assignment_bandit (câu lịch sử / feature khác) → cộng tiếp từ watermark do module kia ghi sẽ
+    # bỏ sót lịch sử và trộn thống kê của 2 cách tính feature
+    try:
+        summary = retrain_from_history(db, HISTORY_QUERY, get_context_pairs, STORE_PATH, _load_agent, full=True)
+        if not summary["rows"]:
+            logger.info("Không có dữ liệu lịch sử mới để train LinUCB")
+        return summary
 
     except Exception as e:
         logger.warning(f"Lỗi khi retrain LinUCB: {e}")
-        # Vẫn tạo model rỗng nếu lỗi
-        agent.save(MODEL_PATH)
-        logger.info("Đã tạo model LinUCB mặc định (rỗng)")
\ No newline at end of file
+        # Vẫn tạo model rỗng nếu chưa có model nào
+        with store_lock(STORE_PATH):
+            if not os.path.exists(STORE_PATH):
+                save_agent(BatchLinUCB(n_features=5, alpha=1.5), STORE_PATH)
+                logger.info("Đã tạo model LinUCB mặc định (rỗng)")
+        return {"rows": 0, "users": 0, "error": str(e)}
@@ -0,0 +1,100 @@
+# ai/bandit_retrain.py
+# Retrain LinUCB từ Taskhistories, dùng chung cho assignment_bandit và assignment_rl (mỗi module có câu
+# lịch sử / reward và cách tính feature riêng, cùng ghi vào models/linucb_assignment.lucb):
+#   - đọc lịch sử bằng server-side cursor (stream_results) theo chunk, không fetchall() cả bảng
+#   - feature của cả chunk tính bằng 1 câu SQL set-based trên các cặp (user_id, task_id) khác nhau
+#   - thống kê đủ theo user (A += XᵀX, b += Xᵀr) gom bằng np.add.at, nghịch đảo A 1 lần ở cuối
+#   - incremental: chỉ đọc dòng có history_id > history_watermark trong header file .lucb;
+#     full=True → model mới từ đầu, đọc lại toàn bộ lịch sử
+# Phần đọc + tính feature chạy ngoài store_lock (RewardApplier vẫn publish được trong lúc đó),
+# chỉ bước cộng vào model + ghi file giữ lock.
+# Lưu ý: history_id là SERIAL → dòng có id nhỏ commit muộn hơn watermark sẽ bị bỏ qua tới lần full.
+import time
+import logging
+from typing import Callable, Dict
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .linucb_engine import BatchLinUCB
+from .bandit_store import save_agent, store_lock, read_header
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+
+class SufficientStats:
+    # Σ xxᵀ và Σ r·x theo user_id cho phần lịch sử đã đọc
+    def __init__(self, n_features: int):
+        self.n_features = n_features
+        self.A: Dict[int, np.ndarray] = {}
+        self.b: Dict[int, np.ndarray] = {}
+        self.rows = 0
+
+    def add(self, user_ids: np.ndarray, X: np.ndarray, rewards: np.ndarray):
+        if len(user_ids) == 0:
+            return
+        uids, inv = np.unique(user_ids, return_inverse=True)
+        d = self.n_features
+        A = np.zeros((len(uids), d, d))
+        b = np.zeros((len(uids), d))
+        np.add.at(A, inv, np.einsum('ni,nj->nij', X, X))
+        np.add.at(b, inv, rewards[:, None] * X)
+        for i, uid in enumerate(uids.tolist()):
+            if uid in self.A:
+                self.A[uid] += A[i]
+                self.b[uid] += b[i]
+            else:
+                self.A[uid] = A[i]
+                self.b[uid] = b[i]
+        self.rows += len(user_ids)
+
+    def apply(self, agent: BatchLinUCB):
+        if not self.A:
+            return
+        uids = list(self.A)
+        agent.add_statistics(uids, np.stack([self.A[u] for u in uids]), np.stack([self.b[u] for u in uids]))
+
+
+def retrain_from_history(db: Session, history_query, features: Callable, store_path: str,
+                         load: Callable[[], BatchLinUCB], full: bool = False,
+                         chunk_size: int = CHUNK_SIZE) -> dict:
+    """history_query: text() trả (history_id, user_id, task_id, reward), lọc history_id > :after,
+    ORDER BY history_id. features(db, user_ids, task_ids) → X (N, n_features) cùng thứ tự các dòng.
+    load() → agent hiện tại (dùng khi incremental). Trả số dòng / user đã cộng và watermark mới."""
+    t0 = time.perf_counter()
+    header = read_header(store_path)
+    after = 0 if full or header is None else int(header['history_watermark'])
+
+    stats = SufficientStats(n_features=5)
+    watermark = after
+    # stream_results → psycopg2 named cursor: mỗi lần lấy chunk_size dòng từ server
+    result = db.execute(history_query, {"after": after}, execution_options={"stream_results": True})
+    for chunk in result.partitions(chunk_size):
+        history_ids = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk))
+        user_ids = np.fromiter((r[1] for r in chunk), dtype=np.int64, count=len(chunk))
+        task_ids = np.fromiter((r[2] for r in chunk), dtype=np.int64, count=len(chunk))
+        rewards = np.fromiter((float(r[3]) for r in chunk), dtype=float, count=len(chunk))  # Decimal → float
+        stats.add(user_ids, np.asarray(features(db, user_ids, task_ids), dtype=float), rewards)
+        watermark = max(watermark, int(history_ids.max()))
+
+    with store_lock(store_path):
+        header = read_header(store_path)
+        current = int(header['history_watermark']) if header is not None else 0
+        if not full and current != after:
+            # Retrain khác vừa publish trong lúc đọc → cộng tiếp sẽ trùng lịch sử, bỏ kết quả lần này
+            logger.warning(f"Watermark đổi {after} → {current} trong lúc retrain, bỏ qua lần này")
+            return {"rows": 0, "users": 0, "watermark": current, "skipped": True}
+        if full:
+            agent = BatchLinUCB(n_features=5, alpha=1.5)
+        elif stats.rows == 0 and header is not None:
+            return {"rows": 0, "users": 0, "watermark": current}  # không có lịch sử mới, model giữ nguyên
+        else:
+            agent = load()  # chưa có file .lucb → load() migrate .pkl cũ hoặc trả model mới
+        stats.apply(agent)
+        save_agent(agent, store_path, history_watermark=watermark)
+
+    summary = {"rows": stats.rows, "users": len(stats.A), "watermark": watermark,
+               "seconds": round(time.perf_counter() - t0, 3)}
+    logger.info(f"LinUCB retrain ({'full' if full else f'từ history_id > {after}'}): {summary}")
+    return summary
@@ -0,0 +1,222 @@
+# ai/bandit_store.py
+# Định dạng nhị phân liên tục cho trạng thái LinUCB (file .lucb), mở bằng np.memmap:
+#
+#   [header 64 byte][user_ids int64 (n)][A f8 (n,d,d)][A_inv f8 (n,d,d)][b f8 (n,d)]
+#
+# - user_ids sắp xếp tăng dần → tìm hàng của 1 user bằng searchsorted, không phải đọc cả file
+# - nhiều worker cùng mmap 1 file → dùng chung page cache của OS (zero-copy)
+# - ghi file mới bằng write + rename (atomic), process đang mmap file cũ vẫn đọc bình thường
+# - header giữ model_version (tăng mỗi lần ghi) và vị trí (segment, offset) đã áp dụng trong reward log
+#   (xem ai/reward_log.py) → trạng thái model và vị trí log luôn được publish cùng 1 lần rename
+# - history_watermark: history_id lớn nhất của Taskhistories đã cộng vào model (ai/bandit_retrain.py),
+#   retrain lần sau chỉ đọc dòng mới hơn. Trước đây là trường 'reserved' (luôn 0) → file cũ đọc ra 0
+#
+# Migrate file .pkl cũ: python -m ai.bandit_store migrate models/
+import os
+import sys
+import glob
+import pickle
+import logging
+from contextlib import contextmanager
+from typing import Optional, Tuple
+import numpy as np
+
+from .linucb_engine import BatchLinUCB
+from .model_registry import atomic_write
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, chấp nhận chạy không khóa
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LUCB"
+FORMAT_VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('n_users', '<u8'),
+    ('n_features', '<u4'),
+    ('_pad', '<u4'),
+    ('alpha', '<f8'),
+    ('model_version', '<u8'),
+    ('log_segment', '<u8'),
+    ('log_offset', '<u8'),
+    ('history_watermark', '<u8'),
+])
+assert HEADER_DTYPE.itemsize == 64
+
+
+def _offsets(n: int, d: int):
+    ids = HEADER_DTYPE.itemsize
+    A = ids + 8 * n
+    A_inv = A + 8 * n * d * d
+    b = A_inv + 8 * n * d * d
+    end = b + 8 * n * d
+    return ids, A, A_inv, b, end
+
+
+class BanditStore:
+    def __init__(self, path: str, mode: str = 'r'):
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) != 1 or header['magic'][0] != MAGIC:
+            raise ValueError(f"{path} không phải file LinUCB store")
+        if int(header['version'][0]) != FORMAT_VERSION:
+            raise ValueError(f"{path}: version {int(header['version'][0])} không hỗ trợ")
+        self.header = header[0]
+        self.n_users = n = int(self.header['n_users'])
+        self.n_features = d = int(self.header['n_features'])
+        self.alpha = float(self.header['alpha'])
+        self.model_version = int(self.header['model_version'])
+        self.log_position = (int(self.header['log_segment']), int(self.header['log_offset']))
+        self.history_watermark = int(self.header['history_watermark'])
+
+        o_ids, o_A, o_Ainv, o_b, end = _offsets(n, d)
+        if os.path.getsize(path) < end:
+            raise ValueError(f"{path} bị cắt cụt")
+        if n == 0:
+            self.user_ids = np.zeros(0, dtype=np.int64)
+            self.A = np.zeros((0, d, d))
+            self.A_inv = np.zeros((0, d, d))
+            self.b = np.zeros((0, d))
+            return
+        self.user_ids = np.memmap(path, dtype='<i8', mode=mode, offset=o_ids, shape=(n,))
+        self.A = np.memmap(path, dtype='<f8', mode=mode, offset=o_A, shape=(n, d, d))
+        self.A_inv = np.memmap(path, dtype='<f8', mode=mode, offset=o_Ainv, shape=(n, d, d))
+        self.b = np.memmap(path, dtype='<f8', mode=mode, offset=o_b, shape=(n, d))
+
+    def row(self, user_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < self.n_users and int(self.user_ids[i]) == user_id:
+            return i
+        return None
+
+    def read_user(self, user_id: int) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        i = self.row(user_id)
+        if i is None:
+            return None
+        return np.array(self.A[i]), np.array(self.A_inv[i]), np.array(self.b[i])
+
+
+@contextmanager
+def store_lock(path: str):
+    # Khóa liên process cho các thao tác đọc-sửa-ghi trên cùng 1 file store
+    with open(path + ".lock", 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def read_header(path: str):
+    if not os.path.exists(path):
+        return None
+    header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+    if len(header) != 1 or header['magic'][0] != MAGIC:
+        return None
+    return header[0]
+
+
+def write_store(path: str, user_ids, A, A_inv, b, alpha: float, n_features: int, model_version: int = 1,
+                log_position: Tuple[int, int] = (0, 0), history_watermark: int = 0):
+    # n_features truyền vào (không suy từ b): store chưa có user nào vẫn phải giữ đúng số chiều của agent
+    user_ids = np.asarray(user_ids, dtype='<i8')
+    order = np.argsort(user_ids, kind='stable')
+    n = len(user_ids)
+    d = int(n_features)
+    if n and np.asarray(b).shape[1:] != (d,):
+        raise ValueError(f"b có shape {np.asarray(b).shape}, cần ({n}, {d})")
+
+    header = np.zeros(1, dtype=HEADER_DTYPE)
+    header['magic'] = MAGIC
+    header['version'] = FORMAT_VERSION
+    header['n_users'] = n
+    header['n_features'] = d
+    header['alpha'] = alpha
+    header['model_version'] = model_version
+    header['log_segment'], header['log_offset'] = log_position
+    header['history_watermark'] = history_watermark
+
+    def _write(f):
+        f.write(header.tobytes())
+        f.write(user_ids[order].tobytes())
+        f.write(np.ascontiguousarray(np.asarray(A, dtype='<f8')[order]).tobytes())
+        f.write(np.ascontiguousarray(np.asarray(A_inv, dtype='<f8')[order]).tobytes())
+        f.write(np.ascontiguousarray(np.asarray(b, dtype='<f8')[order]).tobytes())
+
+    atomic_write(path, _write)
+
+
+def save_agent(agent: BatchLinUCB, path: str, log_position: Optional[Tuple[int, int]] = None,
+               history_watermark: Optional[int] = None) -> int:
+    # model_version luôn tăng so với file hiện tại; log_position / history_watermark không truyền → giữ
+    # giá trị của file hiện tại (vd. retrain từ đầu không được làm reward log bị áp dụng lại)
+    current = read_header(path)
+    version = (int(current['model_version']) if current is not None else 0) + 1
+    if log_position is None:
+        log_position = (int(current['log_segment']), int(current['log_offset'])) if current is not None else (0, 0)
+    if history_watermark is None:
+        history_watermark = int(current['history_watermark']) if current is not None else 0
+    n = agent.n_users
+    write_store(path, agent.user_ids[:n], agent.A[:n], agent.A_inv[:n], agent.b[:n], agent.alpha,
+                agent.n_features, model_version=version, log_position=log_position, history_watermark=history_watermark)
+    return version
+
+
+def load_agent(path: str, mode: str = 'c') -> BatchLinUCB:
+    # mode='c' (copy-on-write): page chỉ bị copy khi process này update, file gốc không đổi
+    store = BanditStore(path, mode=mode)
+    agent = BatchLinUCB(n_features=store.n_features, alpha=store.alpha, capacity=0)
+    agent.user_ids = store.user_ids
+    agent.A = store.A
+    agent.A_inv = store.A_inv
+    agent.b = store.b
+    agent.n_users = store.n_users
+    agent.model_version = store.model_version
+    agent.log_position = store.log_position
+    agent.history_watermark = store.history_watermark
+    agent._index = {uid: i for i, uid in enumerate(store.user_ids.tolist())}
+    return agent
+
+
+def from_legacy(agent) -> BatchLinUCB:
+    # assignment_bandit.LinUCB / assignment_rl.LinUCB (dict theo user) → BatchLinUCB
+    return BatchLinUCB.from_dict({'A': agent.A, 'b': agent.b, 'alpha': agent.alpha, 'n_features': agent.n_features})
+
+
+def migrate_pickle(pkl_path: str, store_path: Optional[str] = None) -> str:
+    store_path = store_path or os.path.splitext(pkl_path)[0] + ".lucb"
+    with open(pkl_path, 'rb') as f:
+        data = pickle.load(f)
+    save_agent(BatchLinUCB.from_dict(data), store_path)
+    logger.info(f"Migrate {pkl_path} → {store_path} ({len(data.get('A', {}))} users)")
+    return store_path
+
+
+def migrate_pickles(model_dir: str = "models") -> list:
+    migrated = []
+    for pkl_path in sorted(glob.glob(os.path.join(model_dir, "*.pkl"))):
+        try:
+            with open(pkl_path, 'rb') as f:
+                data = pickle.load(f)
+        except Exception as e:
+            logger.warning(f"Bỏ qua {pkl_path}: {e}")
+            continue
+        if not (isinstance(data, dict) and {'A', 'b', 'n_features'} <= set(data)):
+            continue  # không phải file LinUCB
+        migrated.append(migrate_pickle(pkl_path))
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        for p in migrate_pickles(sys.argv[2] if len(sys.argv) > 2 else "models"):
+            print(p)
+    else:
+        print("Dùng: python -m ai.bandit_store migrate [models_dir]")
@@ -0,0 +1,232 @@
+# ai/candidate_index.py
+# Lọc ứng viên trước khi tính feature + chấm điểm bandit:
+#   - inverted index skill_name -> {user_id: level} dựng từ User_skills
+#   - bitmap phòng ban / bitmap Active trên mảng user
+# Ứng viên của 1 task = Active AND (có ít nhất 1 skill task yêu cầu OR cùng phòng ban với part của task),
+# cộng thêm vài user ngẫu nhiên bên ngoài (exploration quota) để bandit vẫn được khám phá.
+#
+# Index refresh tăng dần theo updated_at của User_skills / Users; định kỳ rebuild toàn bộ
+# để bắt các dòng bị xóa (watermark không thấy được DELETE).
+# Khi ChangeListener (ai/change_listener.py) đang LISTEN kênh candidates_changed (trigger trong workdb.sql):
+# refresh ngay ở truy vấn kế tiếp cho đúng các user được báo (kể cả dòng sửa mà không đổi updated_at),
+# '*' (có dòng bị xóa) → rebuild; không còn poll theo refresh_interval. Mất kết nối → quay lại poll.
+import time
+import threading
+import logging
+from typing import Dict, Optional
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+EXPLORATION_QUOTA = 3
+CHANNEL = "candidates_changed"
+TRIGGERS = ("trg_user_skills_candidates_changed", "trg_users_candidates_changed")
+
+
+class _IndexState:
+    def __init__(self):
+        self.user_ids = np.zeros(0, dtype=np.int64)
+        self.active = np.zeros(0, dtype=bool)
+        self.dept = np.zeros(0, dtype=np.int64)  # -1 = không có phòng ban
+        self.pos: Dict[int, int] = {}
+        self.skills: Dict[str, Dict[int, int]] = {}  # skill_name -> {user_id: level}
+        self.skill_rows: Dict[int, tuple] = {}       # skill_id -> (user_id, skill_name)
+        self.watermark = None
+
+
+class CandidateIndex:
+    def __init__(self, refresh_interval: float = 30.0, full_rebuild_interval: float = 600.0, seed: Optional[int] = None):
+        self.refresh_interval = refresh_interval
+        self.full_rebuild_interval = full_rebuild_interval
+        self._state = _IndexState()
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._rebuilt_at = 0.0
+        self._rng = np.random.default_rng(seed)
+        self.listening = False  # do ChangeListener bật / tắt
+        self._changed_users = set()  # user được báo đổi, chờ refresh
+        self._rebuild_due = False
+        # Thống kê
+        self.queries = 0
+        self.total_users_seen = 0
+        self.total_candidates = 0
+        self.cost_per_candidate_ms = None  # EMA thời gian feature + scoring cho 1 ứng viên
+        self.saved_ms = 0.0
+
+    # ---------- build / refresh ----------
+    def _load_users(self, db: Session, state: _IndexState, since=None, user_ids=()):
+        rows = db.execute(text("""
+            SELECT user_id, status, COALESCE(department_id, -1), updated_at
+            FROM Users
+            WHERE CAST(:since AS TIMESTAMPTZ) IS NULL OR updated_at >= :since OR user_id = ANY(:uids)
+        """), {"since": since, "uids": list(user_ids)}).fetchall()
+        if not rows:
+            return None
+        new = [r for r in rows if r[0] not in state.pos]
+        if new:
+            start = len(state.user_ids)
+            state.user_ids = np.concatenate([state.user_ids, np.array([r[0] for r in new], dtype=np.int64)])
+            state.active = np.concatenate([state.active, np.zeros(len(new), dtype=bool)])
+            state.dept = np.concatenate([state.dept, np.full(len(new), -1, dtype=np.int64)])
+            state.pos = dict(state.pos)
+            for i, r in enumerate(new):
+                state.pos[r[0]] = start + i
+        active = state.active.copy()
+        dept = state.dept.copy()
+        for user_id, status, dept_id, _ in rows:
+            i = state.pos[user_id]
+            active[i] = status == 'Active'
+            dept[i] = dept_id
+        state.active, state.dept = active, dept
+        return max((r[3] for r in rows if r[3] is not None), default=None)
+
+    def _load_skills(self, db: Session, state: _IndexState, since=None, user_ids=()):
+        rows = db.execute(text("""
+            SELECT skill_id, user_id, skill_name, level, GREATEST(created_at, updated_at)
+            FROM User_skills
+            WHERE CAST(:since AS TIMESTAMPTZ) IS NULL OR updated_at >= :since OR created_at >= :since
+               OR user_id = ANY(:uids)
+        """), {"since": since, "uids": list(user_ids)}).fetchall()
+        if not rows:
+            return None
+        # copy-on-write các skill bị đụng tới → reader đang duyệt dict cũ không bị ảnh hưởng
+        touched = {}
+        skill_rows = dict(state.skill_rows)
+
+        def _bucket(name):
+            if name not in touched:
+                touched[name] = dict(state.skills.get(name, {}))
+            return touched[name]
+
+        for skill_id, user_id, skill_name, level, _ in rows:
+            old = skill_rows.get(skill_id)
+            if old:
+                _bucket(old[1]).pop(old[0], None)
+            _bucket(skill_name)[user_id] = level
+            skill_rows[skill_id] = (user_id, skill_name)
+        skills = dict(state.skills)
+        skills.update(touched)
+        state.skills, state.skill_rows = skills, skill_rows
+        return max((r[4] for r in rows if r[4] is not None), default=None)
+
+    def rebuild(self, db: Session):
+        state = _IndexState()
+        wm_users = self._load_users(db, state)
+        wm_skills = self._load_skills(db, state)
+        state.watermark = max([w for w in (wm_users, wm_skills) if w is not None], default=None)
+        self._state = state
+        self._rebuilt_at = self._refreshed_at = time.monotonic()
+        logger.info(f"CandidateIndex rebuilt: {len(state.user_ids)} users, {len(state.skills)} skills")
+
+    def refresh(self, db: Session, user_ids=()):
+        old = self._state
+        state = _IndexState()
+        state.__dict__.update(old.__dict__)
+        wm_users = self._load_users(db, state, old.watermark, user_ids)
+        wm_skills = self._load_skills(db, state, old.watermark, user_ids)
+        state.watermark = max([w for w in (old.watermark, wm_users, wm_skills) if w is not None], default=None)
+        self._state = state
+        self._refreshed_at = time.monotonic()
+
+    def _due(self, now: float) -> bool:
+        if not self._rebuilt_at or self._rebuild_due or self._changed_users:
+            return True
+        if now - self._rebuilt_at >= self.full_rebuild_interval:
+            return True
+        return not self.listening and now - self._refreshed_at >= self.refresh_interval
+
+    def ensure_fresh(self, db: Session):
+        if not self._due(time.monotonic()):
+            return
+        # Chỉ 1 thread refresh; thread khác dùng luôn state hiện tại (nếu đã có)
+        if not self._lock.acquire(blocking=not self._rebuilt_at):
+            return
+        try:
+            now = time.monotonic()
+            if not self._due(now):
+                return
+            # Lấy thông báo ra trước khi đọc DB: thông báo đến trong lúc đọc → lần sau đọc lại
+            changed, self._changed_users = self._changed_users, set()
+            if not self._rebuilt_at or self._rebuild_due or now - self._rebuilt_at >= self.full_rebuild_interval:
+                self._rebuild_due = False
+                self.rebuild(db)
+            else:
+                self.refresh(db, changed)
+        finally:
+            self._lock.release()
+
+    # ---------- ChangeListener ----------
+    def invalidate_users(self, user_ids):
+        self._changed_users = self._changed_users | set(user_ids)
+
+    def clear(self):
+        # '*' / vừa (mất) kết nối LISTEN: có thể đã lỡ thay đổi, kể cả dòng bị xóa → rebuild
+        self._rebuild_due = True
+
+    # ---------- truy vấn ----------
+    def candidates(self, db: Session, task_id: int, explore: int = EXPLORATION_QUOTA) -> np.ndarray:
+        self.ensure_fresh(db)
+        state = self._state
+        n = len(state.user_ids)
+        if n == 0:
+            return state.user_ids
+
+        required = db.execute(text("""
+            SELECT skill_name FROM Task_Required_Skills WHERE task_id = :tid
+        """), {"tid": task_id}).fetchall()
+        task_dept = db.execute(text("""
+            SELECT pp.department_id FROM Tasks t
+            JOIN ProjectParts pp ON t.part_id = pp.part_id
+            WHERE t.task_id = :tid
+        """), {"tid": task_id}).scalar()
+
+        if not required and task_dept is None:
+            mask = state.active.copy()
+        else:
+            match = np.zeros(n, dtype=bool)
+            for (skill_name,) in required:
+                holders = state.skills.get(skill_name)
+                if holders:
+                    match[[state.pos[u] for u in holders if u in state.pos]] = True
+            if task_dept is not None:
+                match |= state.dept == task_dept
+            mask = state.active & match
+
+        if explore > 0:
+            outside = np.flatnonzero(state.active & ~mask)
+            if len(outside):
+                pick = self._rng.choice(outside, size=min(explore, len(outside)), replace=False)
+                mask[pick] = True
+
+        selected = state.user_ids[mask]
+        self.queries += 1
+        self.total_users_seen += n
+        self.total_candidates += len(selected)
+        if self.cost_per_candidate_ms is not None:
+            self.saved_ms += (n - len(selected)) * self.cost_per_candidate_ms
+        return selected
+
+    def record_scoring(self, n_candidates: int, elapsed_s: float):
+        # suggest_assignee_bandit báo thời gian feature + scoring để ước lượng latency tiết kiệm được
+        if n_candidates <= 0:
+            return
+        per = elapsed_s * 1000 / n_candidates
+        self.cost_per_candidate_ms = per if self.cost_per_candidate_ms is None else 0.9 * self.cost_per_candidate_ms + 0.1 * per
+
+    def stats(self) -> dict:
+        state = self._state
+        return {
+            "users": int(len(state.user_ids)),
+            "active_users": int(state.active.sum()),
+            "skills": len(state.skills),
+            "queries": self.queries,
+            "pruning_ratio": round(1 - self.total_candidates / self.total_users_seen, 4) if self.total_users_seen else None,
+            "avg_candidates": round(self.total_candidates / self.queries, 2) if self.queries else None,
+            "cost_per_candidate_ms": round(self.cost_per_candidate_ms, 4) if self.cost_per_candidate_ms is not None else None,
+            "estimated_saved_ms": round(self.saved_ms, 2),
+        }
+
+
+candidate_index = CandidateIndex()
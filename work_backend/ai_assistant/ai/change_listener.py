@@ -0,0 +1,118 @@
+# ai/change_listener.py
+# 1 kết nối psycopg2 riêng (autocommit) LISTEN các kênh mà trigger trong workdb.sql gửi khi dữ liệu đổi,
+# mỗi kênh gắn với 1 cache trong process:
+#   task_order_changed   → order_cache   (ai/task_ordering.py),  payload = user_id
+#   task_context_changed → context_cache (ai/db_integration.py), payload = task_id
+#   candidates_changed   → candidate_index (ai/candidate_index.py), payload = user_id
+# Payload "id,id,..." → bỏ entry của các id đó; "*" → bỏ toàn bộ cache.
+# Cache của 1 kênh chỉ bật khi DB có đủ trigger của kênh đó và đang LISTEN; mất kết nối → tắt mọi cache,
+# kết nối lại sau retry giây (entry tạo trước khi LISTEN có thể đã lỡ thông báo → bắt đầu từ cache rỗng).
+import select
+import logging
+import threading
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription(NamedTuple):
+    channel: str
+    cache: object                          # có .listening và .clear()
+    invalidate: Callable[[Iterable[int]], None]
+    triggers: tuple                        # trigger phải có trong pg_trigger mới bật cache
+
+
+def parse_ids(payload: str) -> Optional[Set[int]]:
+    # None = "*" (mọi id)
+    if payload.strip() == "*":
+        return None
+    return {int(x) for x in payload.split(",") if x.strip().isdigit()}
+
+
+class ChangeListener:
+    def __init__(self, dsn: str, subscriptions: List[Subscription], retry: float = 5.0):
+        self.dsn = dsn
+        self.subscriptions = {s.channel: s for s in subscriptions}
+        self.retry = retry  # giây chờ trước khi kết nối lại
+        self.notifications = 0
+        self._stop = threading.Event()
+
+    def _handle(self, channel: str, payload: str):
+        sub = self.subscriptions.get(channel)
+        if sub is None:
+            return
+        self.notifications += 1
+        ids = parse_ids(payload)
+        if ids is None:
+            sub.cache.clear()
+        else:
+            sub.invalidate(ids)
+
+    def _disable(self):
+        for sub in self.subscriptions.values():
+            sub.cache.listening = False
+            sub.cache.clear()
+
+    def run_forever(self):
+        import psycopg2
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                active = []
+                with conn.cursor() as cur:
+                    for sub in self.subscriptions.values():
+                        # DB chưa có trigger (workdb.sql cũ) → không ai báo thay đổi, không bật cache của kênh
+                        cur.execute("SELECT count(*) FROM pg_trigger WHERE tgname = ANY(%s)", (list(sub.triggers),))
+                        if cur.fetchone()[0] < len(sub.triggers):
+                            logger.warning(f"ChangeListener: thiếu trigger cho kênh {sub.channel} (xem workdb.sql)")
+                            continue
+                        cur.execute(f"LISTEN {sub.channel}")
+                        active.append(sub)
+                if not active:
+                    raise RuntimeError("không kênh nào có đủ trigger")
+                for sub in active:
+                    sub.cache.clear()
+                    sub.cache.listening = True
+                logger.info(f"ChangeListener: LISTEN {', '.join(s.channel for s in active)}")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0)[0]:
+                        conn.poll()
+                        while conn.notifies:
+                            n = conn.notifies.pop(0)
+                            self._handle(n.channel, n.payload)
+            except Exception as e:
+                logger.warning(f"ChangeListener lỗi: {e}")
+            finally:
+                self._disable()
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(self.retry)
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.run_forever, name="change-listener", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop.set()
+
+
+def default_subscriptions() -> List[Subscription]:
+    from . import task_ordering, db_integration, candidate_index
+    return [
+        Subscription(task_ordering.CHANNEL, task_ordering.order_cache,
+                     task_ordering.order_cache.invalidate_users, task_ordering.TRIGGERS),
+        Subscription(db_integration.CHANNEL, db_integration.context_cache,
+                     db_integration.context_cache.invalidate_tasks, db_integration.TRIGGERS),
+        Subscription(candidate_index.CHANNEL, candidate_index.candidate_index,
+                     candidate_index.candidate_index.invalidate_users, candidate_index.TRIGGERS),
+    ]
+
+
+def start_listener() -> ChangeListener:
+    from config import settings
+    listener = ChangeListener(settings.DATABASE_URL, default_subscriptions())
+    listener.start()
+    return listener
@@ -1,35 +1,270 @@
-from sqlalchemy.orm import Session
+# ai/db_integration.py
+# Context của task cho prompt / action "info" (title, tiến độ, hạn chót, người làm chính, kỹ năng cần).
+#
+# Mọi chỗ cần context đi qua TaskContextLoader (kiểu dataloader, sống theo 1 request):
+#   - mỗi task_id đọc tối đa 1 lần trong request (router và llm_client cùng hỏi 1 task → 1 lần đọc)
+#   - nhiều task_id (load_many / các aload cùng lượt event loop) gộp vào 1 câu TASK_CONTEXTS_QUERY
+#   - trước khi truy vấn tra TaskContextCache dùng chung giữa các request; cache chỉ bật khi ChangeListener
+#     (ai/change_listener.py) LISTEN kênh task_context_changed — trigger trong workdb.sql gửi task_id khi
+#     task / phân công / tiến độ / kỹ năng cần / tên người làm đổi.
+# Cache giữ dòng DB (có due_date), due_in_days tính lại mỗi lần trả → không cũ đi khi sang ngày mới.
+import time
+import asyncio
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
 
-def get_task_context(db: Session, task_id: int) -> dict:
-    result = db.execute("""
-        SELECT 
-            t.title, t.due_date, t.priority, 
-            COALESCE(tp.percentage_complete, 0) as progress,
-            u.first_name || ' ' || u.last_name as assignee
-        FROM Tasks t
-        LEFT JOIN Taskprogresses tp ON t.task_id = tp.task_id AND tp.user_id IN (
-            SELECT user_id FROM TaskAssignments WHERE task_id = t.task_id AND is_main_assignee
-        )
-        LEFT JOIN TaskAssignments ta ON t.task_id = ta.task_id AND ta.is_main_assignee
-        LEFT JOIN Users u ON ta.user_id = u.user_id
-        WHERE t.task_id = :tid
-    """, {"tid": task_id}).fetchone()
-
-    if not result:
-        return {}
+CHANNEL = "task_context_changed"
+TRIGGERS = (
+    "trg_tasks_context_changed",
+    "trg_taskassignments_context_changed",
+    "trg_taskprogresses_context_changed",
+    "trg_task_required_skills_context_changed",
+    "trg_users_context_changed",
+)
+MAX_ENTRIES = 10000
+MAX_AGE = 3600.0  # giây: giới hạn tuổi entry cache kể cả khi không có thông báo nào
+
+# Câu SQL dựng sẵn 1 lần: SQLAlchemy dùng lại bản compile, asyncpg dùng lại prepared statement.
+# 1 dòng / task: người làm chính (assignment sớm nhất nếu có nhiều) + tiến độ mới nhất của người đó,
+# kỹ năng gom thành mảng trong LATERAL (đọc theo khóa chính task_id, skill_name) → không còn
+# subquery tương quan trên TaskAssignments và câu thứ 2 cho kỹ năng như bản cũ.
+TASK_CONTEXTS_QUERY = text("""
+    SELECT DISTINCT ON (t.task_id)
+        t.task_id, t.title, t.due_date, t.priority,
+        COALESCE(tp.percentage_complete, 0) AS progress,
+        u.first_name || ' ' || u.last_name AS assignee,
+        sk.skill_names, sk.skill_levels
+    FROM Tasks t
+    LEFT JOIN TaskAssignments ta ON ta.task_id = t.task_id AND ta.is_main_assignee
+    LEFT JOIN Users u ON u.user_id = ta.user_id
+    LEFT JOIN Taskprogresses tp ON tp.task_id = t.task_id AND tp.user_id = ta.user_id
+    LEFT JOIN LATERAL (
+        SELECT array_agg(rs.skill_name ORDER BY rs.skill_name) AS skill_names,
+               array_agg(rs.required_level ORDER BY rs.skill_name) AS skill_levels
+        FROM Task_Required_Skills rs
+        WHERE rs.task_id = t.task_id
+    ) sk ON TRUE
+    WHERE t.task_id = ANY(CAST(:tids AS INTEGER[]))
+    ORDER BY t.task_id, ta.assignment_id, tp.updated_at DESC NULLS LAST, tp.progress_id DESC
+""")
 
-    skills = db.execute("""
-        SELECT skill_name, required_level FROM Task_Required_Skills WHERE task_id = :tid
-    """, {"tid": task_id}).fetchall()
 
-    due_in = (result.due_date.date() - datetime.now().date()).days if result.due_date else None
+def _task_context(row) -> dict:
+    if row is None:
+        return {}
+
+    due_in = (row.due_date.date() - datetime.now().date()).days if row.due_date else None
 
     return {
-        "title": result.title,
-        "progress": result.progress,
+        "title": row.title,
+        "progress": row.progress,
         "due_in_days": due_in,
-        "priority": result.priority,
-        "assignee": result.assignee or "Chưa có",
-        "required_skills": [f"{s[0]} ≥ {s[1]}" for s in skills]
-    }
\ No newline at end of file
+        "priority": row.priority,
+        "assignee": row.assignee or "Chưa có",
+        "required_skills": [f"{n} ≥ {lv}" for n, lv in zip(row.skill_names or [], row.skill_levels or [])]
+    }
+
+
+def fetch_task_contexts(db: Session, task_ids: List[int]) -> list:
+    return db.execute(TASK_CONTEXTS_QUERY, {"tids": task_ids}).fetchall()
+
+
+async def afetch_task_contexts(db, task_ids: List[int]) -> list:
+    # Bản async (AsyncSession), chạy qua SessionRunner.query
+    return (await db.execute(TASK_CONTEXTS_QUERY, {"tids": task_ids})).fetchall()
+
+
+class TaskContextCache:
+    # task_id → (dòng TASK_CONTEXTS_QUERY | None nếu task không tồn tại, hết hạn lúc), LRU tối đa max_entries
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_age: float = MAX_AGE):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.listening = False  # do ChangeListener bật / tắt
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # Tăng ở mỗi lần invalidate: kết quả truy vấn bắt đầu trước đó không được ghi vào cache
+        self._gen = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def token(self) -> int:
+        # Lấy trước khi truy vấn, truyền lại cho put_many()
+        with self._lock:
+            return self._gen
+
+    def get_many(self, task_ids: Iterable[int]) -> dict:
+        # Chỉ trả task có trong cache (giá trị có thể là None = task không tồn tại)
+        if not self.listening:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock:
+            for tid in task_ids:
+                entry = self._entries.get(tid)
+                if entry is not None and now < entry[1]:
+                    self._entries.move_to_end(tid)
+                    found[tid] = entry[0]
+                    self.hits += 1
+                else:
+                    self.misses += 1
+        return found
+
+    def put_many(self, rows: dict, token: int):
+        if not self.listening:
+            return
+        expires = time.time() + self.max_age
+        with self._lock:
+            if token != self._gen:
+                return
+            for tid, row in rows.items():
+                self._entries[tid] = (row, expires)
+                self._entries.move_to_end(tid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_tasks(self, task_ids: Iterable[int]):
+        with self._lock:
+            self._gen += 1
+            for tid in task_ids:
+                if self._entries.pop(tid, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._gen += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "listening": self.listening,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+        }
+
+
+context_cache = TaskContextCache()
+
+
+class TaskContextLoader:
+    # Phạm vi 1 request. Bản sync: loader_for(db) gắn vào Session (get_db tạo 1 Session / request).
+    # Bản async: router tạo 1 loader / request, các aload() cùng lượt event loop gộp 1 truy vấn.
+    def __init__(self, cache: TaskContextCache = context_cache):
+        self.cache = cache
+        self._rows: Dict[int, object] = {}       # task_id → dòng | None, đã có trong request
+        self._queue: List[int] = []              # task_id chờ lần đọc tới (prime / aload)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._scheduled = False
+        self._flush_task: Optional[asyncio.Task] = None  # giữ tham chiếu: event loop chỉ giữ weakref tới task
+        self.queries = 0
+
+    def prime(self, task_ids: Iterable[int]):
+        # Báo trước các task sẽ cần → gộp vào lần đọc tới thay vì mỗi task 1 truy vấn
+        self._queue.extend(tid for tid in task_ids if tid not in self._rows)
+
+    def _missing(self, task_ids: Iterable[int]) -> List[int]:
+        # task_id chưa có trong request, sau khi lấy những gì cache chung có
+        todo = list(dict.fromkeys(tid for tid in task_ids if tid not in self._rows))
+        if not todo:
+            return []
+        self._rows.update(self.cache.get_many(todo))
+        return [tid for tid in todo if tid not in self._rows]
+
+    def _store(self, task_ids: List[int], rows: list, token: int):
+        found = {tid: None for tid in task_ids}
+        found.update((r.task_id, r) for r in rows)
+        self._rows.update(found)
+        self.cache.put_many(found, token)
+        self.queries += 1
+
+    def load_many(self, db: Session, task_ids: Iterable[int]) -> Dict[int, dict]:
+        task_ids = list(task_ids)
+        queued, self._queue = self._queue, []
+        todo = self._missing(queued + task_ids)
+        if todo:
+            token = self.cache.token()
+            self._store(todo, fetch_task_contexts(db, todo), token)
+        return {tid: _task_context(self._rows[tid]) for tid in task_ids}
+
+    def load(self, db: Session, task_id: int) -> dict:
+        return self.load_many(db, [task_id])[task_id]
+
+    async def _aflush(self, runner):
+        self._scheduled = False
+        queued, self._queue = self._queue, []
+        error = None
+        try:
+            todo = self._missing(queued)
+            if todo:
+                token = self.cache.token()
+                self._store(todo, await runner.query(afetch_task_contexts, todo), token)
+        except BaseException as e:  # cả CancelledError: không để aload() chờ mãi
+            error = e
+        # Future chỉ bỏ khỏi _pending khi xong: aload() giữa chừng cùng task chờ chung, không đọc lại
+        for tid in dict.fromkeys(queued):
+            fut = self._pending.pop(tid, None)
+            if fut is None or fut.done():
+                continue
+            if isinstance(error, asyncio.CancelledError):
+                fut.cancel()
+            elif error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(None)
+        if error is not None and not isinstance(error, Exception):
+            raise error
+
+    def _start_flush(self, runner):
+        self._flush_task = asyncio.ensure_future(self._aflush(runner))
+
+    async def aload_many(self, runner, task_ids: Iterable[int]) -> Dict[int, dict]:
+        # runner: database.SessionRunner. Task chưa có → xếp hàng + hẹn 1 lần đọc ở lượt event loop sau,
+        # các coroutine khác của request xếp thêm task trước lúc đó thì đi chung truy vấn
+        task_ids = list(task_ids)
+        loop = asyncio.get_running_loop()
+        waiting = []
+        for tid in task_ids:
+            if tid in self._rows:
+                continue
+            fut = self._pending.get(tid)
+            if fut is None:
+                fut = self._pending[tid] = loop.create_future()
+                self._queue.append(tid)
+                if not self._scheduled:
+                    self._scheduled = True
+                    loop.call_soon(self._start_flush, runner)
+            waiting.append(fut)
+        if waiting:
+            await asyncio.gather(*waiting)
+        return {tid: _task_context(self._rows[tid]) for tid in task_ids}
+
+    async def aload(self, runner, task_id: int) -> dict:
+        return (await self.aload_many(runner, [task_id]))[task_id]
+
+
+def loader_for(db: Session) -> TaskContextLoader:
+    # Loader của request gắn vào Session.info (Session sống theo request, xem database.get_db)
+    loader = db.info.get("task_context_loader")
+    if loader is None:
+        loader = db.info["task_context_loader"] = TaskContextLoader()
+    return loader
+
+
+def get_task_context(db: Session, task_id: int) -> dict:
+    return loader_for(db).load(db, task_id)
+
+
+def get_task_contexts(db: Session, task_ids: Iterable[int]) -> Dict[int, dict]:
+    # Nhiều task 1 truy vấn; task không tồn tại → {}
+    return loader_for(db).load_many(db, task_ids)
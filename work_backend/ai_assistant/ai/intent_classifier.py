@@ -1,13 +1,22 @@
 # ai/intent_classifier.py
 import os
 import pickle
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+import logging
 from pathlib import Path
+from typing import List, Tuple
+
+from .model_registry import registry, atomic_write
+from .intent_scorer import IntentScorer, export_intent_model
+from metrics import stage
+
+logger = logging.getLogger(__name__)
 
 MODEL_DIR = Path("models/intent_model")
 MODEL_PATH = MODEL_DIR / "intent_model.pkl"
 VECTORIZER_PATH = MODEL_DIR / "vectorizer.pkl"
+# Bản export numpy dùng để serving (không cần import scikit-learn). Serving chỉ đọc file này; pickle chỉ để
+# train / export lại bằng tay (python -m ai.intent_scorer export)
+EXPORT_PATH = MODEL_DIR / "intent_model.npz"
 
 # TRAIN_DATA gốc + thêm mới để hỗ trợ task 2 và biến thể
 TRAIN_DATA = [
@@ -33,7 +42,11 @@ TRAIN_DATA = [
     ("kể một câu chuyện", "out_of_scope"),
 ]
 
-def train_intent_model():
+def train_intent_model(model_dir: Path = MODEL_DIR) -> List[Path]:
+    # model_dir khác MODEL_DIR: ghi vào thư mục staging, train/orchestrator.py chuyển sang models/ khi job xong
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
     texts, labels = zip(*TRAIN_DATA)
     vectorizer = TfidfVectorizer(ngram_range=(1, 2), lowercase=True)
     X = vectorizer.fit_transform(texts)
@@ -41,28 +54,53 @@ def train_intent_model():
     model = LogisticRegression()
     model.fit(X, labels)
 
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    with open(MODEL_PATH, "wb") as f:
-        pickle.dump(model, f)
-    with open(VECTORIZER_PATH, "wb") as f:
-        pickle.dump(vectorizer, f)
+    model_dir = Path(model_dir)
+    paths = [model_dir / p.name for p in (MODEL_PATH, VECTORIZER_PATH, EXPORT_PATH)]
+    model_dir.mkdir(parents=True, exist_ok=True)
+    atomic_write(str(paths[0]), lambda f: pickle.dump(model, f))
+    atomic_write(str(paths[1]), lambda f: pickle.dump(vectorizer, f))
+    export_intent_model(model, vectorizer, paths[2])
+    if model_dir == MODEL_DIR:
+        registry.invalidate("intent")
 
     print("Intent model (scikit-learn) trained!")
+    return paths
 
-# Load model
-_model = None
-_vectorizer = None
-if MODEL_PATH.exists() and VECTORIZER_PATH.exists():
+def _load_pickles():
     with open(MODEL_PATH, "rb") as f:
-        _model = pickle.load(f)
+        model = pickle.load(f)
     with open(VECTORIZER_PATH, "rb") as f:
-        _vectorizer = pickle.load(f)
+        vectorizer = pickle.load(f)
+    return model, vectorizer
+
+def export_from_pickles() -> str:
+    # Chỉ bước này (và train) cần scikit-learn
+    model, vectorizer = _load_pickles()
+    export_intent_model(model, vectorizer, EXPORT_PATH)
+    logger.info(f"Export intent model → {EXPORT_PATH}")
+    return str(EXPORT_PATH)
+
+# Load model (1 lần / process, tự reload khi file export đổi).
+# Không export từ pickle lúc serving: trong lúc publish (train/orchestrator.py chuyển từng file) pickle model và
+# vectorizer có thể lệch phiên bản nhau → bản export ghép từ chúng sai. Bản .npz được ghi 1 lần, atomic
+def _load_intent_model():
+    if not EXPORT_PATH.exists():
+        if MODEL_PATH.exists() and VECTORIZER_PATH.exists():
+            logger.warning(f"Chưa có {EXPORT_PATH} → chạy: python -m ai.intent_scorer export")
+        return None
+    return IntentScorer(EXPORT_PATH)
+
+registry.register("intent", [EXPORT_PATH], _load_intent_model)
+
+def predict_intents(texts: List[str]) -> List[Tuple[str, float]]:
+    scorer = registry.get("intent")
+    if not scorer:
+        return [("unknown", 0.0)] * len(texts)
+    texts = [t.lower().strip() for t in texts]
+    with stage("features.intent"):
+        features = scorer.transform(texts)
+    with stage("inference.intent"):
+        return scorer.predict(texts, features)
 
 def predict_intent(text: str):
-    if not _model or not _vectorizer:
-        return "unknown", 0.0
-    X = _vectorizer.transform([text.lower().strip()])
-    prob = _model.predict_proba(X)[0]
-    pred = _model.predict(X)[0]
-    confidence = max(prob)
-    return pred, float(confidence)
\ No newline at end of file
+    return predict_intents([text])[0]
@@ -0,0 +1,153 @@
+# ai/intent_scorer.py
+# Đường serving intent không cần scikit-learn:
+#   export_intent_model() ghi TfidfVectorizer + LogisticRegression ra 1 file .npz phẳng
+#   (vocab, idf, coef, intercept, classes + tham số tokenize), IntentScorer chỉ dùng numpy:
+#   tokenize → đếm n-gram → tf-idf + chuẩn hóa L2 → tích ma trận thưa (COO) với coef → softmax.
+# Cả batch tin nhắn chấm điểm trong 1 lần, xác suất và nhãn lấy từ cùng 1 lượt tính.
+#
+# Export từ pickle có sẵn: python -m ai.intent_scorer export
+import io
+import re
+import sys
+import json
+import logging
+from typing import List, Sequence, Tuple
+import numpy as np
+
+from .model_registry import atomic_write
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = 1
+
+
+def export_intent_model(model, vectorizer, path: str):
+    if getattr(vectorizer, "analyzer", "word") != "word" or vectorizer.strip_accents or vectorizer.preprocessor \
+            or vectorizer.tokenizer or vectorizer.stop_words or vectorizer.binary:
+        raise ValueError("TfidfVectorizer dùng tùy chọn IntentScorer chưa hỗ trợ")
+    classes = np.asarray(model.classes_)
+    if len(classes) == 2:
+        mode = "binary"
+    elif getattr(model, "solver", None) == "liblinear" or getattr(model, "multi_class", "auto") == "ovr":
+        mode = "ovr"
+    else:
+        mode = "multinomial"
+
+    meta = {
+        "format": EXPORT_FORMAT,
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "ngram_range": list(vectorizer.ngram_range),
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "norm": vectorizer.norm,
+        "use_idf": bool(vectorizer.use_idf),
+        "mode": mode,
+    }
+    vocab = vectorizer.get_feature_names_out().astype(str)
+    idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(vocab))
+
+    buf = io.BytesIO()
+    np.savez(buf,
+             meta=np.frombuffer(json.dumps(meta).encode("utf-8"), dtype=np.uint8),
+             vocab=vocab,
+             idf=np.asarray(idf, dtype=np.float64),
+             coef=np.asarray(model.coef_, dtype=np.float64),
+             intercept=np.asarray(model.intercept_, dtype=np.float64),
+             classes=classes.astype(str))
+    atomic_write(str(path), lambda f: f.write(buf.getvalue()))
+
+
+class IntentScorer:
+    def __init__(self, path: str):
+        with np.load(str(path)) as z:
+            meta = json.loads(z["meta"].tobytes().decode("utf-8"))
+            if meta.get("format") != EXPORT_FORMAT:
+                raise ValueError(f"{path}: format {meta.get('format')} không hỗ trợ")
+            vocab = z["vocab"].tolist()
+            self.idf = z["idf"]
+            coef = z["coef"]
+            self.intercept = z["intercept"]
+            self.classes = z["classes"].tolist()
+        self.lowercase = meta["lowercase"]
+        self.token_re = re.compile(meta["token_pattern"])
+        self.min_n, self.max_n = meta["ngram_range"]
+        self.sublinear_tf = meta["sublinear_tf"]
+        self.norm = meta["norm"]
+        self.mode = meta["mode"]
+        self.vocab = {term: i for i, term in enumerate(vocab)}
+        self.coef_t = np.ascontiguousarray(coef.T)  # (n_features, n_classes) → lấy hàng theo cột feature
+
+    def _ngrams(self, text: str) -> List[str]:
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        grams = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), self.max_n + 1):
+            grams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return grams
+
+    def transform(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Ma trận tf-idf dạng COO (rows, cols, values), đã chuẩn hóa theo hàng
+        rows, cols = [], []
+        for r, text in enumerate(texts):
+            for g in self._ngrams(text):
+                c = self.vocab.get(g)
+                if c is not None:
+                    rows.append(r)
+                    cols.append(c)
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+        # Gộp trùng (row, col) → tần suất
+        key = np.asarray(rows, dtype=np.int64) * len(self.vocab) + np.asarray(cols, dtype=np.int64)
+        uniq, counts = np.unique(key, return_counts=True)
+        rows, cols = uniq // len(self.vocab), uniq % len(self.vocab)
+        tf = counts.astype(np.float64)
+        if self.sublinear_tf:
+            tf = 1.0 + np.log(tf)
+        values = tf * self.idf[cols]
+        if self.norm == "l2":
+            sq = np.zeros(len(texts))
+            np.add.at(sq, rows, values ** 2)
+            values = values / np.sqrt(sq)[rows]
+        elif self.norm == "l1":
+            s = np.zeros(len(texts))
+            np.add.at(s, rows, np.abs(values))
+            values = values / s[rows]
+        return rows, cols, values
+
+    def decision_function(self, texts: Sequence[str], features=None) -> np.ndarray:
+        # features: kết quả transform(texts) tính sẵn (đo riêng thời gian tf-idf với phần nhân ma trận)
+        rows, cols, values = features if features is not None else self.transform(texts)
+        scores = np.tile(self.intercept, (len(texts), 1))
+        # Tích thưa × đặc: mỗi phần tử khác 0 cộng values * coef[:, col] vào hàng của nó
+        np.add.at(scores, rows, values[:, None] * self.coef_t[cols])
+        return scores
+
+    def predict_proba(self, texts: Sequence[str], features=None) -> np.ndarray:
+        scores = self.decision_function(texts, features)
+        if self.mode == "binary":
+            p1 = 1.0 / (1.0 + np.exp(-scores[:, 0]))
+            return np.column_stack([1.0 - p1, p1])
+        if self.mode == "ovr":
+            p = 1.0 / (1.0 + np.exp(-scores))
+            return p / p.sum(axis=1, keepdims=True)
+        scores = scores - scores.max(axis=1, keepdims=True)
+        e = np.exp(scores)
+        return e / e.sum(axis=1, keepdims=True)
+
+    def predict(self, texts: Sequence[str], features=None) -> List[Tuple[str, float]]:
+        # Nhãn + độ tin cậy từ cùng 1 lần tính xác suất
+        if not texts:
+            return []
+        proba = self.predict_proba(texts, features)
+        best = proba.argmax(axis=1)
+        return [(self.classes[i], float(proba[r, i])) for r, i in enumerate(best)]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) >= 2 and sys.argv[1] == "export":
+        from .intent_classifier import export_from_pickles
+        print(export_from_pickles())
+    else:
+        print("Dùng: python -m ai.intent_scorer export")
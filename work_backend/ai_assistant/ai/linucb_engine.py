@@ -0,0 +1,168 @@
+# ai/linucb_engine.py
+# LinUCB lưu tham số dạng mảng xếp chồng thay vì dict các mảng nhỏ theo user:
+#   A     : (n_users, d, d)
+#   A_inv : (n_users, d, d)  — giữ cập nhật bằng Sherman–Morrison, không cần np.linalg.inv mỗi request
+#   b     : (n_users, d)
+# File .pkl vẫn cùng định dạng với assignment_bandit.LinUCB (A / b / theta / alpha / n_features).
+import os
+import pickle
+import logging
+import numpy as np
+
+from .model_registry import atomic_write
+
+logger = logging.getLogger(__name__)
+
+
+class BatchLinUCB:
+    def __init__(self, n_features: int, alpha: float = 1.0, capacity: int = 64):
+        self.alpha = alpha
+        self.n_features = n_features
+        self.n_users = 0
+        self._index = {}  # user_id -> hàng trong các mảng
+        d = n_features
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.A = np.tile(np.eye(d), (capacity, 1, 1))
+        self.A_inv = np.tile(np.eye(d), (capacity, 1, 1))
+        self.b = np.zeros((capacity, d))
+
+    # ---------- quản lý hàng ----------
+    def _grow(self, needed: int):
+        cap = len(self.user_ids)
+        if needed <= cap:
+            return
+        new_cap = max(needed, cap * 2)
+        d = self.n_features
+        extra = new_cap - cap
+        self.user_ids = np.concatenate([self.user_ids, np.zeros(extra, dtype=np.int64)])
+        self.A = np.concatenate([self.A, np.tile(np.eye(d), (extra, 1, 1))])
+        self.A_inv = np.concatenate([self.A_inv, np.tile(np.eye(d), (extra, 1, 1))])
+        self.b = np.concatenate([self.b, np.zeros((extra, d))])
+
+    def _rows(self, user_ids, create: bool = False) -> np.ndarray:
+        user_ids = np.asarray(user_ids, dtype=np.int64).ravel()
+        if create:
+            new = [u for u in dict.fromkeys(user_ids.tolist()) if u not in self._index]
+            if new:
+                self._grow(self.n_users + len(new))
+                for u in new:
+                    self._index[u] = self.n_users
+                    self.user_ids[self.n_users] = u
+                    self.n_users += 1
+        return np.fromiter((self._index.get(u, -1) for u in user_ids.tolist()),
+                           dtype=np.int64, count=len(user_ids))
+
+    @property
+    def theta(self) -> np.ndarray:
+        n = self.n_users
+        return np.einsum('nij,nj->ni', self.A_inv[:n], self.b[:n])
+
+    def refresh_inverse(self):
+        # Tính lại A_inv từ A (dùng sau khi load, hoặc định kỳ để chặn sai số tích lũy)
+        n = self.n_users
+        if n:
+            self.A_inv[:n] = np.linalg.inv(self.A[:n])
+
+    # ---------- dự đoán ----------
+    def predict_batch(self, user_ids, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)
+        rows = self._rows(user_ids)
+        known = rows >= 0
+        A_inv = np.broadcast_to(np.eye(self.n_features), (len(rows), self.n_features, self.n_features)).copy()
+        b = np.zeros((len(rows), self.n_features))
+        A_inv[known] = self.A_inv[rows[known]]
+        b[known] = self.b[rows[known]]
+
+        theta = np.einsum('nij,nj->ni', A_inv, b)
+        mean = np.einsum('ni,ni->n', theta, X)
+        var = np.einsum('ni,nij,nj->n', X, A_inv, X)
+        return mean + self.alpha * np.sqrt(np.maximum(var, 0.0))
+
+    def predict(self, user_id: int, context: np.ndarray) -> float:
+        if context is None or len(context) == 0:
+            return 0.0
+        return float(self.predict_batch([user_id], context)[0])
+
+    # ---------- cập nhật ----------
+    def update_batch(self, user_ids, X: np.ndarray, rewards):
+        X = np.asarray(X, dtype=float).reshape(-1, self.n_features)
+        rewards = np.asarray(rewards, dtype=float).ravel()
+        rows = self._rows(user_ids, create=True)
+        if len(rows) == 0:
+            return
+
+        # Cùng 1 user có thể xuất hiện nhiều lần → cập nhật theo "vòng":
+        # vòng r gồm lần xuất hiện thứ r của mỗi user (các hàng trong 1 vòng luôn khác nhau)
+        order = np.argsort(rows, kind='stable')
+        sorted_rows = rows[order]
+        starts = np.r_[0, np.flatnonzero(np.diff(sorted_rows)) + 1]
+        group_start = np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        rank = np.empty(len(rows), dtype=np.int64)
+        rank[order] = np.arange(len(rows)) - group_start
+
+        for r in range(int(rank.max()) + 1):
+            sel = rank == r
+            self._sherman_morrison(rows[sel], X[sel], rewards[sel])
+
+    def _sherman_morrison(self, rows: np.ndarray, X: np.ndarray, rewards: np.ndarray):
+        A_inv = self.A_inv[rows]
+        u = np.einsum('mij,mj->mi', A_inv, X)
+        denom = 1.0 + np.einsum('mi,mi->m', X, u)
+        self.A_inv[rows] = A_inv - np.einsum('mi,mj->mij', u, u) / denom[:, None, None]
+        self.A[rows] += np.einsum('mi,mj->mij', X, X)
+        self.b[rows] += rewards[:, None] * X
+
+    def add_statistics(self, user_ids, A: np.ndarray, b: np.ndarray):
+        # Cộng thống kê đủ đã gom sẵn theo user (A += XᵀX, b += Xᵀr, mỗi user_id 1 lần) rồi nghịch đảo
+        # 1 lần cho các user bị chạm — dùng khi retrain cả lịch sử (ai/bandit_retrain.py)
+        rows = self._rows(user_ids, create=True)
+        if len(rows) == 0:
+            return
+        self.A[rows] += A
+        self.b[rows] += b
+        self.A_inv[rows] = np.linalg.inv(self.A[rows])
+
+    def update(self, user_id: int, context: np.ndarray, reward: float):
+        if context is None:
+            return
+        self.update_batch([user_id], context, [reward])
+
+    # ---------- lưu / load (tương thích LinUCB.save / LinUCB.load) ----------
+    def to_dict(self) -> dict:
+        n = self.n_users
+        theta = self.theta
+        A, b, th = {}, {}, {}
+        for i, uid in enumerate(self.user_ids[:n].tolist()):
+            A[uid] = self.A[i].copy()
+            b[uid] = self.b[i].reshape(-1, 1).copy()
+            th[uid] = theta[i].reshape(-1, 1)
+        return {'A': A, 'b': b, 'theta': th, 'alpha': self.alpha, 'n_features': self.n_features}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'BatchLinUCB':
+        A = data.get('A', {})
+        agent = cls(n_features=data.get('n_features', 5), alpha=data.get('alpha', 1.5),
+                    capacity=max(len(A), 1))
+        uids = list(A.keys())
+        rows = agent._rows(uids, create=True)
+        if len(uids):
+            agent.A[rows] = np.stack([np.asarray(A[u], dtype=float) for u in uids])
+            agent.b[rows] = np.stack([np.asarray(data['b'][u], dtype=float).ravel() for u in uids])
+            agent.refresh_inverse()
+        return agent
+
+    def save(self, path: str):
+        data = self.to_dict()
+        atomic_write(path, lambda f: pickle.dump(data, f))
+
+    @classmethod
+    def load(cls, path: str) -> 'BatchLinUCB':
+        if not os.path.exists(path):
+            return cls(n_features=5, alpha=1.5)
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            return cls.from_dict(data)
+        except Exception as e:
+            logger.warning(f"Load model lỗi: {e}")
+            return cls(n_features=5, alpha=1.5)
@@ -0,0 +1,124 @@
+# ai/llm_async.py
+# Client Ollama bất đồng bộ dùng chung cho mọi request:
+#   - 1 httpx.AsyncClient (giữ keep-alive tới settings.OLLAMA_HOST), không mở kết nối mới mỗi lần gọi
+#   - timeout theo từng lần gọi (mặc định lấy từ settings)
+#   - Semaphore giới hạn số lần sinh đồng thời toàn process → Ollama không bị dồn quá tải
+#   - stream(): trả token ngay khi Ollama gửi về (NDJSON của /api/generate)
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Optional
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    pass
+
+
+class AsyncOllamaClient:
+    def __init__(self, host: Optional[str] = None, model: Optional[str] = None,
+                 timeout: Optional[float] = None, max_concurrency: Optional[int] = None):
+        self.host = (host or settings.OLLAMA_HOST).rstrip("/")
+        self.model = model or settings.OLLAMA_MODEL
+        self.timeout = timeout or settings.OLLAMA_TIMEOUT
+        self.max_concurrency = max_concurrency or settings.OLLAMA_MAX_CONCURRENCY
+        # AsyncClient / Semaphore gắn với event loop → tạo lại nếu bị gọi từ loop khác (vd. asyncio.run trong CLI)
+        self._loop = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+
+    def _ensure(self):
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                timeout=httpx.Timeout(self.timeout, connect=settings.OLLAMA_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=self.max_concurrency,
+                                    max_keepalive_connections=self.max_concurrency),
+            )
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._client, self._sem
+
+    def _payload(self, prompt: str, stream: bool, options: Optional[dict]) -> dict:
+        payload = {"model": self.model, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        return payload
+
+    async def generate(self, prompt: str, timeout: Optional[float] = None,
+                       options: Optional[dict] = None) -> str:
+        client, sem = self._ensure()
+        async with sem:
+            self.in_flight += 1
+            self.requests += 1
+            try:
+                resp = await client.post("/api/generate", json=self._payload(prompt, False, options),
+                                         timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+                resp.raise_for_status()
+                return resp.json().get("response", "").strip()
+            except (httpx.HTTPError, ValueError) as e:
+                self.errors += 1
+                raise LLMError(f"Ollama generate lỗi: {e!r}") from e
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, prompt: str, timeout: Optional[float] = None,
+                     options: Optional[dict] = None) -> AsyncIterator[str]:
+        # timeout ở đây là tổng thời gian cho cả lần sinh, không chỉ giữa 2 chunk
+        client, sem = self._ensure()
+        async with sem:
+            self.in_flight += 1
+            self.requests += 1
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + (timeout or self.timeout)
+            try:
+                async with client.stream("POST", "/api/generate",
+                                         json=self._payload(prompt, True, options),
+                                         timeout=timeout or httpx.USE_CLIENT_DEFAULT) as resp:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if loop.time() > deadline:
+                            raise LLMError("Ollama stream quá thời gian")
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        if chunk.get("error"):
+                            raise LLMError(chunk["error"])
+                        if chunk.get("response"):
+                            yield chunk["response"]
+                        if chunk.get("done"):
+                            break
+            except LLMError:
+                self.errors += 1
+                raise
+            except (httpx.HTTPError, ValueError) as e:
+                self.errors += 1
+                raise LLMError(f"Ollama stream lỗi: {e!r}") from e
+            finally:
+                self.in_flight -= 1
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "host": self.host,
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+
+llm = AsyncOllamaClient()
@@ -0,0 +1,182 @@
+# ai/llm_cache.py
+# Cache câu trả lời LLM trước lời gọi Ollama.
+#
+# Key = intent + câu hỏi đã chuẩn hóa + hash khối dữ liệu đưa vào prompt (context task + ai_info)
+# → cùng câu hỏi trên cùng dữ liệu thì dùng lại câu trả lời, dữ liệu khác thì key khác.
+# Mỗi entry còn giữ "version" của task (Tasks.updated_at + history_id mới nhất trong Taskhistories):
+# task đổi → version đổi → entry cũ bị bỏ khi get(), kể cả khi thay đổi không nằm trong prompt.
+# Giới hạn: LRU theo số entry + tổng byte, và TTL.
+import re
+import time
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from config import settings
+
+_ENTRY_OVERHEAD = 200  # ước lượng byte cho key + metadata của 1 entry
+
+
+def normalize_message(message: str) -> str:
+    message = unicodedata.normalize("NFC", message).lower()
+    message = re.sub(r"\s+", " ", message).strip()
+    return message.rstrip(" ?!.…")
+
+
+def make_key(intent: str, message: str, context_block: str) -> str:
+    block_hash = hashlib.sha256(context_block.encode("utf-8")).hexdigest()
+    raw = f"{intent}\x1f{normalize_message(message)}\x1f{block_hash}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+TASK_VERSION_QUERY = text("""
+    SELECT t.updated_at,
+           (SELECT MAX(history_id) FROM Taskhistories h WHERE h.task_id = t.task_id)
+    FROM Tasks t WHERE t.task_id = :tid
+""")
+
+
+def _version(row) -> Optional[str]:
+    if not row:
+        return None
+    updated_at, last_history = row
+    return f"{updated_at.isoformat() if updated_at else ''}|{last_history or 0}"
+
+
+def task_version(db: Session, task_id: int) -> Optional[str]:
+    return _version(db.execute(TASK_VERSION_QUERY, {"tid": task_id}).fetchone())
+
+
+async def atask_version(db, task_id: int) -> Optional[str]:
+    return _version((await db.execute(TASK_VERSION_QUERY, {"tid": task_id})).fetchone())
+
+
+TASK_VERSIONS_QUERY = text("""
+    SELECT t.task_id, t.updated_at,
+           (SELECT MAX(history_id) FROM Taskhistories h WHERE h.task_id = t.task_id)
+    FROM Tasks t WHERE t.task_id = ANY(CAST(:tids AS INTEGER[]))
+""")
+
+
+def task_versions(db: Session, task_ids) -> Dict[int, Optional[str]]:
+    # Nhiều task 1 truy vấn (/chat/batch); task không tồn tại → None như task_version
+    task_ids = list(dict.fromkeys(task_ids))
+    found = {row[0]: _version(row[1:]) for row in db.execute(TASK_VERSIONS_QUERY, {"tids": task_ids})}
+    return {tid: found.get(tid) for tid in task_ids}
+
+
+class _Entry:
+    __slots__ = ("reply", "size", "expires_at", "gen_seconds", "task_id", "version")
+
+    def __init__(self, reply, size, expires_at, gen_seconds, task_id, version):
+        self.reply = reply
+        self.size = size
+        self.expires_at = expires_at
+        self.gen_seconds = gen_seconds
+        self.task_id = task_id
+        self.version = version
+
+
+class LLMCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024, ttl: float = 600.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_task: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    def _drop(self, key: str) -> _Entry:
+        entry = self._data.pop(key)
+        self.bytes -= entry.size
+        keys = self._by_task.get(entry.task_id)
+        if keys:
+            keys.discard(key)
+            if not keys:
+                del self._by_task[entry.task_id]
+        return entry
+
+    def get(self, key: str, version: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at < time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                self.misses += 1
+                return None
+            if entry.version != version:
+                self._drop(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry.gen_seconds
+            return entry.reply
+
+    def put(self, key: str, reply: str, gen_seconds: float, task_id: Optional[int] = None,
+            version: Optional[str] = None):
+        size = len(reply.encode("utf-8")) + _ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = _Entry(reply, size, time.monotonic() + self.ttl, gen_seconds, task_id, version)
+            self._by_task.setdefault(task_id, set()).add(key)
+            self.bytes += size
+            while len(self._data) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate_task(self, task_id: int) -> int:
+        # Gọi chủ động khi biết task vừa đổi (không cần chờ lần get sau so version)
+        with self._lock:
+            keys = list(self._by_task.get(task_id, ()))
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._by_task.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "saved_generation_seconds": round(self.saved_seconds, 3),
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "invalidations": self.invalidations,
+        }
+
+
+llm_cache = LLMCache(
+    max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+    max_bytes=settings.LLM_CACHE_MAX_BYTES,
+    ttl=settings.LLM_CACHE_TTL,
+)
@@ -1,11 +1,19 @@
 # ai/llm_client.py
 import re
-import ollama
-from .db_integration import get_task_context
+import time
+import asyncio
+import logging
+from .db_integration import get_task_context, loader_for, TaskContextLoader
 from .intent_classifier import predict_intent
 from .assignment_bandit import suggest_assignee_bandit
-from .risk_tgn import predict_risk_advanced
-from .task_ordering import suggest_task_order  # Nếu cần thêm cho intent khác
+from .risk_tgn import predict_risk_advanced, apredict_risk_advanced
+from .task_ordering import suggest_task_order, asuggest_task_order  # Nếu cần thêm cho intent khác
+from .llm_async import llm, LLMError
+from .llm_cache import llm_cache, make_key, task_version, task_versions, atask_version
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_REPLY = "AI đang bận. Thử lại sau nhé!"
 
 def extract_task_id(text: str) -> int:
     # Bắt số thường
@@ -21,58 +29,209 @@ def extract_task_id(text: str) -> int:
 
     return 1  # default
 
-def generate_response(user_message: str, data: dict, db) -> str:
-    # 1. Predict intent
-    intent, confidence = predict_intent(user_message)
-
-    # 2. Extract task_id (sử dụng hàm mới)
-    task_id = extract_task_id(user_message)
+def _model_branch(intent: str, confidence: float):
+    # Intent đủ tin cậy → gọi thêm model tương ứng; None → dùng data / context có sẵn
+    if confidence > 0.5 and intent in ("task_assignment", "task_risk_query", "task_ordering"):
+        return intent
+    return None
 
-    # 3. Lấy context chung
-    context = get_task_context(db, task_id)
-
-    # 4. Xử lý dựa trên intent và gọi hàm tương ứng
-    if intent == "task_assignment" and confidence > 0.5:
-        suggestions = suggest_assignee_bandit(task_id, db)
-        ai_info = "Gợi ý phân công:\n" + "\n".join(
+def _ai_info(branch, result, data, context: dict) -> str:
+    if branch == "task_assignment":
+        return "Gợi ý phân công:\n" + "\n".join(
             f"- {s['name']} (score: {s['ucb_score']:.2f}, lý do: {s['reason']})"
-            for s in suggestions
+            for s in result
         )
-    elif intent == "task_risk_query" and confidence > 0.5:
-        risk_data = predict_risk_advanced(task_id, db)
-        ai_info = f"Rủi ro: {risk_data['risk_score']:.2f} ({risk_data['risk_level']})\nYếu tố: {', '.join(risk_data['top_factors'])}"
-    elif intent == "task_ordering" and confidence > 0.5:
-        # Giả sử extract user_id từ data hoặc context, ở đây dùng ví dụ user_id=1
-        user_id = data.get('user_id', 1)  # Cần adjust theo thực tế
-        order_suggestions = suggest_task_order(user_id, db)
-        ai_info = "Nên làm trước:\n" + "\n".join(
+    if branch == "task_risk_query":
+        return f"Rủi ro: {result['risk_score']:.2f} ({result['risk_level']})\nYếu tố: {', '.join(result['top_factors'])}"
+    if branch == "task_ordering":
+        return "Nên làm trước:\n" + "\n".join(
             f"- Task #{t['task_id']}: {t['title']} (score: {t['score']})"
-            for t in order_suggestions
+            for t in result
         )
-    elif "risk_score" in data:  # Fallback nếu có data sẵn
-        ai_info = f"Rủi ro: {data['risk_score']:.2f} (cao nếu >0.7)\nYếu tố: {', '.join(data.get('top_factors', []))}"
-    else:
-        ai_info = f"Tiến độ: {context.get('progress', 0)}%\nCòn: {context.get('due_in_days', 'N/A')} ngày"
-
-    # 5. Build prompt dynamic
-    prompt = f"""
-Bạn là trợ lý AI hỗ trợ công việc.
-Dữ liệu hệ thống:
+    if "risk_score" in data:  # Fallback nếu có data sẵn
+        return f"Rủi ro: {data['risk_score']:.2f} (cao nếu >0.7)\nYếu tố: {', '.join(data.get('top_factors', []))}"
+    return f"Tiến độ: {context.get('progress', 0)}%\nCòn: {context.get('due_in_days', 'N/A')} ngày"
 
+def _compose(user_message: str, intent: str, task_id: int, context: dict, ai_info: str):
+    # Build prompt dynamic
+    context_block = f"""
 Task: {context.get('title', 'N/A')}
 Người làm: {context.get('assignee', 'Chưa có')}
 Kỹ năng cần: {', '.join(context.get('required_skills', []))}
 
 Kết quả AI ({intent}):
 {ai_info}
+    """.strip()
+    prompt = f"""
+Bạn là trợ lý AI hỗ trợ công việc.
+Dữ liệu hệ thống:
+
+{context_block}
 
 Câu hỏi: {user_message}
 
 Trả lời bằng tiếng Việt, ngắn gọn, có gợi ý hành động, dùng dấu đầu dòng.
     """.strip()
+    return intent, task_id, context_block, prompt
+
+class PromptLoads:
+    # Dữ liệu DB / model cho prompt (và data của router), nhớ theo khóa: trong 1 request — hoặc cả batch
+    # /chat/batch — mỗi (loại, task_id / user_id) chỉ đọc DB / chạy model 1 lần.
+    # prime(): báo trước các task sẽ cần → context và version của chúng đi chung 1 truy vấn mỗi loại
+    def __init__(self, db):
+        self.db = db
+        self._memo = {}
+        self._versions = {}
+        self._version_queue = []
+
+    def prime(self, task_ids):
+        task_ids = list(task_ids)
+        loader_for(self.db).prime(task_ids)
+        self._version_queue.extend(tid for tid in task_ids if tid not in self._versions)
+
+    def _once(self, key, fn):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def context(self, task_id: int) -> dict:
+        return get_task_context(self.db, task_id)
+
+    def version(self, task_id: int):
+        if task_id not in self._versions:
+            if self._version_queue:
+                queued, self._version_queue = self._version_queue, []
+                self._versions.update(task_versions(self.db, queued + [task_id]))
+            else:
+                self._versions[task_id] = task_version(self.db, task_id)
+        return self._versions[task_id]
+
+    def assignment(self, task_id: int):
+        return self._once(("assignment", task_id), lambda: suggest_assignee_bandit(task_id, self.db))
 
+    def risk(self, task_id: int):
+        return self._once(("risk", task_id), lambda: predict_risk_advanced(task_id, self.db))
+
+    def ordering(self, user_id: int):
+        return self._once(("ordering", user_id), lambda: suggest_task_order(user_id, self.db))
+
+def _build(user_message: str, data: dict, db, predicted: tuple = None, loads: PromptLoads = None):
+    # predicted: (intent, confidence) nếu đã dự đoán sẵn (router / batch), loads: PromptLoads dùng chung
+    loads = loads or PromptLoads(db)
+
+    # 1. Predict intent
+    intent, confidence = predicted or predict_intent(user_message)
+
+    # 2. Extract task_id (sử dụng hàm mới)
+    task_id = extract_task_id(user_message)
+
+    # 3. Lấy context chung
+    context = loads.context(task_id)
+
+    # 4. Xử lý dựa trên intent và gọi hàm tương ứng
+    branch = _model_branch(intent, confidence)
+    result = None
+    if branch == "task_assignment":
+        result = loads.assignment(task_id)
+    elif branch == "task_risk_query":
+        result = loads.risk(task_id)
+    elif branch == "task_ordering":
+        # Giả sử extract user_id từ data hoặc context, ở đây dùng ví dụ user_id=1
+        user_id = data.get('user_id', 1)  # Cần adjust theo thực tế
+        result = loads.ordering(user_id)
+
+    # 5. Build prompt dynamic
+    return _compose(user_message, intent, task_id, context, _ai_info(branch, result, data, context))
+
+def build_prompt(user_message: str, data: dict, db) -> str:
+    return _build(user_message, data, db)[3]
+
+class PreparedPrompt:
+    # Kết quả phần chuẩn bị (DB + model + tra cache) → router async có prompt rồi mới gọi LLM
+    def __init__(self, prompt: str, cache_key: str, task_id: int, version, cached):
+        self.prompt = prompt
+        self.cache_key = cache_key
+        self.task_id = task_id
+        self.version = version
+        self.cached = cached
+
+    def store(self, reply: str, gen_seconds: float):
+        llm_cache.put(self.cache_key, reply, gen_seconds, self.task_id, self.version)
+
+def prepare_prompt(user_message: str, data: dict, db, predicted: tuple = None,
+                   loads: PromptLoads = None) -> PreparedPrompt:
+    loads = loads or PromptLoads(db)
+    intent, task_id, context_block, prompt = _build(user_message, data, db, predicted, loads)
+    key = make_key(intent, user_message, context_block)
+    version = loads.version(task_id)
+    return PreparedPrompt(prompt, key, task_id, version, llm_cache.get(key, version))
+
+async def aprompt_inputs(user_message: str, runner, user_id: int = 1, loader: TaskContextLoader = None) -> tuple:
+    # Phần DB của prepare_prompt bản async: context, version (cho cache) và model theo intent
+    # chạy song song, mỗi việc 1 session riêng của runner (database.SessionRunner).
+    # user_id cho task_ordering: như data.get('user_id', 1) ở bản sync.
+    # loader: TaskContextLoader của request (router dùng chung → context của task chỉ đọc 1 lần)
+    intent, confidence = predict_intent(user_message)
+    task_id = extract_task_id(user_message)
+    branch = _model_branch(intent, confidence)
+    loader = loader or TaskContextLoader()
+    jobs = [loader.aload(runner, task_id), runner.query(atask_version, task_id)]
+    if branch == "task_assignment":
+        jobs.append(runner.call(lambda db: suggest_assignee_bandit(task_id, db)))
+    elif branch == "task_risk_query":
+        jobs.append(apredict_risk_advanced(task_id, runner))
+    elif branch == "task_ordering":
+        jobs.append(runner.query(asuggest_task_order, user_id))
+    context, version, *result = await asyncio.gather(*jobs)
+    return intent, branch, task_id, context, version, (result[0] if result else None)
+
+def finish_prompt(user_message: str, data: dict, inputs: tuple) -> PreparedPrompt:
+    # Ghép prompt từ kết quả aprompt_inputs + data của router (không truy vấn DB) rồi tra cache
+    intent, branch, task_id, context, version, result = inputs
+    intent, task_id, context_block, prompt = _compose(
+        user_message, intent, task_id, context, _ai_info(branch, result, data, context))
+    key = make_key(intent, user_message, context_block)
+    return PreparedPrompt(prompt, key, task_id, version, llm_cache.get(key, version))
+
+def generate_response(user_message: str, data: dict, db) -> str:
+    prepared = prepare_prompt(user_message, data, db)
+    if prepared.cached is not None:
+        return prepared.cached
     try:
-        response = ollama.generate(model="llama3:latest", prompt=prompt)
-        return response['response'].strip()
+        import ollama  # client đồng bộ cũ, chỉ load khi đường sync thật sự gọi LLM
+        t0 = time.perf_counter()
+        response = ollama.generate(model="llama3:latest", prompt=prepared.prompt)
+        reply = response['response'].strip()
     except Exception:
-        return "AI đang bận. Thử lại sau nhé!"
\ No newline at end of file
+        return FALLBACK_REPLY
+    prepared.store(reply, time.perf_counter() - t0)
+    return reply
+
+async def agenerate_response(prepared: PreparedPrompt, timeout: float = None) -> str:
+    if prepared.cached is not None:
+        return prepared.cached
+    try:
+        t0 = time.perf_counter()
+        reply = await llm.generate(prepared.prompt, timeout=timeout)
+    except LLMError as e:
+        logger.warning(str(e))
+        return FALLBACK_REPLY
+    prepared.store(reply, time.perf_counter() - t0)
+    return reply
+
+async def astream_response(prepared: PreparedPrompt, timeout: float = None):
+    # Token được yield ngay khi về; lỗi giữa chừng → kết thúc bằng câu fallback (không cache)
+    if prepared.cached is not None:
+        yield prepared.cached
+        return
+    parts = []
+    try:
+        t0 = time.perf_counter()
+        async for token in llm.stream(prepared.prompt, timeout=timeout):
+            parts.append(token)
+            yield token
+    except LLMError as e:
+        logger.warning(str(e))
+        yield FALLBACK_REPLY
+        return
+    prepared.store("".join(parts).strip(), time.perf_counter() - t0)
\ No newline at end of file
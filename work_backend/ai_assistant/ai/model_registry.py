@@ -0,0 +1,126 @@
+# ai/model_registry.py
+# Cache model trong process: mỗi model chỉ load 1 lần, sau đó chỉ os.stat() file (tối đa 1 lần / check_interval)
+# để phát hiện retrain. Khi file đổi → load bản mới rồi gán đè tham chiếu (atomic),
+# request đang chạy vẫn dùng bản cũ, không request nào phải chờ reload (trừ lần load đầu tiên).
+import os
+import time
+import threading
+import logging
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _signature(paths: List[str]):
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+class _Entry:
+    def __init__(self, name: str, paths: List[str], loader: Callable):
+        self.name = name
+        self.paths = [str(p) for p in paths]
+        self.loader = loader
+        self.value = None
+        self.version = None
+        self.loaded = False
+        self.checked_at = 0.0
+        self.lock = threading.Lock()
+        self.load_count = 0
+        self.error_count = 0
+        self.last_load_ms = None
+        self.last_loaded_at = None
+
+
+class ModelRegistry:
+    def __init__(self, check_interval: float = 1.0):
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+
+    def register(self, name: str, paths: List[str], loader: Callable):
+        # Đăng ký lại cùng tên (reload module) → giữ entry cũ
+        if name not in self._entries:
+            self._entries[name] = _Entry(name, paths, loader)
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        now = time.monotonic()
+        if entry.loaded and now - entry.checked_at < self.check_interval:
+            return entry.value
+
+        entry.checked_at = now
+        sig = _signature(entry.paths)
+        if entry.loaded and sig == entry.version:
+            return entry.value
+
+        # Lần đầu: phải chờ có model. Các lần sau: thread khác đang reload → dùng bản cũ luôn
+        if not entry.lock.acquire(blocking=not entry.loaded):
+            return entry.value
+        try:
+            if not entry.loaded or sig != entry.version:
+                self._load(entry, sig)
+        finally:
+            entry.lock.release()
+        return entry.value
+
+    def _load(self, entry: _Entry, sig):
+        t0 = time.perf_counter()
+        try:
+            value = entry.loader()
+        except Exception as e:
+            # File có thể đang được ghi dở → giữ bản cũ, lần check sau thử lại
+            entry.error_count += 1
+            logger.warning(f"Load model '{entry.name}' lỗi: {e}")
+            return
+        entry.value = value
+        entry.version = sig
+        entry.loaded = True
+        entry.load_count += 1
+        entry.last_load_ms = round((time.perf_counter() - t0) * 1000, 3)
+        entry.last_loaded_at = time.time()
+        logger.info(f"Model '{entry.name}' loaded (lần {entry.load_count}, {entry.last_load_ms} ms)")
+
+    def invalidate(self, name: Optional[str] = None):
+        # Buộc lần get() sau stat lại file (vd. ngay sau khi chính process này vừa ghi model mới).
+        # Model chưa register trong process này (CLI python -m ai.reward_log) → không có gì để bỏ
+        for entry in ([self._entries[name]] if name in self._entries else [] if name else self._entries.values()):
+            entry.checked_at = 0.0
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "loaded": e.loaded,
+                "available": e.value is not None,
+                "paths": e.paths,
+                "load_count": e.load_count,
+                "reload_count": max(e.load_count - 1, 0),
+                "error_count": e.error_count,
+                "last_load_ms": e.last_load_ms,
+                "last_loaded_at": e.last_loaded_at,
+                "version_mtime_ns": [s[0] if s else None for s in e.version] if e.version else None,
+            }
+            for name, e in self._entries.items()
+        }
+
+
+def atomic_write(path: str, write_fn: Callable):
+    # Ghi ra file tạm cùng thư mục rồi os.replace → reader không bao giờ thấy file ghi dở
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp, 'wb') as f:
+            write_fn(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,230 @@
+# ai/reward_log.py
+# Ghi reward của bandit vào log append-only thay vì load/ghi lại cả model cho mỗi sự kiện.
+#
+# - API chỉ cần append_reward(): 1 lần write O_APPEND + fsync → trả về là reward đã nằm trên đĩa
+# - RewardApplier (thread nền hoặc CLI) đọc phần log mới, gom theo user, update_batch vào LinUCB
+#   rồi publish model mới. Vị trí (segment, offset) đã áp dụng được ghi trong header file .lucb
+#   cùng lần rename với model → crash ở bất kỳ bước nào cũng không mất / không áp dụng trùng reward đã ack.
+# - Log chia thành các segment models/bandit_rewards/00000000.log, 00000001.log, ...
+#   Writer luôn ghi vào segment lớn nhất; segment cũ được xóa khi đã áp dụng xong.
+#
+# Chạy applier: python -m ai.reward_log run   |   áp dụng 1 lần: python -m ai.reward_log apply
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+
+from .linucb_engine import BatchLinUCB
+from .bandit_store import load_agent, save_agent, store_lock, read_header, migrate_pickle
+from .model_registry import registry
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, chỉ an toàn với 1 writer
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "models"
+LOG_DIR = os.path.join(MODEL_DIR, "bandit_rewards")
+STORE_PATH = os.path.join(MODEL_DIR, "linucb_assignment.lucb")
+PICKLE_PATH = os.path.join(MODEL_DIR, "linucb_assignment.pkl")  # model cũ, migrate sang STORE_PATH khi chưa có
+
+
+def _segment_path(log_dir: str, segment: int) -> str:
+    return os.path.join(log_dir, f"{segment:08d}.log")
+
+
+def _segments(log_dir: str) -> List[int]:
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(int(f[:-4]) for f in os.listdir(log_dir) if f.endswith(".log") and f[:-4].isdigit())
+
+
+def _current_segment(log_dir: str) -> int:
+    segs = _segments(log_dir)
+    return segs[-1] if segs else 0
+
+
+def append_reward(user_id: int, task_id: int, reward: float, context, log_dir: str = LOG_DIR):
+    event = {
+        "user_id": int(user_id),
+        "task_id": int(task_id),
+        "reward": float(reward),
+        "context": [float(x) for x in np.asarray(context).ravel()],
+        "ts": time.time(),
+    }
+    line = (json.dumps(event) + "\n").encode('utf-8')
+    os.makedirs(log_dir, exist_ok=True)
+    while True:
+        segment = _current_segment(log_dir)
+        fd = os.open(_segment_path(log_dir, segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            # Applier vừa mở segment mới trong lúc chờ lock → ghi sang segment mới
+            if _current_segment(log_dir) != segment:
+                continue
+            os.write(fd, line)
+            os.fsync(fd)
+            return
+        finally:
+            os.close(fd)  # đóng fd cũng nhả flock
+
+
+def read_events(log_dir: str, position: Tuple[int, int],
+                max_events: Optional[int] = None) -> Tuple[List[dict], Tuple[int, int]]:
+    # Đọc các dòng hoàn chỉnh từ position; hết segment hiện tại thì sang segment kế tiếp.
+    # Dòng cuối ghi dở (nếu có) để lần sau.
+    segment, offset = position
+    events = []
+    while max_events is None or len(events) < max_events:
+        # Phải kiểm tra có segment mới TRƯỚC khi đọc: segment mới chỉ được tạo khi giữ lock
+        # segment cũ, nên nếu nó đã tồn tại thì segment cũ chắc chắn không còn ai ghi thêm
+        later = [s for s in _segments(log_dir) if s > segment]
+        path = _segment_path(log_dir, segment)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                while max_events is None or len(events) < max_events:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    try:
+                        events.append(json.loads(line))
+                    except ValueError:
+                        logger.warning(f"Bỏ qua dòng reward hỏng: segment {segment}, offset {offset - len(line)}")
+                else:
+                    break  # đủ max_events
+                if line:
+                    break  # dòng ghi dở
+        if not later:
+            break
+        segment, offset = later[0], 0
+    return events, (segment, offset)
+
+
+class RewardApplier:
+    def __init__(self, store_path: str = STORE_PATH, log_dir: str = LOG_DIR, pickle_path: str = PICKLE_PATH,
+                 max_batch: int = 500, max_delay: float = 5.0, poll_interval: float = 0.5,
+                 segment_bytes: int = 16 * 1024 * 1024):
+        self.store_path = store_path
+        self.log_dir = log_dir
+        self.pickle_path = pickle_path
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.segment_bytes = segment_bytes
+        self.applied_events = 0
+        self.published_versions = 0
+        self._stop = threading.Event()
+
+    def _applied_position(self) -> Tuple[int, int]:
+        header = read_header(self.store_path)
+        if header is None:
+            return 0, 0
+        return int(header['log_segment']), int(header['log_offset'])
+
+    def pending(self) -> List[dict]:
+        events, _ = read_events(self.log_dir, self._applied_position(), self.max_batch)
+        return events
+
+    def should_apply(self) -> bool:
+        events = self.pending()
+        if not events:
+            return False
+        return len(events) >= self.max_batch or time.time() - events[0].get("ts", 0) >= self.max_delay
+
+    def apply_pending(self, max_events: Optional[int] = None) -> int:
+        with store_lock(self.store_path):
+            # Chưa có .lucb nhưng còn model .pkl đã train → migrate trước, như _load_linucb
+            # (ai/assignment_bandit.py); nếu không, model chỉ gồm reward trong log sẽ đè mất model cũ
+            if not os.path.exists(self.store_path) and os.path.exists(self.pickle_path):
+                migrate_pickle(self.pickle_path, self.store_path)
+            if os.path.exists(self.store_path):
+                agent = load_agent(self.store_path)
+                position = agent.log_position
+            else:
+                agent = BatchLinUCB(n_features=5, alpha=1.5)
+                position = (0, 0)
+            events, new_position = read_events(self.log_dir, position, max_events)
+            if new_position == position:
+                return 0
+            if events:
+                # update_batch tự gom theo user, giữ đúng thứ tự reward của từng user
+                agent.update_batch(
+                    [e["user_id"] for e in events],
+                    np.array([e["context"] for e in events], dtype=float),
+                    [e["reward"] for e in events],
+                )
+            version = save_agent(agent, self.store_path, log_position=new_position)
+        registry.invalidate("linucb")
+        self.applied_events += len(events)
+        self.published_versions += 1
+        logger.info(f"Áp dụng {len(events)} reward → LinUCB version {version}")
+        self._drop_applied_segments(new_position[0])
+        return len(events)
+
+    def _drop_applied_segments(self, applied_segment: int):
+        for seg in _segments(self.log_dir):
+            if seg < applied_segment:
+                os.unlink(_segment_path(self.log_dir, seg))
+
+    def maybe_rotate(self) -> bool:
+        # Segment hiện tại đủ lớn và đã áp dụng hết → mở segment mới (khi giữ lock segment cũ)
+        segment = _current_segment(self.log_dir)
+        path = _segment_path(self.log_dir, segment)
+        if not os.path.exists(path) or os.path.getsize(path) < self.segment_bytes:
+            return False
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND)
+        try:
+            if fcntl:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            # Giữ lock → không ai ghi thêm: so vị trí đã áp dụng trong header store với cuối segment
+            if _current_segment(self.log_dir) != segment or self._applied_position() != (segment, os.fstat(fd).st_size):
+                return False
+            os.close(os.open(_segment_path(self.log_dir, segment + 1), os.O_WRONLY | os.O_CREAT, 0o644))
+        finally:
+            os.close(fd)
+        logger.info(f"Reward log sang segment {segment + 1}")
+        return True
+
+    def run_forever(self):
+        logger.info(f"RewardApplier chạy: batch={self.max_batch}, delay={self.max_delay}s")
+        while not self._stop.is_set():
+            try:
+                if self.should_apply():
+                    self.apply_pending(self.max_batch)
+                    continue  # còn backlog → áp dụng tiếp không chờ
+                self.maybe_rotate()
+            except Exception as e:
+                logger.warning(f"RewardApplier lỗi: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.run_forever, name="reward-applier", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "apply"
+    applier = RewardApplier()
+    if cmd == "run":
+        applier.run_forever()
+    elif cmd == "apply":
+        total = 0
+        while applier.pending():
+            total += applier.apply_pending(applier.max_batch)
+        print(f"Đã áp dụng {total} reward")
+    else:
+        print("Dùng: python -m ai.reward_log [apply|run]")
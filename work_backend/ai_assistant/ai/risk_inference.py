@@ -0,0 +1,140 @@
+# ai/risk_inference.py
+# Đường serving model rủi ro không cần torch_geometric:
+#   export_risk_model() chép state_dict của TGNRiskPredictor sang RiskScorer — TransformerConv viết lại bằng
+#   torch thuần (Linear + softmax theo node đích bằng scatter_reduce / index_add_, cùng công thức với
+#   torch_geometric ở chế độ eval), chỉ tính attention cho cạnh đi vào task cần chấm điểm —,
+#   lượng tử hóa động int8 các nn.Linear nếu điểm lệch so với bản float trên graph thử <= MAX_QUANT_DRIFT,
+#   rồi torch.jit.script → 1 file TorchScript (.pt). Serving chỉ torch.jit.load: không optimizer, không
+#   dropout, không import torch_geometric.
+#
+# Export từ .pth có sẵn: python -m ai.risk_inference export
+import sys
+import json
+import math
+import logging
+from typing import Optional, Tuple
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .model_registry import atomic_write
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMAT = 1
+MAX_QUANT_DRIFT = 0.02  # lệch điểm rủi ro tối đa (0..1) chấp nhận cho bản int8
+
+
+class RiskScorer(nn.Module):
+    def __init__(self, num_embeddings: int = 1000, node_dim: int = 64, heads: int = 4, hidden: int = 32):
+        super().__init__()
+        self.heads = heads
+        self.channels = node_dim
+        self.node_embed = nn.Embedding(num_embeddings, node_dim)
+        self.lin_query = nn.Linear(node_dim, heads * node_dim)
+        self.lin_key = nn.Linear(node_dim, heads * node_dim)
+        self.lin_value = nn.Linear(node_dim, heads * node_dim)
+        self.lin_skip = nn.Linear(node_dim, node_dim)
+        self.lin_beta = nn.Linear(3 * node_dim, 1, bias=False)
+        self.hidden = nn.Linear(node_dim, hidden)
+        self.head = nn.Linear(hidden, 1)
+
+    @classmethod
+    def from_state_dict(cls, state: dict) -> "RiskScorer":
+        # Tên tham số của TGNRiskPredictor: attn.* (TransformerConv), out.0 / out.3 (Linear của MLP)
+        num_embeddings, node_dim = state["node_embed.weight"].shape
+        heads = state["attn.lin_query.weight"].shape[0] // node_dim
+        model = cls(num_embeddings, node_dim, heads, state["out.0.weight"].shape[0])
+        prefix = {"node_embed": "node_embed", "lin_query": "attn.lin_query", "lin_key": "attn.lin_key",
+                  "lin_value": "attn.lin_value", "lin_skip": "attn.lin_skip", "lin_beta": "attn.lin_beta",
+                  "hidden": "out.0", "head": "out.3"}
+        renamed = {}
+        for name in model.state_dict():
+            module, param = name.rsplit(".", 1)
+            renamed[name] = state[f"{prefix[module]}.{param}"]
+        model.load_state_dict(renamed)
+        return model.eval()
+
+    def forward(self, x: torch.Tensor, edge_index: torch.Tensor, task_mask: torch.Tensor) -> torch.Tensor:
+        H, C = self.heads, self.channels
+        h = self.node_embed(x)
+        # Chỉ node task cần output → giữ cạnh đi vào task, đánh lại chỉ số đích theo thứ tự task trong graph
+        targets = task_mask.nonzero().squeeze(1)
+        n_targets = targets.size(0)
+        pos = torch.full((h.size(0),), -1, dtype=torch.long)
+        pos[targets] = torch.arange(n_targets)
+        dst = pos[edge_index[1]]
+        keep = dst >= 0
+        src, dst = edge_index[0][keep], dst[keep]
+
+        h_t = h[targets]
+        query = self.lin_query(h_t).view(-1, H, C)
+        key = self.lin_key(h).view(-1, H, C)
+        value = self.lin_value(h).view(-1, H, C)
+        alpha = (query[dst] * key[src]).sum(-1) / math.sqrt(C)  # (E, H)
+        amax = torch.full((n_targets, H), float("-inf")).scatter_reduce(
+            0, dst.unsqueeze(1).expand(-1, H), alpha, reduce="amax", include_self=True)
+        alpha = (alpha - amax[dst]).exp()
+        denom = torch.zeros(n_targets, H).index_add_(0, dst, alpha)
+        alpha = alpha / (denom[dst] + 1e-16)
+        out = torch.zeros(n_targets, H, C).index_add_(0, dst, value[src] * alpha.unsqueeze(-1)).mean(1)
+
+        x_r = self.lin_skip(h_t)
+        beta = torch.sigmoid(self.lin_beta(torch.cat([out, x_r, out - x_r], dim=-1)))
+        out = beta * x_r + (1 - beta) * out
+        return torch.sigmoid(self.head(torch.relu(self.hidden(out)))).squeeze(-1)
+
+
+def probe_graph(n_nodes: int = 4000, n_edges: int = 16000, seed: int = 0) -> Tuple[torch.Tensor, ...]:
+    # Graph ngẫu nhiên cùng kiểu graph thật (loại node 0..3, cạnh 2 chiều) để đo lệch khi lượng tử hóa
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 4, n_nodes)
+    pairs = rng.integers(0, n_nodes, (2, n_edges // 2))
+    edge_index = np.concatenate([pairs, pairs[::-1]], axis=1)
+    return torch.from_numpy(x), torch.from_numpy(np.ascontiguousarray(edge_index)), torch.from_numpy(x == 0)
+
+
+def export_risk_model(state: dict, path: str, probe: Optional[Tuple[torch.Tensor, ...]] = None,
+                      quantize: bool = True) -> dict:
+    """state: state_dict của TGNRiskPredictor. probe: (x, edge_index, task_mask) để đo lệch của bản int8
+    (mặc định graph ngẫu nhiên). Trả meta (quantized, max_drift) — cũng ghi trong file export."""
+    model = RiskScorer.from_state_dict(state)
+    probe = probe if probe is not None else probe_graph()
+    meta = {"format": EXPORT_FORMAT, "quantized": False, "max_drift": 0.0, "probe_tasks": int(probe[2].sum())}
+    if quantize:
+        qmodel = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        with torch.no_grad():
+            drift = (qmodel(*probe) - model(*probe)).abs().max().item() if meta["probe_tasks"] else 0.0
+        meta["max_drift"] = round(drift, 6)
+        if drift <= MAX_QUANT_DRIFT:
+            model, meta["quantized"] = qmodel, True
+        else:
+            logger.warning(f"Risk export: int8 lệch {drift:.4f} > {MAX_QUANT_DRIFT} → giữ float32")
+    scripted = torch.jit.script(model)
+    extra = {"meta.json": json.dumps(meta)}
+    atomic_write(str(path), lambda f: torch.jit.save(scripted, f, _extra_files=extra))
+    return meta
+
+
+def load_risk_scorer(path: str):
+    extra = {"meta.json": ""}
+    scorer = torch.jit.load(str(path), map_location="cpu", _extra_files=extra)
+    meta = json.loads(extra["meta.json"] or "{}")
+    if meta.get("format") != EXPORT_FORMAT:
+        raise ValueError(f"{path}: export format {meta.get('format')} không hỗ trợ")
+    scorer.eval()
+    logger.info(f"Risk scorer: load {path} (int8: {meta['quantized']}, lệch trên graph thử {meta['max_drift']})")
+    return scorer
+
+
+def export_from_checkpoint(model_path: str, export_path: str) -> dict:
+    return export_risk_model(torch.load(model_path, map_location="cpu"), export_path)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:2] == ["export"]:
+        from .risk_tgn import MODEL_PATH, EXPORT_PATH
+        print(json.dumps(export_from_checkpoint(MODEL_PATH, EXPORT_PATH)))
+    else:
+        print("Dùng: python -m ai.risk_inference export")
@@ -0,0 +1,33 @@
+# ai/risk_model.py
+# Kiến trúc TGN chấm rủi ro (torch + torch_geometric). Tách khỏi risk_tgn để các module chỉ cần
+# graph / fallback SQL không phải import torch; module này chỉ được load khi train model (serving dùng
+# bản export TorchScript, xem ai/risk_inference.py).
+import torch.nn as nn
+import torch_geometric.nn as geom_nn
+
+
+class TGNRiskPredictor(nn.Module):
+    def __init__(self, node_dim: int = 64, heads: int = 4):
+        super().__init__()
+        self.node_embed = nn.Embedding(1000, node_dim)
+        self.attn = geom_nn.TransformerConv(
+            in_channels=node_dim,
+            out_channels=node_dim,
+            heads=heads,
+            concat=False,        # KHÔNG concat → output = node_dim (64)
+            dropout=0.1,
+            beta=True
+        )
+        self.out = nn.Sequential(
+            nn.Linear(node_dim, 32),
+            nn.ReLU(),
+            nn.Dropout(0.1),
+            nn.Linear(32, 1),
+            nn.Sigmoid()
+        )
+
+    def forward(self, x, edge_index, task_mask):
+        h = self.node_embed(x)
+        h = self.attn(h, edge_index)
+        risk = self.out(h[task_mask])
+        return risk.squeeze(-1)
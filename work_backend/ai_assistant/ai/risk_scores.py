@@ -0,0 +1,216 @@
+# ai/risk_scores.py
+# Điểm rủi ro tính sẵn trong bảng Task_Risk_Scores (xem workdb.sql):
+#   task_id, risk_score, risk_level, top_factors, model_version, input_fingerprint, computed_at
+#
+# - Đọc: get_task_risk / get_task_risks = lookup theo khóa; quá max_staleness thì tính lại ngay
+# - RiskRefresher (thread nền / CLI) định kỳ tính fingerprint các input (tiến độ, trạng thái,
+#   hạn chót, phân công) cho mọi task bằng 1 câu SQL, chỉ tính lại task có fingerprint / model đổi
+#   (hoặc điểm đã quá max_age, vì điểm còn phụ thuộc thời gian tới hạn chót)
+#
+# Chạy: python -m ai.risk_scores refresh   |   chạy định kỳ: python -m ai.risk_scores run
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .model_registry import registry
+from .risk_tgn import predict_risk_bulk, predict_risk_advanced
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 60.0
+MAX_SCORE_AGE = 24 * 3600.0
+
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS Task_Risk_Scores (
+        task_id INTEGER PRIMARY KEY,
+        risk_score REAL NOT NULL CHECK (risk_score BETWEEN 0 AND 1),
+        risk_level VARCHAR(20) NOT NULL,
+        top_factors JSONB NOT NULL DEFAULT '[]',
+        model_version VARCHAR(64) NOT NULL,
+        input_fingerprint CHAR(32) NOT NULL,
+        computed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (task_id) REFERENCES Tasks(task_id) ON DELETE CASCADE
+    )
+"""
+
+FINGERPRINT_QUERY = text("""
+    SELECT t.task_id, md5(concat_ws('|',
+        t.due_date, t.priority,
+        (SELECT ts.status_name FROM TaskStatuses ts WHERE ts.task_id = t.task_id AND ts.is_current LIMIT 1),
+        (SELECT string_agg(tp.user_id || ':' || tp.percentage_complete, ',' ORDER BY tp.user_id, tp.progress_id)
+         FROM Taskprogresses tp WHERE tp.task_id = t.task_id),
+        (SELECT string_agg(ta.user_id || CASE WHEN ta.is_main_assignee THEN '*' ELSE '' END, ',' ORDER BY ta.user_id)
+         FROM TaskAssignments ta WHERE ta.task_id = t.task_id)
+    )) AS fingerprint
+    FROM Tasks t
+    WHERE CAST(:tids AS INTEGER[]) IS NULL OR t.task_id = ANY(:tids)
+""")
+
+UPSERT_SQL = text("""
+    INSERT INTO Task_Risk_Scores (task_id, risk_score, risk_level, top_factors, model_version, input_fingerprint, computed_at)
+    VALUES (:task_id, :risk_score, :risk_level, CAST(:top_factors AS JSONB), :model_version, :fingerprint, now())
+    ON CONFLICT (task_id) DO UPDATE SET
+        risk_score = EXCLUDED.risk_score,
+        risk_level = EXCLUDED.risk_level,
+        top_factors = EXCLUDED.top_factors,
+        model_version = EXCLUDED.model_version,
+        input_fingerprint = EXCLUDED.input_fingerprint,
+        computed_at = EXCLUDED.computed_at
+""")
+
+_table_ready = False
+
+
+def ensure_table(db: Session):
+    # DB tạo trước khi có bảng này → tạo 1 lần / process
+    global _table_ready
+    if not _table_ready:
+        db.execute(text(CREATE_TABLE_SQL))
+        db.commit()
+        _table_ready = True
+
+
+def current_model_version() -> str:
+    if registry.get("risk_tgn") is None:
+        return "sql-fallback"
+    mtimes = registry.stats()["risk_tgn"]["version_mtime_ns"] or [None]
+    return f"tgn-{mtimes[0]}"
+
+
+def _row_result(row) -> dict:
+    factors = row.top_factors if isinstance(row.top_factors, list) else json.loads(row.top_factors or "[]")
+    return {
+        "risk_score": round(float(row.risk_score), 3),
+        "risk_level": row.risk_level,
+        "top_factors": factors,
+        "model_version": row.model_version,
+        "computed_at": row.computed_at.isoformat() if row.computed_at else None,
+    }
+
+
+def refresh_risk_scores(db: Session, task_ids: Optional[List[int]] = None, force: bool = False,
+                        max_age: float = MAX_SCORE_AGE) -> dict:
+    ensure_table(db)
+    t0 = time.perf_counter()
+    version = current_model_version()
+    fingerprints = dict(db.execute(FINGERPRINT_QUERY, {"tids": task_ids}).fetchall())
+    existing = {
+        r.task_id: r for r in db.execute(text("""
+            SELECT task_id, input_fingerprint, model_version,
+                   EXTRACT(EPOCH FROM now() - computed_at) AS age
+            FROM Task_Risk_Scores
+            WHERE CAST(:tids AS INTEGER[]) IS NULL OR task_id = ANY(:tids)
+        """), {"tids": task_ids}).fetchall()
+    }
+    changed = [
+        tid for tid, fp in fingerprints.items()
+        if force or tid not in existing
+        or existing[tid].input_fingerprint != fp
+        or existing[tid].model_version != version
+        or existing[tid].age > max_age
+    ]
+
+    rows = []
+    if changed:
+        # Task đang mở: 1 lần forward trên cả graph; task đã đóng: tính riêng.
+        # max_age=0: batch bulk trong cache (tới BATCH_TTL) có thể tính trước khi input đổi → điểm cũ
+        # sẽ được lưu với fingerprint mới và không ai tính lại tới MAX_SCORE_AGE
+        results = predict_risk_bulk(db, changed, max_age=0)
+        for tid in changed:
+            result = results.get(tid) or predict_risk_advanced(tid, db)
+            rows.append({
+                "task_id": tid,
+                "risk_score": min(max(float(result.get("risk_score", 0.5)), 0.0), 1.0),
+                "risk_level": result.get("risk_level", "Trung bình"),
+                "top_factors": json.dumps(result.get("top_factors", []), ensure_ascii=False),
+                "model_version": version,
+                "fingerprint": fingerprints[tid],
+            })
+        db.execute(UPSERT_SQL, rows)
+        db.commit()
+
+    stats = {
+        "tasks": len(fingerprints),
+        "recomputed": len(rows),
+        "skipped": len(fingerprints) - len(rows),
+        "model_version": version,
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+    }
+    logger.info(f"Risk scores refresh: {stats}")
+    return stats
+
+
+def get_task_risks(db: Session, task_ids: List[int], max_staleness: Optional[float] = None) -> Dict[int, dict]:
+    # Lookup theo khóa; task chưa có điểm hoặc điểm cũ hơn max_staleness (giây) → tính lại ngay
+    ensure_table(db)
+    rows = db.execute(text("""
+        SELECT task_id, risk_score, risk_level, top_factors, model_version, computed_at,
+               EXTRACT(EPOCH FROM now() - computed_at) AS age
+        FROM Task_Risk_Scores WHERE task_id = ANY(:tids)
+    """), {"tids": list(task_ids)}).fetchall()
+    found = {r.task_id: r for r in rows}
+    stale = [tid for tid in task_ids if tid not in found or (max_staleness is not None and found[tid].age > max_staleness)]
+    if stale:
+        refresh_risk_scores(db, stale, force=True)
+        rows = db.execute(text("""
+            SELECT task_id, risk_score, risk_level, top_factors, model_version, computed_at
+            FROM Task_Risk_Scores WHERE task_id = ANY(:tids)
+        """), {"tids": stale}).fetchall()
+        found.update({r.task_id: r for r in rows})
+    return {tid: _row_result(found[tid]) for tid in task_ids if tid in found}
+
+
+def get_task_risk(db: Session, task_id: int, max_staleness: Optional[float] = None) -> Optional[dict]:
+    return get_task_risks(db, [task_id], max_staleness).get(task_id)
+
+
+class RiskRefresher:
+    def __init__(self, session_factory, interval: float = REFRESH_INTERVAL, max_age: float = MAX_SCORE_AGE):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.max_age = max_age
+        self.last_stats = None
+        self._stop = threading.Event()
+
+    def refresh_once(self) -> dict:
+        db = self.session_factory()
+        try:
+            self.last_stats = refresh_risk_scores(db, max_age=self.max_age)
+            return self.last_stats
+        finally:
+            db.close()
+
+    def run_forever(self):
+        logger.info(f"RiskRefresher chạy: interval={self.interval}s")
+        while not self._stop.is_set():
+            try:
+                self.refresh_once()
+            except Exception as e:
+                logger.warning(f"RiskRefresher lỗi: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> threading.Thread:
+        t = threading.Thread(target=self.run_forever, name="risk-refresher", daemon=True)
+        t.start()
+        return t
+
+    def stop(self):
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from database import SessionLocal
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "refresh"
+    refresher = RiskRefresher(SessionLocal)
+    if cmd == "run":
+        refresher.run_forever()
+    elif cmd == "refresh":
+        print(refresher.refresh_once())
+    else:
+        print("Dùng: python -m ai.risk_scores [refresh|run]")
@@ -1,53 +1,49 @@
 # ai/risk_tgn.py
-import torch
-import torch.nn as nn
-import torch_geometric.nn as geom_nn
-from torch_geometric.data import Data
+# torch chỉ import trong hàm cần tới model → load module này không kéo theo torch. Serving dùng bản export
+# TorchScript (ai/risk_inference.py), torch_geometric chỉ cần khi train
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 import os
+import time
+import asyncio
+import logging
+import threading
 from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+from .model_registry import registry, atomic_write
+from metrics import stage, astage
+from .temporal_graph import TemporalGraphStore, load_or_create, SNAPSHOT_PATH as GRAPH_SNAPSHOT_PATH
+
+logger = logging.getLogger(__name__)
 
 MODEL_PATH = "models/risk_tgn.pth"
+# Bản export chỉ để inference (TorchScript, Linear int8), sinh từ MODEL_PATH
+EXPORT_PATH = "models/risk_tgn.pt"
 
-class TGNRiskPredictor(nn.Module):
-    def __init__(self, node_dim: int = 64, heads: int = 4):
-        super().__init__()
-        self.node_embed = nn.Embedding(1000, node_dim)
-        self.attn = geom_nn.TransformerConv(
-            in_channels=node_dim,
-            out_channels=node_dim,
-            heads=heads,
-            concat=False,        # KHÔNG concat → output = node_dim (64)
-            dropout=0.1,
-            beta=True
-        )
-        self.out = nn.Sequential(
-            nn.Linear(node_dim, 32),
-            nn.ReLU(),
-            nn.Dropout(0.1),
-            nn.Linear(32, 1),
-            nn.Sigmoid()
-        )
-
-    def forward(self, x, edge_index, task_mask):
-        h = self.node_embed(x)
-        h = self.attn(h, edge_index)
-        risk = self.out(h[task_mask])
-        return risk.squeeze(-1)
-
-# Khởi tạo model + optimizer
-model = TGNRiskPredictor(node_dim=64, heads=4)
-optimizer = torch.optim.Adam(model.parameters(), lr=0.001, weight_decay=1e-5)
+BATCH_TTL = 60.0  # giây: kết quả bulk được dùng lại cho các truy vấn 1 task trong khoảng này
+SNAPSHOT_INTERVAL = 300.0  # giây: ghi snapshot graph thời gian tối đa 1 lần / khoảng này
+# giây: dựng lại graph từ đầu sau khoảng này — watermark không thấy dòng bị xóa (task, người được giao, skill)
+REBUILD_INTERVAL = 3600.0
 
-def extract_graph_features(db: Session, task_id: int):
-    task = db.execute(
-        text("SELECT task_id, due_date FROM Tasks WHERE task_id = :tid"),
-        {"tid": task_id}
-    ).fetchone()
+def __getattr__(name: str):
+    # Giữ `from ai.risk_tgn import TGNRiskPredictor` cũ mà không import torch khi load module
+    if name == "TGNRiskPredictor":
+        from .risk_model import TGNRiskPredictor
+        return TGNRiskPredictor
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    if not task:
-        return None
+TASK_ROW_QUERY = text("SELECT task_id, due_date FROM Tasks WHERE task_id = :tid")
+
+class RiskGraph(NamedTuple):
+    # Input của model (thay torch_geometric.data.Data → serving không phải import torch_geometric)
+    x: "torch.Tensor"
+    edge_index: "torch.Tensor"
+    task_mask: "torch.Tensor"
+
+def _task_graph():
+    import torch
 
     # Node 0: task, Node 1: dummy user
     node_ids = torch.tensor([0, 1], dtype=torch.long)
@@ -59,38 +55,114 @@ def extract_graph_features(db: Session, task_id: int):
     task_mask = torch.zeros(2, dtype=torch.bool)
     task_mask[0] = True
 
-    return Data(x=x, edge_index=edge_index, task_mask=task_mask)
+    return RiskGraph(x=x, edge_index=edge_index, task_mask=task_mask)
 
-def train_risk_model(db: Session):
-    os.makedirs("models", exist_ok=True)
+def extract_graph_features(db: Session, task_id: int):
+    task = db.execute(TASK_ROW_QUERY, {"tid": task_id}).fetchone()
+    if not task:
+        return None
+    return _task_graph()
 
-    data = extract_graph_features(db, task_id=1)
-    if not data:
-        print("Không tìm thấy task → tạo model mặc định")
-        return
+async def aextract_graph_features(db, task_id: int):
+    task = (await db.execute(TASK_ROW_QUERY, {"tid": task_id})).fetchone()
+    if not task:
+        return None
+    return _task_graph()
+
+# Task đang mở = trạng thái hiện tại không phải done / archived
+OPEN_TASKS_QUERY = text("""
+    SELECT t.task_id
+    FROM Tasks t
+    WHERE NOT EXISTS (
+        SELECT 1 FROM TaskStatuses ts
+        WHERE ts.task_id = t.task_id AND ts.is_current AND ts.status_name IN ('done', 'archived')
+    )
+    ORDER BY t.task_id
+""")
 
-    model.train()
-    optimizer.zero_grad()
+# Graph thời gian dùng chung trong process: mỗi lần chỉ áp dụng sự kiện mới (xem ai/temporal_graph.py)
+_graph_store: Optional[TemporalGraphStore] = None
+_graph_lock = threading.Lock()
+_snapshot_at = 0.0
 
-    out = model(data.x, data.edge_index, data.task_mask)
-    target = torch.tensor([0.82], dtype=torch.float32)  # giả lập task có rủi ro cao
-    loss = nn.BCELoss()(out, target)
+def graph_store() -> TemporalGraphStore:
+    global _graph_store
+    if _graph_store is None:
+        with _graph_lock:
+            if _graph_store is None:
+                _graph_store = load_or_create(GRAPH_SNAPSHOT_PATH)
+    return _graph_store
 
-    loss.backward()
-    optimizer.step()
+def build_risk_graph(db: Session):
+    # Snapshot graph hiện tại cho mọi task đang mở: node task / user / phòng ban / skill,
+    # cạnh 2 chiều task–user, task–skill, task–phòng ban, user–skill, user–phòng ban.
+    # x giữ chỉ số embedding theo loại node như graph 1 task cũ
+    global _snapshot_at
+    store = graph_store()
+    if time.time() - store.built_at >= REBUILD_INTERVAL:
+        store.rebuild(db)
+        logger.info(f"Dựng lại graph rủi ro: {store.n_nodes} node, {store.n_edges} cạnh")
+        save = True  # ghi ngay: snapshot cũ vẫn còn các dòng đã xóa
+    else:
+        save = store.advance(db) > 0 and time.monotonic() - _snapshot_at >= SNAPSHOT_INTERVAL
+    if save:
+        try:
+            store.save(GRAPH_SNAPSHOT_PATH)
+            _snapshot_at = time.monotonic()
+        except OSError as e:
+            logger.warning(f"Lưu snapshot graph lỗi: {e}")
+    node_type, edge_index, task_mask, task_ids = store.snapshot_arrays()
+    if not task_ids:
+        return None, []
+    import torch
+    data = RiskGraph(
+        x=torch.from_numpy(node_type),
+        edge_index=torch.from_numpy(np.ascontiguousarray(edge_index)),
+        task_mask=torch.from_numpy(task_mask),
+    )
+    return data, task_ids
+
+def export_path_for(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + os.path.splitext(EXPORT_PATH)[1]
 
-    torch.save(model.state_dict(), MODEL_PATH)
-    print("TGN Risk Model trained thành công! (loss: {:.4f})".format(loss.item()))
+def train_risk_model(db: Session, model_path: str = MODEL_PATH) -> Optional[dict]:
+    # Train trên nhãn trễ hạn / đúng hạn của task đã done + graph task–user–skill thật (ai/risk_train.py).
+    # model_path khác MODEL_PATH: ghi vào staging (kèm bản export cạnh đó, xem export_path_for),
+    # train/orchestrator.py publish khi job xong.
+    # Trả summary (val_auc, số epoch...), None nếu chưa đủ nhãn → giữ model cũ / fallback rule-based
+    from .risk_train import load_training_data, train_model, probe_batch, MIN_LABELED_TASKS
+    from .risk_inference import export_risk_model
+
+    t0 = time.perf_counter()
+    graph, seeds, labels = load_training_data(db)
+    load_s = round(time.perf_counter() - t0, 3)
+    if len(seeds) < MIN_LABELED_TASKS or labels.min() == labels.max():
+        logger.warning(f"Risk train: {len(seeds)} task có nhãn ({int(labels.sum())} trễ hạn) → chưa đủ dữ liệu, bỏ qua")
+        return None
+
+    import torch
+
+    model, summary = train_model(graph, seeds, labels)
+    summary["load_seconds"] = load_s
+    os.makedirs(os.path.dirname(model_path) or ".", exist_ok=True)
+    state = model.state_dict()
+    atomic_write(model_path, lambda f: torch.save(state, f))
+    # Lệch int8 đo trên subgraph task thật; export ghi sau .pth → không bao giờ cũ hơn (xem _load_risk_model)
+    summary["export"] = export_risk_model(state, export_path_for(model_path), probe=probe_batch(graph, seeds))
+    if model_path == MODEL_PATH:
+        registry.invalidate("risk_tgn")
+    logger.info(f"TGN Risk Model trained: {summary}")
+    return summary
 
 # Thêm fallback rule-based
-def fallback_risk_by_sql(db: Session, task_id: int):
-    row = db.execute(text("""
-        SELECT due_date, COALESCE(tp.percentage_complete, 0) as progress, priority 
-        FROM Tasks t
-        LEFT JOIN Taskprogresses tp ON t.task_id = tp.task_id
-        WHERE t.task_id = :tid
-    """), {"tid": task_id}).fetchone()
+FALLBACK_RISK_QUERY = text("""
+    SELECT due_date, COALESCE(tp.percentage_complete, 0) as progress, priority 
+    FROM Tasks t
+    LEFT JOIN Taskprogresses tp ON t.task_id = tp.task_id
+    WHERE t.task_id = :tid
+""")
 
+def _fallback_risk(row) -> dict:
     if not row:
         return {
             "risk_score": 0.5,
@@ -99,7 +171,7 @@ def fallback_risk_by_sql(db: Session, task_id: int):
         }
 
     score = 0.3
-    days_left = (row.due_date - datetime.now()).days if row.due_date else 999
+    days_left = (row.due_date - datetime.now(row.due_date.tzinfo)).days if row.due_date else 999
     if days_left < 3:
         score += 0.4
     if row.progress < 50:
@@ -123,24 +195,133 @@ def fallback_risk_by_sql(db: Session, task_id: int):
         "top_factors": factors
     }
 
+def fallback_risk_by_sql(db: Session, task_id: int):
+    return _fallback_risk(db.execute(FALLBACK_RISK_QUERY, {"tid": task_id}).fetchone())
+
+async def afallback_risk_by_sql(db, task_id: int):
+    return _fallback_risk((await db.execute(FALLBACK_RISK_QUERY, {"tid": task_id})).fetchone())
+
+# Model dùng cho inference: bản export TorchScript, chỉ load lại khi file đổi
+def _load_risk_model():
+    from .risk_inference import load_risk_scorer, export_from_checkpoint
+    if os.path.exists(MODEL_PATH) and (not os.path.exists(EXPORT_PATH)
+                                       or os.stat(EXPORT_PATH).st_mtime_ns < os.stat(MODEL_PATH).st_mtime_ns):
+        export_from_checkpoint(MODEL_PATH, EXPORT_PATH)  # .pth mới hơn bản export (train bằng code cũ) → export lại
+    if not os.path.exists(EXPORT_PATH):
+        return None
+    return load_risk_scorer(EXPORT_PATH)
+
+registry.register("risk_tgn", [EXPORT_PATH, MODEL_PATH], _load_risk_model)
+
+class _RiskBatch:
+    def __init__(self, scores: Dict[int, float], risk_model, computed_at: float, forward_ms: float):
+        self.scores = scores
+        self.risk_model = risk_model
+        self.computed_at = computed_at
+        self.forward_ms = forward_ms
+
+_batch: Optional[_RiskBatch] = None
+_batch_lock = threading.Lock()
+
+def score_all_open_tasks(db: Session, risk_model) -> _RiskBatch:
+    started = time.monotonic()  # computed_at = lúc bắt đầu đọc graph: mọi thay đổi trước đó đều có trong batch
+    with stage("features.risk"):
+        data, task_ids = build_risk_graph(db)
+    t0 = time.perf_counter()
+    scores = {}
+    if data is not None:
+        import torch
+        with stage("inference.risk"), torch.no_grad():
+            out = risk_model(data.x, data.edge_index, data.task_mask)
+        scores = dict(zip(task_ids, out.reshape(-1).tolist()))
+    forward_ms = round((time.perf_counter() - t0) * 1000, 3)
+    logger.info(f"Risk bulk: {len(scores)} task, forward {forward_ms} ms")
+    return _RiskBatch(scores, risk_model, started, forward_ms)
+
+def _current_batch(db: Session, risk_model, max_age: float = BATCH_TTL) -> Optional[_RiskBatch]:
+    # Hết hạn / model đổi → tính lại (1 thread); thread khác dùng tạm batch cũ nếu cùng model.
+    # max_age <= 0: chỉ nhận batch bắt đầu tính sau lúc gọi (input vừa đổi) — chờ thread đang tính
+    # nếu có, không bao giờ trả batch cũ
+    global _batch
+    requested = time.monotonic()
+
+    def fresh(b: Optional[_RiskBatch]) -> bool:
+        if b is None or b.risk_model is not risk_model:
+            return False
+        return b.computed_at >= requested if max_age <= 0 else time.monotonic() - b.computed_at < max_age
+
+    batch = _batch
+    if fresh(batch):
+        return batch
+    usable = max_age > 0 and batch is not None and batch.risk_model is risk_model
+    if not _batch_lock.acquire(blocking=not usable):
+        return batch
+    try:
+        batch = _batch
+        if not fresh(batch):
+            batch = _batch = score_all_open_tasks(db, risk_model)
+        return batch
+    finally:
+        _batch_lock.release()
+
+def predict_risk_bulk(db: Session, task_ids: Optional[List[int]] = None, max_age: float = BATCH_TTL) -> Dict[int, dict]:
+    # Rủi ro của mọi task đang mở (hoặc các task_ids chỉ định) từ 1 lần forward trên cả graph.
+    # max_age=0: tính lại từ graph đã advance tới hiện tại (dùng khi biết input vừa đổi)
+    risk_model = registry.get("risk_tgn")
+    if risk_model is None:
+        ids = task_ids if task_ids is not None else [r[0] for r in db.execute(OPEN_TASKS_QUERY).fetchall()]
+        return {tid: fallback_risk_by_sql(db, tid) for tid in ids}
+    batch = _current_batch(db, risk_model, max_age)
+    ids = task_ids if task_ids is not None else list(batch.scores)
+    return {tid: _risk_result(batch.scores[tid]) for tid in ids if tid in batch.scores}
+
+def _forward_one(risk_model, data) -> float:
+    import torch
+    with stage("inference.risk"), torch.no_grad():
+        return risk_model(data.x, data.edge_index, data.task_mask).item()
+
 def predict_risk_advanced(task_id: int, db: Session) -> dict:
-    if not os.path.exists(MODEL_PATH):
+    risk_model = registry.get("risk_tgn")
+    if risk_model is None:
         print("Chưa có model risk → dùng fallback rule-based...")
         return fallback_risk_by_sql(db, task_id)
 
-    model.load_state_dict(torch.load(MODEL_PATH, map_location='cpu'))
-    model.eval()
+    # Task đang mở → đọc từ kết quả bulk
+    batch = _current_batch(db, risk_model)
+    if batch is not None and task_id in batch.scores:
+        return _risk_result(batch.scores[task_id])
 
-    data = extract_graph_features(db, task_id)
+    # Task đã đóng / mới tạo sau snapshot → forward riêng như trước
+    with stage("features.risk"):
+        data = extract_graph_features(db, task_id)
     if not data:
         return {
             "risk_score": 0.500,
             "top_factors": ["Không có dữ liệu task"]
         }
+    return _risk_result(_forward_one(risk_model, data))
+
+async def apredict_risk_advanced(task_id: int, runner) -> dict:
+    # Bản async cho /chat. runner: database.SessionRunner — truy vấn SQL qua asyncpg,
+    # phần cần graph store / torch (sync) chạy trong thread, không chặn event loop
+    risk_model = await asyncio.to_thread(registry.get, "risk_tgn")
+    if risk_model is None:
+        print("Chưa có model risk → dùng fallback rule-based...")
+        return await runner.query(afallback_risk_by_sql, task_id)
+
+    batch = await runner.call(_current_batch, risk_model)
+    if batch is not None and task_id in batch.scores:
+        return _risk_result(batch.scores[task_id])
 
-    with torch.no_grad():
-        risk_score = model(data.x, data.edge_index, data.task_mask).item()
+    data = await astage("features.risk", runner.query(aextract_graph_features, task_id))
+    if not data:
+        return {
+            "risk_score": 0.500,
+            "top_factors": ["Không có dữ liệu task"]
+        }
+    return _risk_result(await asyncio.to_thread(_forward_one, risk_model, data))
 
+def _risk_result(risk_score: float) -> dict:
     factors = []
     if risk_score > 0.7:
         factors = ["Deadline gấp", "Workload cao", "Thiếu skill"]
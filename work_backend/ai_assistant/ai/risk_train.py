@@ -0,0 +1,278 @@
+# ai/risk_train.py
+# Train model rủi ro (TGNRiskPredictor) trên dữ liệu thật, chỉ dùng CPU:
+#   - nhãn: task có trạng thái hiện tại 'done' và có due_date → 1 nếu hoàn thành sau hạn, 0 nếu đúng hạn.
+#     Thời điểm hoàn thành = lần cuối Taskhistories chuyển sang 'done', không có thì updated_at của TaskStatuses
+#   - graph: cùng loại node / cạnh như TemporalGraphStore lúc inference (task–user, task–skill, task–phòng ban,
+#     user–skill, user–phòng ban), dựng set-based bằng numpy thành CSR — không replay lịch sử
+#   - mini-batch: mỗi batch task lấy mẫu tối đa FANOUT hàng xóm / node / tầng (model có 1 tầng
+#     TransformerConv → 1 tầng) → kích thước subgraph bị chặn bởi batch_size * fanout, không theo cỡ graph
+#   - subgraph của các batch kế tiếp được lấy mẫu sẵn ở LOADER_THREADS thread trong lúc forward / backward
+#   - chia train / validation theo task (seed cố định), metric validation = ROC AUC (chỉ 1 lớp → -loss);
+#     early stopping sau PATIENCE epoch không cải thiện, giữ state_dict tốt nhất
+import os
+import copy
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .temporal_graph import NODE_TASK, NODE_USER, NODE_DEPARTMENT, NODE_SKILL
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 256
+FANOUTS = (10,)        # số hàng xóm tối đa / node cho từng tầng message passing
+MAX_EPOCHS = 30
+PATIENCE = 3
+VAL_FRACTION = 0.2
+MIN_LABELED_TASKS = 20
+LOADER_THREADS = min(4, os.cpu_count() or 1)
+CHUNK_SIZE = 50000
+
+LABEL_QUERY = text("""
+    SELECT t.task_id,
+           CASE WHEN COALESCE(d.done_at, ts.updated_at) > t.due_date THEN 1 ELSE 0 END AS late
+    FROM Tasks t
+    JOIN TaskStatuses ts ON ts.task_id = t.task_id AND ts.is_current AND ts.status_name = 'done'
+    LEFT JOIN (
+        SELECT task_id, MAX(created_at) AS done_at
+        FROM Taskhistories
+        WHERE status_after_update = 'done'
+        GROUP BY task_id
+    ) d ON d.task_id = t.task_id
+    WHERE t.due_date IS NOT NULL AND COALESCE(d.done_at, ts.updated_at) IS NOT NULL
+    ORDER BY t.task_id
+""")
+
+# (loại node đầu, loại node cuối) → câu trả cặp khóa; giống các nguồn của ai/temporal_graph.py
+EDGE_QUERIES = {
+    (NODE_TASK, NODE_DEPARTMENT): text("""
+        SELECT t.task_id, pp.department_id
+        FROM Tasks t JOIN ProjectParts pp ON pp.part_id = t.part_id
+        WHERE pp.department_id IS NOT NULL
+    """),
+    (NODE_TASK, NODE_USER): text("""
+        SELECT task_id, user_id FROM TaskAssignments
+        UNION
+        SELECT task_id, user_id FROM Taskhistories
+    """),
+    (NODE_USER, NODE_DEPARTMENT): text("""
+        SELECT DISTINCT ta.user_id, u.department_id
+        FROM TaskAssignments ta JOIN Users u ON u.user_id = ta.user_id
+        WHERE u.department_id IS NOT NULL
+    """),
+    (NODE_TASK, NODE_SKILL): text("SELECT task_id, skill_name FROM Task_Required_Skills"),
+    (NODE_USER, NODE_SKILL): text("SELECT user_id, skill_name FROM User_skills"),
+}
+
+
+class TrainingGraph:
+    # Graph vô hướng dạng CSR: hàng xóm của node v = indices[indptr[v]:indptr[v + 1]]
+    def __init__(self, node_type: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 task_index: Dict[int, int]):
+        self.node_type = node_type
+        self.indptr = indptr
+        self.indices = indices
+        self.task_index = task_index
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_type)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.indices)
+
+    @classmethod
+    def from_pairs(cls, keys: Dict[int, np.ndarray], pairs: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]):
+        # keys: loại node → khóa (đã unique, sort); pairs: (loại a, loại b) → (khóa a, khóa b)
+        offsets, node_type, total = {}, [], 0
+        for kind in sorted(keys):
+            offsets[kind] = total
+            node_type.append(np.full(len(keys[kind]), kind, dtype=np.int64))
+            total += len(keys[kind])
+        src, dst = [], []
+        for (ka, kb), (a, b) in pairs.items():
+            if len(a) == 0:
+                continue
+            ia = offsets[ka] + np.searchsorted(keys[ka], a)
+            ib = offsets[kb] + np.searchsorted(keys[kb], b)
+            src += [ia, ib]
+            dst += [ib, ia]
+        if src:
+            code = np.unique(np.concatenate(dst) * total + np.concatenate(src))  # bỏ cạnh trùng, sort theo đích
+            dst_all, indices = code // total, code % total
+        else:
+            dst_all = indices = np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(total + 1, dtype=np.int64)
+        np.cumsum(np.bincount(dst_all, minlength=total), out=indptr[1:])
+        task_keys = keys.get(NODE_TASK, np.zeros(0, dtype=np.int64))
+        task_index = dict(zip(task_keys.tolist(), range(offsets.get(NODE_TASK, 0), offsets.get(NODE_TASK, 0) + len(task_keys))))
+        return cls(np.concatenate(node_type) if node_type else np.zeros(0, dtype=np.int64),
+                   indptr, indices.astype(np.int64), task_index)
+
+
+def _read_pairs(db: Session, query, chunk_size: int = CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+    a, b = [], []
+    result = db.execute(query, execution_options={"stream_results": True})
+    for chunk in result.partitions(chunk_size):
+        a.append(np.array([r[0] for r in chunk]))
+        b.append(np.array([r[1] for r in chunk]))
+    if not a:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(a), np.concatenate(b)
+
+
+def load_training_data(db: Session) -> Tuple[TrainingGraph, np.ndarray, np.ndarray]:
+    # → (graph, chỉ số node của các task có nhãn, nhãn 0/1)
+    label_tasks, labels = _read_pairs(db, LABEL_QUERY)
+    pairs = {kinds: _read_pairs(db, query) for kinds, query in EDGE_QUERIES.items()}
+    keys = {}
+    for kind in (NODE_TASK, NODE_USER, NODE_DEPARTMENT, NODE_SKILL):
+        parts = [label_tasks] if kind == NODE_TASK else []
+        for (ka, kb), (a, b) in pairs.items():
+            parts += [a] if ka == kind else []
+            parts += [b] if kb == kind else []
+        parts = [p for p in parts if len(p)]
+        keys[kind] = np.unique(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+    graph = TrainingGraph.from_pairs(keys, pairs)
+    seeds = np.fromiter((graph.task_index[t] for t in label_tasks.tolist()), dtype=np.int64, count=len(label_tasks))
+    return graph, seeds, labels.astype(np.float32)
+
+
+def sample_subgraph(graph: TrainingGraph, seeds: np.ndarray, fanouts: Sequence[int], rng: np.random.Generator):
+    """Subgraph quanh seeds: mỗi tầng, node có bậc <= fanout lấy đủ hàng xóm, node lớn hơn (user nhiều task,
+    skill, phòng ban) lấy fanout hàng xóm ngẫu nhiên (có lặp, bỏ trùng). Trả (nodes toàn cục đã sort,
+    edge_index cục bộ [nguồn, đích], mask các node seed trong nodes)."""
+    indptr, indices = graph.indptr, graph.indices
+    seen = np.unique(seeds)
+    frontier = seen
+    src_parts, dst_parts = [], []
+    for fanout in fanouts:
+        start = indptr[frontier]
+        deg = indptr[frontier + 1] - start
+        small = deg <= fanout
+        d = deg[small]
+        offs = np.arange(d.sum()) - np.repeat(np.cumsum(d) - d, d)
+        pos_small = np.repeat(start[small], d) + offs
+        big = ~small
+        n_big = int(big.sum())
+        pos_big = np.repeat(start[big], fanout) + (rng.random(n_big * fanout) * np.repeat(deg[big], fanout)).astype(np.int64)
+        src_parts.append(indices[np.concatenate([pos_small, pos_big])])
+        dst_parts.append(np.concatenate([np.repeat(frontier[small], d), np.repeat(frontier[big], fanout)]))
+        frontier = np.setdiff1d(src_parts[-1], seen)
+        seen = np.union1d(seen, frontier)
+    n = graph.n_nodes
+    code = np.unique(np.concatenate(dst_parts) * n + np.concatenate(src_parts))
+    edge_index = np.stack([np.searchsorted(seen, code % n), np.searchsorted(seen, code // n)])
+    return seen, edge_index, np.isin(seen, seeds)
+
+
+def probe_batch(graph: TrainingGraph, seeds: np.ndarray, n: int = 2048, seed: int = 0):
+    # (x, edge_index, task_mask) quanh tối đa n task có nhãn — graph thử để đo lệch của bản export int8
+    import torch
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(seeds, min(n, len(seeds)), replace=False)
+    nodes, edge_index, mask = sample_subgraph(graph, picked, FANOUTS, rng)
+    return torch.from_numpy(graph.node_type[nodes]), torch.from_numpy(edge_index), torch.from_numpy(mask)
+
+
+def _prefetch(make_batch: Callable, jobs: Iterable, workers: int) -> Iterator:
+    # Giữ tối đa 2 * workers batch đang lấy mẫu ở thread pool, trả theo đúng thứ tự jobs
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="risk-loader") as pool:
+        it = iter(jobs)
+        pending = deque(pool.submit(make_batch, job) for _, job in zip(range(2 * workers), it))
+        while pending:
+            batch = pending.popleft().result()
+            job = next(it, None)
+            if job is not None:
+                pending.append(pool.submit(make_batch, job))
+            yield batch
+
+
+def _auc(labels: np.ndarray, scores: np.ndarray) -> Optional[float]:
+    if labels.min() == labels.max():
+        return None
+    from sklearn.metrics import roc_auc_score
+    return float(roc_auc_score(labels, scores))
+
+
+def train_model(graph: TrainingGraph, seeds: np.ndarray, labels: np.ndarray, batch_size: int = BATCH_SIZE,
+                fanouts: Sequence[int] = FANOUTS, max_epochs: int = MAX_EPOCHS, patience: int = PATIENCE,
+                val_fraction: float = VAL_FRACTION, workers: int = LOADER_THREADS, seed: int = 0):
+    """→ (model với state_dict tốt nhất trên validation, summary)"""
+    import torch
+    import torch.nn as nn
+    from .risk_model import TGNRiskPredictor
+
+    t0 = time.perf_counter()
+    torch.manual_seed(seed)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(seeds))
+    n_val = max(1, int(len(seeds) * val_fraction))
+    val_idx, train_idx = order[:n_val], order[n_val:]
+    # Nhãn theo node toàn cục → batch lấy nhãn theo thứ tự node của subgraph
+    y_node = np.full(graph.n_nodes, -1.0, dtype=np.float32)
+    y_node[seeds] = labels
+
+    max_nodes = [0]
+
+    def make_batch(job):
+        idx, batch_seed = job
+        nodes, edge_index, mask = sample_subgraph(graph, seeds[idx], fanouts, np.random.default_rng(batch_seed))
+        max_nodes[0] = max(max_nodes[0], len(nodes))
+        return (torch.from_numpy(graph.node_type[nodes]), torch.from_numpy(edge_index),
+                torch.from_numpy(mask), torch.from_numpy(y_node[nodes[mask]]))
+
+    def batches(idx: np.ndarray, epoch_seed: int):
+        return [(np.sort(idx[i:i + batch_size]), (seed, epoch_seed, i)) for i in range(0, len(idx), batch_size)]
+
+    model = TGNRiskPredictor(node_dim=64, heads=4)
+    optimizer = torch.optim.Adam(model.parameters(), lr=0.001, weight_decay=1e-5)
+    loss_fn = nn.BCELoss(reduction="sum")
+    best, best_state, best_epoch, history = None, None, 0, []
+    for epoch in range(1, max_epochs + 1):
+        model.train()
+        train_loss = 0.0
+        for x, edge_index, mask, y in _prefetch(make_batch, batches(rng.permutation(train_idx), epoch), workers):
+            optimizer.zero_grad()
+            loss = loss_fn(model(x, edge_index, mask), y)
+            (loss / len(y)).backward()
+            optimizer.step()
+            train_loss += loss.item()
+
+        # Validation: cùng cách lấy mẫu, seed cố định → so được giữa các epoch
+        model.eval()
+        val_loss, val_y, val_scores = 0.0, [], []
+        with torch.no_grad():
+            for x, edge_index, mask, y in _prefetch(make_batch, batches(val_idx, 0), workers):
+                out = model(x, edge_index, mask)
+                val_loss += loss_fn(out, y).item()
+                val_y.append(y.numpy())
+                val_scores.append(out.numpy())
+        val_loss /= len(val_idx)
+        val_auc = _auc(np.concatenate(val_y), np.concatenate(val_scores))
+        score = val_auc if val_auc is not None else -val_loss
+        history.append({"epoch": epoch, "train_loss": round(train_loss / max(len(train_idx), 1), 4),
+                        "val_loss": round(val_loss, 4), "val_auc": None if val_auc is None else round(val_auc, 4)})
+        logger.info(f"Risk train epoch {epoch}: {history[-1]}")
+        if best is None or score > best:
+            best, best_state, best_epoch = score, copy.deepcopy(model.state_dict()), epoch
+        elif epoch - best_epoch >= patience:
+            break
+
+    model.load_state_dict(best_state)
+    model.eval()
+    summary = {
+        "labeled_tasks": len(seeds), "late_ratio": round(float(labels.mean()), 4),
+        "train_tasks": len(train_idx), "val_tasks": len(val_idx),
+        "nodes": graph.n_nodes, "edges": graph.n_edges // 2,
+        "epochs": len(history), "best_epoch": best_epoch,
+        "val_loss": history[best_epoch - 1]["val_loss"], "val_auc": history[best_epoch - 1]["val_auc"],
+        "max_batch_nodes": max_nodes[0], "seconds": round(time.perf_counter() - t0, 3),
+    }
+    return model, summary
@@ -1,23 +1,169 @@
+# ai/rule_engine.py
+# Rule trả lời nhanh (chào hỏi / ngoài phạm vi) khai báo trong ai/rules.json:
+#   name, intent, priority, word_boundary, keywords, phrases, regexes, reply
+# Bảng rule được biên dịch thành 1 automaton Aho–Corasick cho toàn bộ keyword/phrase
+# (+ 1 regex gộp cho các rule regex) → 1 lượt duyệt tin nhắn đã chuẩn hóa, chi phí không tăng theo số rule.
+# word_boundary = true → chỉ khớp nguyên từ ("hi" không khớp trong "thi", "chiều").
+# Sửa rules.json → model_registry tự load lại (hot reload), không cần restart.
+import os
 import re
+import json
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
-GREETING_KEYWORDS = ["hi", "hello", "chào", "hey", "alo"]
-OUT_OF_SCOPE = ["joke", "truyện", "chuyện", "hát", "thời tiết", "bạn tên gì"]  # Thêm "chuyện"
+from .model_registry import registry
 
-def is_greeting(text: str) -> bool:
-    return any(k in text.lower() for k in ["hi", "hello", "chào", "hey", "alo", "xin chào"])
+RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json")
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).lower()
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class Rule:
+    def __init__(self, order: int, spec: dict):
+        self.order = order
+        self.name = spec["name"]
+        self.intent = spec.get("intent", self.name)
+        self.priority = int(spec.get("priority", 0))
+        self.word_boundary = bool(spec.get("word_boundary", True))
+        self.keywords = [normalize(k) for k in spec.get("keywords", []) if k.strip()]
+        self.phrases = [normalize(p) for p in spec.get("phrases", []) if p.strip()]
+        self.regexes = list(spec.get("regexes", []))
+        self.reply = spec["reply"]
+
+    def beats(self, other: Optional["Rule"]) -> bool:
+        # Priority cao hơn thắng; bằng nhau → rule khai báo trước thắng
+        return other is None or (self.priority, -self.order) > (other.priority, -other.order)
+
+
+class RuleSet:
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        # ----- Aho–Corasick: goto / fail / output -----
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int, bool]]] = [[]]  # (độ dài pattern, rule, word_boundary)
+        for r_idx, rule in enumerate(rules):
+            for pattern in dict.fromkeys(rule.keywords + rule.phrases):
+                self._add(pattern, r_idx, rule.word_boundary)
+        self._build_fail()
+        # ----- regex gộp: mỗi regex 1 named group → biết rule nào khớp -----
+        parts, self._group_rule = [], {}
+        for r_idx, rule in enumerate(rules):
+            for j, rx in enumerate(rule.regexes):
+                group = f"r{r_idx}_{j}"
+                self._group_rule[group] = r_idx
+                body = rf"(?<!\w)(?:{rx})(?!\w)" if rule.word_boundary else f"(?:{rx})"
+                parts.append(f"(?P<{group}>{body})")
+        self._regex = re.compile("|".join(parts)) if parts else None
+
+    def _add(self, pattern: str, r_idx: int, word_boundary: bool):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), r_idx, word_boundary))
+
+    def _build_fail(self):
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0  # con của root → fail về root
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def match(self, message: str) -> Optional[Rule]:
+        text = normalize(message)
+        best = None
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        n = len(text)
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, r_idx, word_boundary in out[state]:
+                if word_boundary:
+                    start = i - length + 1
+                    if (start > 0 and _is_word_char(text[start - 1])) or (i + 1 < n and _is_word_char(text[i + 1])):
+                        continue
+                rule = self.rules[r_idx]
+                if rule.beats(best):
+                    best = rule
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                rule = self.rules[self._group_rule[m.lastgroup]]
+                if rule.beats(best):
+                    best = rule
+        return best
+
+
+def load_rules(path: str = RULES_PATH) -> RuleSet:
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    return RuleSet([Rule(i, r) for i, r in enumerate(spec.get("rules", []))])
+
+
+registry.register("rules", [RULES_PATH], load_rules)
+
+_hits: Counter = Counter()
+_hits_lock = threading.Lock()
+
+
+def match_rules(messages: List[str]) -> List[Optional[Rule]]:
+    ruleset = registry.get("rules")
+    if ruleset is None:
+        return [None] * len(messages)
+    matched = [ruleset.match(m) for m in messages]
+    counts = Counter(rule.name for rule in matched if rule is not None)
+    if counts:
+        with _hits_lock:
+            _hits.update(counts)
+    return matched
+
+
+def match_rule(message: str) -> Optional[Rule]:
+    return match_rules([message])[0]
 
-def is_out_of_scope(text: str) -> bool:
-    text = text.lower()
-    if any(k in text for k in OUT_OF_SCOPE):
-        return True
-    # Thêm regex để bắt "kể chuyện", "chuyện cười", v.v.
-    if re.search(r'(kể\s+chuyện|chuyện cười|kể\s+truyện|joke)', text):
-        return True
-    return False
 
 def apply_rules(message: str) -> tuple[bool, str]:
-    if is_greeting(message):
-        return True, "Xin chào! Tôi là trợ lý AI. Hỏi tôi về task, rủi ro, phân công, hoặc hiệu suất nhé!"
-    if is_out_of_scope(message):
-        return True, "Xin lỗi, tôi chỉ hỗ trợ công việc. Hỏi về task, deadline, kỹ năng, hoặc báo cáo nhé!"
-    return False, ""
\ No newline at end of file
+    rule = match_rule(message)
+    if rule is None:
+        return False, ""
+    return True, rule.reply
+
+
+def apply_rules_batch(messages: List[str]) -> List[tuple]:
+    return [(True, rule.reply) if rule else (False, "") for rule in match_rules(messages)]
+
+
+def rule_stats() -> dict:
+    ruleset = registry.get("rules")
+    rules = ruleset.rules if ruleset else []
+    with _hits_lock:
+        hits = dict(_hits)
+    return {
+        "rules": [{"name": r.name, "intent": r.intent, "priority": r.priority, "hits": hits.get(r.name, 0)} for r in rules],
+        "total_hits": sum(hits.values()),
+    }
@@ -1,21 +1,158 @@
-from sqlalchemy.orm import Session
+# ai/task_ordering.py
+# Gợi ý thứ tự làm task cho 1 user:
+#   score = trọng số priority * 10 + max(0, 10 - số ngày còn lại)   (không có hạn chót → chỉ priority)
+# Điểm tính ngay trong SQL trên trạng thái hiện tại (TaskStatuses.is_current), ORDER BY score + LIMIT k
+# → Postgres chỉ giữ top-k, không kéo mọi task của user về Python.
+#
+# Kết quả được cache theo user (TaskOrderCache). Cache chỉ bật khi ChangeListener (ai/change_listener.py)
+# đang LISTEN kênh task_order_changed (trigger trong workdb.sql gửi user_id khi phân công / trạng thái / hạn chót
+# / priority đổi) → entry của user bị bỏ ngay khi task của user đó đổi. Ngoài ra entry tự hết hạn
+# đúng lúc "số ngày còn lại" của 1 task của user qua mốc mới (điểm deadline đổi), tối đa MAX_AGE.
+import time
+import threading
 from datetime import datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+TOP_K = 5
+CHANNEL = "task_order_changed"
+TRIGGERS = ("trg_taskassignments_order_changed", "trg_taskstatuses_order_changed", "trg_tasks_order_changed")
+MAX_AGE = 3600.0  # giây: giới hạn tuổi entry cache kể cả khi không có thay đổi nào (< 1 ngày)
 
-def suggest_task_order(user_id: int, db: Session) -> list:
-    tasks = db.execute("""
-        SELECT t.task_id, t.title, t.due_date, t.priority
+# days_left = floor((due_date - now) / 1 ngày), giống timedelta.days ở bản Python cũ. title chỉ lấy cho k dòng cuối.
+# next_change: thời điểm sớm nhất 1 task có thể làm đổi top-k đổi days_left (điểm +1): task trong top-k,
+# hoặc task ngoài có điểm >= điểm thứ k - 1; chỉ task days_left <= 10 (xa hơn max(0, 10 - days_left) vẫn = 0).
+# Mỗi task tăng điểm tối đa 1 lần / ngày → đúng khi MAX_AGE < 1 ngày
+USER_TASK_ORDER_QUERY = text("""
+    WITH open_tasks AS (
+        SELECT t.task_id, t.due_date,
+               (CASE t.priority WHEN 'High' THEN 3 WHEN 'Medium' THEN 2 ELSE 1 END * 10
+                + COALESCE(GREATEST(0, 10 - floor(EXTRACT(EPOCH FROM t.due_date - now()) / 86400)), 0))::int AS score,
+               floor(EXTRACT(EPOCH FROM t.due_date - now()) / 86400) AS days_left
         FROM TaskAssignments ta
         JOIN Tasks t ON ta.task_id = t.task_id
-        WHERE ta.user_id = :uid AND t.status_name != 'done'
-        ORDER BY t.due_date
-    """, {"uid": user_id}).fetchall()
-
-    now = datetime.now()
-    scored = []
-    for t in tasks:
-        days_left = (t.due_date - now).days if t.due_date else 999
-        priority_score = {"High": 3, "Medium": 2, "Low": 1}.get(t.priority, 1)
-        score = priority_score * 10 + max(0, 10 - days_left)
-        scored.append({"task_id": t.task_id, "title": t.title, "score": score})
-
-    return sorted(scored, key=lambda x: x["score"], reverse=True)[:5]
\ No newline at end of file
+        WHERE ta.user_id = :uid AND NOT EXISTS (
+            SELECT 1 FROM TaskStatuses ts
+            WHERE ts.task_id = t.task_id AND ts.is_current AND ts.status_name = 'done'
+        )
+    ), top AS (
+        SELECT task_id, due_date, score
+        FROM open_tasks
+        ORDER BY score DESC, due_date ASC NULLS LAST, task_id
+        LIMIT :k
+    )
+    SELECT top.task_id, t.title, top.score,
+           (SELECT MIN(o.due_date - o.days_left * interval '1 day') FROM open_tasks o
+            WHERE o.days_left <= 10 AND o.score >= (SELECT MIN(score) FROM top) - 1) AS next_change
+    FROM top
+    JOIN Tasks t ON t.task_id = top.task_id
+    ORDER BY top.score DESC, top.due_date ASC NULLS LAST, top.task_id
+""")
+
+# Index hỗ trợ (có sẵn trong workdb.sql): join theo user + kiểm tra trạng thái hiện tại chỉ đọc index
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_taskassignments_user_task ON TaskAssignments(user_id, task_id)",
+    "CREATE INDEX IF NOT EXISTS idx_taskstatuses_current_status ON TaskStatuses(task_id, status_name) WHERE is_current",
+]
+
+
+def _rows_to_order(rows) -> Tuple[list, Optional[datetime]]:
+    result = [{"task_id": r.task_id, "title": r.title, "score": r.score} for r in rows]
+    return result, (rows[0].next_change if rows else None)
+
+
+class TaskOrderCache:
+    def __init__(self, max_age: float = MAX_AGE):
+        self.max_age = max_age
+        self.listening = False  # do ChangeListener bật / tắt
+        self._entries: Dict[Tuple[int, int], Tuple[list, float]] = {}  # (user_id, k) → (kết quả, hết hạn lúc)
+        # Thế hệ theo user (+ epoch cho clear): kết quả truy vấn trước 1 lần invalidate không được ghi đè vào
+        self._gen: Dict[int, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def token(self, user_id: int) -> tuple:
+        # Lấy trước khi truy vấn, truyền lại cho put()
+        with self._lock:
+            return self._epoch, self._gen.get(user_id, 0)
+
+    def get(self, user_id: int, k: int) -> Optional[list]:
+        if not self.listening:
+            return None
+        with self._lock:
+            entry = self._entries.get((user_id, k))
+            if entry is not None and time.time() < entry[1]:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, user_id: int, k: int, result: list, next_change: Optional[datetime], token: tuple):
+        if not self.listening:
+            return
+        expires = time.time() + self.max_age
+        if next_change is not None:
+            expires = min(expires, next_change.timestamp())
+        with self._lock:
+            if token == (self._epoch, self._gen.get(user_id, 0)):
+                self._entries[(user_id, k)] = (result, expires)
+
+    def invalidate_users(self, user_ids):
+        user_ids = set(user_ids)
+        with self._lock:
+            for uid in user_ids:
+                self._gen[uid] = self._gen.get(uid, 0) + 1
+            stale = [key for key in self._entries if key[0] in user_ids]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._gen.clear()
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "listening": self.listening,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "invalidations": self.invalidations,
+        }
+
+
+order_cache = TaskOrderCache()
+
+
+def suggest_task_order(user_id: int, db: Session, k: int = TOP_K) -> list:
+    cached = order_cache.get(user_id, k)
+    if cached is not None:
+        return cached
+    token = order_cache.token(user_id)
+    rows = db.execute(USER_TASK_ORDER_QUERY, {"uid": user_id, "k": k}).fetchall()
+    result, next_change = _rows_to_order(rows)
+    order_cache.put(user_id, k, result, next_change, token)
+    return result
+
+
+async def asuggest_task_order(db, user_id: int, k: int = TOP_K) -> list:
+    # Bản async (AsyncSession): db đứng trước như các hàm chạy qua SessionRunner.query
+    cached = order_cache.get(user_id, k)
+    if cached is not None:
+        return cached
+    token = order_cache.token(user_id)
+    rows = (await db.execute(USER_TASK_ORDER_QUERY, {"uid": user_id, "k": k})).fetchall()
+    result, next_change = _rows_to_order(rows)
+    order_cache.put(user_id, k, result, next_change, token)
+    return result
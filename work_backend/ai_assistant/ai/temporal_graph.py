@@ -0,0 +1,304 @@
+# ai/temporal_graph.py
+# Graph task cho model rủi ro, cập nhật tăng dần và sống lâu trong process.
+#
+# Thay vì dựng lại graph từ DB mỗi lần, store giữ:
+#   - node (task / user / phòng ban / skill) và cạnh vô hướng, chỉ thêm mới — trừ cạnh task / user–phòng ban:
+#     task đổi part_id (Tasks.updated_at) / Users.department_id đổi → chuyển cạnh sang phòng ban mới
+#   - trạng thái hiện tại của task (để biết task nào đang mở)
+# Chỉ có cấu trúc graph: model (ai/risk_train.py) chỉ học trên loại node + cạnh, nên store không giữ memory /
+# feature theo thời gian của node — thêm lại khi có model train được với chúng.
+# advance(db) chỉ đọc các dòng sau watermark của từng nguồn ((thời điểm, id, key) tăng dần; key chỉ dùng khi
+# khóa chính có 2 cột như Task_Required_Skills)
+# → chi phí refresh tỉ lệ với số sự kiện mới, không phải toàn bộ lịch sử.
+# snapshot ra models/risk_graph.npz (ghi atomic) → restart không phải replay lại từ đầu.
+#
+# Watermark không thấy DELETE / dòng bị sửa lùi thời gian → rebuild() định kỳ (build_risk_graph trong
+# ai/risk_tgn.py gọi khi graph cũ hơn REBUILD_INTERVAL).
+import io
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .model_registry import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = "models/risk_graph.npz"
+SNAPSHOT_FORMAT = 4  # 2: watermark (ts, id, key), user_dept; 3: bỏ memory / feature node; 4: task_dept
+
+NODE_TASK, NODE_USER, NODE_DEPARTMENT, NODE_SKILL = 0, 1, 2, 3
+STATUSES = ['pending', 'in_progress', 'review', 'done', 'archived']
+CLOSED_STATUSES = {STATUSES.index('done'), STATUSES.index('archived')}
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Mỗi nguồn: câu truy vấn lấy dòng sau watermark (ts, id[, key]), sắp theo đúng thứ tự watermark.
+# Watermark phải là khóa duy nhất của dòng: cùng ts mà chỉ so ts thì dòng sau bị bỏ qua / áp dụng lại
+_SOURCES = {
+    "users": """
+        SELECT user_id, department_id, COALESCE(updated_at, TIMESTAMPTZ 'epoch') AS ts, user_id AS id
+        FROM Users
+        WHERE (COALESCE(updated_at, TIMESTAMPTZ 'epoch'), user_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+    "tasks": """
+        SELECT t.task_id, pp.department_id,
+               COALESCE(t.updated_at, t.created_at, TIMESTAMPTZ 'epoch') AS ts, t.task_id AS id
+        FROM Tasks t LEFT JOIN ProjectParts pp ON pp.part_id = t.part_id
+        WHERE (COALESCE(t.updated_at, t.created_at, TIMESTAMPTZ 'epoch'), t.task_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+    "assignments": """
+        SELECT ta.task_id, ta.user_id, u.department_id,
+               COALESCE(ta.assigned_at, TIMESTAMPTZ 'epoch') AS ts, ta.assignment_id AS id
+        FROM TaskAssignments ta JOIN Users u ON u.user_id = ta.user_id
+        WHERE (COALESCE(ta.assigned_at, TIMESTAMPTZ 'epoch'), ta.assignment_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+    "task_skills": """
+        SELECT task_id, skill_name, COALESCE(updated_at, TIMESTAMPTZ 'epoch') AS ts, task_id AS id, skill_name AS key
+        FROM Task_Required_Skills
+        WHERE (COALESCE(updated_at, TIMESTAMPTZ 'epoch'), task_id, skill_name) > (:ts, :id, :key)
+        ORDER BY ts, id, key
+    """,
+    "user_skills": """
+        SELECT user_id, skill_name, COALESCE(updated_at, TIMESTAMPTZ 'epoch') AS ts, skill_id AS id
+        FROM User_skills
+        WHERE (COALESCE(updated_at, TIMESTAMPTZ 'epoch'), skill_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+    "histories": """
+        SELECT task_id, user_id, COALESCE(created_at, TIMESTAMPTZ 'epoch') AS ts, history_id AS id
+        FROM Taskhistories
+        WHERE (COALESCE(created_at, TIMESTAMPTZ 'epoch'), history_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+    "statuses": """
+        SELECT task_id, status_name, is_current, COALESCE(updated_at, TIMESTAMPTZ 'epoch') AS ts, status_id AS id
+        FROM TaskStatuses
+        WHERE (COALESCE(updated_at, TIMESTAMPTZ 'epoch'), status_id) > (:ts, :id)
+        ORDER BY ts, id
+    """,
+}
+
+
+class TemporalGraphStore:
+    def __init__(self, capacity: int = 256):
+        self._lock = threading.Lock()
+        self.index: Dict[tuple, int] = {}
+        self.keys = []
+        self.n_nodes = 0
+        self.node_type = np.zeros(capacity, dtype=np.int64)
+        self.status = np.full(capacity, -1, dtype=np.int8)
+        self.edge_set = set()
+        self.n_edges = 0
+        self.edges = np.zeros((2, capacity), dtype=np.int64)
+        self.user_dept: Dict[int, Optional[int]] = {}  # user đã được giao việc → phòng ban đang nối cạnh
+        self.task_dept: Dict[int, Optional[int]] = {}  # task → phòng ban (của ProjectParts) đang nối cạnh
+        self.watermarks = {name: (_EPOCH, 0, "") for name in _SOURCES}
+        self.events_applied = 0
+        self.last_advance_ms = None
+        self.last_advance_events = 0
+        self.version = 0  # tăng mỗi khi graph đổi
+        self.built_at = time.time()  # lần dựng lại từ đầu gần nhất (giữ qua snapshot)
+
+    # ---------- node / cạnh ----------
+    def _grow_nodes(self, needed: int):
+        cap = len(self.node_type)
+        if needed <= cap:
+            return
+        extra = max(needed, cap * 2) - cap
+        self.node_type = np.concatenate([self.node_type, np.zeros(extra, dtype=np.int64)])
+        self.status = np.concatenate([self.status, np.full(extra, -1, dtype=np.int8)])
+
+    def node(self, kind: int, key) -> int:
+        k = (kind, key)
+        i = self.index.get(k)
+        if i is None:
+            self._grow_nodes(self.n_nodes + 1)
+            i = self.index[k] = self.n_nodes
+            self.keys.append(k)
+            self.node_type[i] = kind
+            self.n_nodes += 1
+        return i
+
+    def edge(self, a: int, b: int):
+        pair = (a, b) if a < b else (b, a)
+        if pair in self.edge_set:
+            return
+        self.edge_set.add(pair)
+        if self.n_edges == self.edges.shape[1]:
+            self.edges = np.concatenate([self.edges, np.zeros_like(self.edges)], axis=1)
+        self.edges[:, self.n_edges] = pair
+        self.n_edges += 1
+
+    def remove_edge(self, a: int, b: int):
+        pair = (a, b) if a < b else (b, a)
+        if pair not in self.edge_set:
+            return
+        self.edge_set.discard(pair)
+        e = self.n_edges
+        j = int(np.flatnonzero((self.edges[0, :e] == pair[0]) & (self.edges[1, :e] == pair[1]))[0])
+        self.edges[:, j] = self.edges[:, e - 1]  # cột cuối lấp chỗ trống, thứ tự cạnh không quan trọng
+        self.n_edges -= 1
+
+    # ---------- sự kiện ----------
+    def _set_dept(self, kind: int, key: int, dept_id: Optional[int], depts: Dict[int, Optional[int]]):
+        # Nối node (task / user) với phòng ban hiện tại, bỏ cạnh tới phòng ban cũ nếu đã đổi
+        old = depts.get(key)
+        if key in depts and old == dept_id:
+            return
+        i = self.node(kind, key)
+        if old is not None:
+            self.remove_edge(i, self.node(NODE_DEPARTMENT, old))
+        if dept_id is not None:
+            self.edge(i, self.node(NODE_DEPARTMENT, dept_id))
+        depts[key] = dept_id
+
+    def _apply(self, name: str, row):
+        if name == "users":
+            # Chỉ user đã có cạnh phòng ban (được giao việc) — giống graph lúc train (ai/risk_train.py)
+            if row[0] in self.user_dept:
+                self._set_dept(NODE_USER, row[0], row[1], self.user_dept)
+        elif name == "tasks":
+            # Đọc lại mỗi lần task được sửa (updated_at) → part_id / phòng ban đổi thì chuyển cạnh
+            self._set_dept(NODE_TASK, row[0], row[1], self.task_dept)
+        elif name == "assignments":
+            task_id, user_id, dept_id = row[0], row[1], row[2]
+            self.edge(self.node(NODE_TASK, task_id), self.node(NODE_USER, user_id))
+            self._set_dept(NODE_USER, user_id, dept_id, self.user_dept)
+        elif name == "task_skills":
+            self.edge(self.node(NODE_TASK, row[0]), self.node(NODE_SKILL, row[1]))
+        elif name == "user_skills":
+            self.edge(self.node(NODE_USER, row[0]), self.node(NODE_SKILL, row[1]))
+        elif name == "histories":
+            # Người từng cập nhật task cũng nối với task (như TaskAssignments), giống graph lúc train
+            self.edge(self.node(NODE_TASK, row[0]), self.node(NODE_USER, row[1]))
+        elif name == "statuses":
+            # Trạng thái hiện tại chỉ lấy từ TaskStatuses.is_current
+            task_id, status_name, is_current = row[0], row[1], row[2]
+            if is_current and status_name in STATUSES:
+                self.status[self.node(NODE_TASK, task_id)] = STATUSES.index(status_name)
+
+    def advance(self, db: Session) -> int:
+        # Áp dụng các dòng mới của mọi nguồn; trả về số dòng đã áp dụng
+        with self._lock:
+            t0 = time.perf_counter()
+            applied = 0
+            for name, sql in _SOURCES.items():
+                ts, last_id, last_key = self.watermarks[name]
+                rows = db.execute(text(sql), {"ts": ts, "id": last_id, "key": last_key}).fetchall()
+                for row in rows:
+                    self._apply(name, row)
+                if rows:
+                    last = rows[-1]._mapping
+                    self.watermarks[name] = (last["ts"], last["id"], last.get("key", ""))
+                    applied += len(rows)
+            if applied:
+                self.version += 1
+            self.events_applied += applied
+            self.last_advance_events = applied
+            self.last_advance_ms = round((time.perf_counter() - t0) * 1000, 3)
+            return applied
+
+    def rebuild(self, db: Session) -> int:
+        fresh = TemporalGraphStore()
+        applied = fresh.advance(db)
+        with self._lock:
+            version = self.version
+            self.__dict__.update({k: v for k, v in fresh.__dict__.items() if k != "_lock"})
+            self.version = version + 1
+        return applied
+
+    # ---------- đọc ----------
+    def open_task_mask(self) -> np.ndarray:
+        n = self.n_nodes
+        is_task = self.node_type[:n] == NODE_TASK
+        closed = np.isin(self.status[:n], list(CLOSED_STATUSES))
+        return is_task & ~closed
+
+    def snapshot_arrays(self):
+        # (node_type, edge_index 2 chiều, task_mask các task đang mở, task_ids)
+        with self._lock:
+            n, e = self.n_nodes, self.n_edges
+            pairs = self.edges[:, :e]
+            edge_index = np.concatenate([pairs, pairs[::-1]], axis=1)
+            mask = self.open_task_mask()
+            task_ids = [self.keys[i][1] for i in np.flatnonzero(mask)]
+            return self.node_type[:n].copy(), edge_index, mask, task_ids
+
+    # ---------- snapshot ----------
+    def save(self, path: str = SNAPSHOT_PATH):
+        with self._lock:
+            n, e = self.n_nodes, self.n_edges
+            meta = {
+                "format": SNAPSHOT_FORMAT,
+                "keys": [[k, key] for k, key in self.keys],
+                "watermarks": {name: [ts.isoformat(), int(i), key] for name, (ts, i, key) in self.watermarks.items()},
+                "user_dept": [[user_id, dept_id] for user_id, dept_id in self.user_dept.items()],
+                "task_dept": [[task_id, dept_id] for task_id, dept_id in self.task_dept.items()],
+                "events_applied": self.events_applied,
+                "built_at": self.built_at,
+            }
+            buf = io.BytesIO()
+            np.savez(buf, meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+                     node_type=self.node_type[:n], status=self.status[:n], edges=self.edges[:, :e])
+        atomic_write(path, lambda f: f.write(buf.getvalue()))
+
+    @classmethod
+    def load(cls, path: str = SNAPSHOT_PATH) -> 'TemporalGraphStore':
+        with np.load(path) as z:
+            meta = json.loads(z["meta"].tobytes().decode('utf-8'))
+            if meta.get("format") != SNAPSHOT_FORMAT:
+                raise ValueError(f"{path}: snapshot format {meta.get('format')} không hỗ trợ")
+            store = cls(capacity=max(len(z["node_type"]), 1))
+            n = len(z["node_type"])
+            store.n_nodes = n
+            store.node_type[:n] = z["node_type"]
+            store.status[:n] = z["status"]
+            store.edges = np.array(z["edges"], dtype=np.int64)
+        store.n_edges = store.edges.shape[1]
+        if store.n_edges == 0:
+            store.edges = np.zeros((2, 64), dtype=np.int64)
+        store.edge_set = set(map(tuple, store.edges[:, :store.n_edges].T.tolist()))
+        store.keys = [(k, key) for k, key in meta["keys"]]
+        store.index = {k: i for i, k in enumerate(store.keys)}
+        store.watermarks = {name: (datetime.fromisoformat(ts), i, key)
+                            for name, (ts, i, key) in meta["watermarks"].items()}
+        for name in _SOURCES:
+            store.watermarks.setdefault(name, (_EPOCH, 0, ""))
+        store.user_dept = {user_id: dept_id for user_id, dept_id in meta["user_dept"]}
+        store.task_dept = {task_id: dept_id for task_id, dept_id in meta["task_dept"]}
+        store.events_applied = meta.get("events_applied", 0)
+        store.built_at = meta.get("built_at", 0.0)
+        return store
+
+    def stats(self) -> dict:
+        return {
+            "nodes": self.n_nodes,
+            "edges": self.n_edges,
+            "open_tasks": int(self.open_task_mask().sum()),
+            "events_applied": self.events_applied,
+            "built_at": datetime.fromtimestamp(self.built_at, timezone.utc).isoformat(),
+            "last_advance_events": self.last_advance_events,
+            "last_advance_ms": self.last_advance_ms,
+            "watermarks": {name: ts.isoformat() for name, (ts, _, _) in self.watermarks.items()},
+        }
+
+
+def load_or_create(path: str = SNAPSHOT_PATH) -> TemporalGraphStore:
+    try:
+        store = TemporalGraphStore.load(path)
+        logger.info(f"Temporal graph: load snapshot {path} ({store.n_nodes} node, {store.n_edges} cạnh)")
+        return store
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Load snapshot {path} lỗi: {e} → dựng lại")
+    return TemporalGraphStore()
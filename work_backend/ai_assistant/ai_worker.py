@@ -0,0 +1,251 @@
+# ai_assistant/ai_worker.py
+# Worker AI chạy lâu dài: import model + tạo DB pool 1 lần, sau đó nhận request
+# dạng JSON theo từng dòng qua stdin/stdout hoặc unix socket.
+#
+# Request : {"id": 1, "op": "intent", "args": {"message": "Task 2 có rủi ro không?"}}
+# Response: {"id": 1, "ok": true, "result": ...}
+#
+# "result" giữ nguyên output của các wrapper cũ:
+#   intent     -> {"intent": ..., "confidence": ..., ["reply": ...]}  (intent_classifier_wrapper.py)
+#   assignment -> [ {user_id, name, ucb_score, reason}, ... ]         (assignment_suggester_wrapper.py)
+#   risk       -> "0.523,Trung bình"                                  (risk_predictor_wrapper.py)
+#   risk_all   -> {task_id: {risk_score, risk_level, top_factors}}    (risk_predictor_wrapper.py --all)
+#   risk_scores-> {task_id: {..., model_version, computed_at}}        (bảng Task_Risk_Scores)
+#   ordering   -> [ {task_id, title, score}, ... ]                    (task_ordering_wrapper.py)
+#   reward     -> true khi reward đã được ghi xuống reward log
+#   models     -> thống kê load/reload của model registry
+#   rules      -> số lần khớp của từng rule trong ai/rules.json
+import sys
+import os
+import io
+import json
+import argparse
+import logging
+import socketserver
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# Giữ stdout thật cho protocol, mọi print() của module AI chuyển sang stderr
+_PROTOCOL_OUT = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', line_buffering=True)
+sys.stdout = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', line_buffering=True)
+sys.stderr = sys.stdout
+
+from ai.rule_engine import match_rule, rule_stats
+from ai.intent_classifier import predict_intent
+from ai.assignment_bandit import suggest_assignee_bandit
+from ai.risk_tgn import predict_risk_advanced, predict_risk_bulk
+from ai.task_ordering import suggest_task_order
+from ai.change_listener import start_listener
+from ai.model_registry import registry
+from ai.assignment_rl import update_bandit_on_completion
+from ai.reward_log import RewardApplier
+from ai.risk_scores import RiskRefresher, get_task_risks
+from database import SessionLocal
+
+logger = logging.getLogger("ai_worker")
+
+_STARTED_AT = time.time()
+
+
+def op_intent(args: dict):
+    message = str(args.get("message", "")).strip()
+    if not message:
+        return {"intent": "unknown", "confidence": 0.0}
+
+    rule = match_rule(message)
+    if rule is not None:
+        return {"intent": rule.intent, "confidence": 1.0, "reply": rule.reply}
+
+    intent, confidence = predict_intent(message)
+    if confidence < 0.3:
+        intent = "unknown"
+        confidence = 0.0
+    return {"intent": intent, "confidence": confidence}
+
+
+def op_assignment(args: dict):
+    task_id = str(args.get("task_id", ""))
+    if not task_id.isdigit():
+        return []
+    db = SessionLocal()
+    try:
+        return suggest_assignee_bandit(task_id=int(task_id), db=db, top_k=int(args.get("top_k", 3)))
+    except Exception as e:
+        logger.warning(f"assignment lỗi: {e}")
+        return []
+    finally:
+        db.close()
+
+
+def op_risk(args: dict):
+    db = SessionLocal()
+    try:
+        result = predict_risk_advanced(int(args["task_id"]), db)
+        score = result.get('risk_score', 0.5)
+        level = result.get('risk_level', 'Thấp')
+        return f"{score},{level}"
+    except Exception as e:
+        logger.warning(f"risk lỗi: {e}")
+        return "0.5,Thấp"
+    finally:
+        db.close()
+
+
+def op_risk_all(args: dict):
+    # Rủi ro mọi task đang mở từ 1 lần forward trên cả graph (args.task_ids để lọc)
+    db = SessionLocal()
+    try:
+        task_ids = args.get("task_ids")
+        result = predict_risk_bulk(db, [int(t) for t in task_ids] if task_ids else None)
+        return {str(tid): r for tid, r in result.items()}
+    finally:
+        db.close()
+
+
+def op_risk_scores(args: dict):
+    # Điểm tính sẵn; args.max_staleness (giây) → điểm cũ hơn thì tính lại
+    db = SessionLocal()
+    try:
+        max_staleness = args.get("max_staleness")
+        result = get_task_risks(db, [int(t) for t in args.get("task_ids", [])],
+                                float(max_staleness) if max_staleness is not None else None)
+        return {str(tid): r for tid, r in result.items()}
+    finally:
+        db.close()
+
+
+def op_ordering(args: dict):
+    db = SessionLocal()
+    try:
+        return suggest_task_order(int(args["user_id"]), db)
+    finally:
+        db.close()
+
+
+def op_reward(args: dict):
+    # Task hoàn thành → ghi reward vào log (RewardApplier sẽ gom và cập nhật model)
+    db = SessionLocal()
+    try:
+        update_bandit_on_completion(db, int(args["task_id"]), int(args["user_id"]), bool(args.get("is_success", True)))
+        return True
+    finally:
+        db.close()
+
+
+def op_ping(args: dict):
+    return {"pid": os.getpid(), "uptime": round(time.time() - _STARTED_AT, 3)}
+
+
+def op_models(args: dict):
+    return registry.stats()
+
+
+def op_rules(args: dict):
+    return rule_stats()
+
+
+OPS = {
+    "intent": op_intent,
+    "assignment": op_assignment,
+    "risk": op_risk,
+    "risk_all": op_risk_all,
+    "risk_scores": op_risk_scores,
+    "ordering": op_ordering,
+    "reward": op_reward,
+    "ping": op_ping,
+    "models": op_models,
+    "rules": op_rules,
+}
+
+
+def handle_line(line: str) -> str:
+    req_id = None
+    try:
+        req = json.loads(line)
+        req_id = req.get("id")
+        handler = OPS.get(req.get("op"))
+        if handler is None:
+            raise ValueError(f"op không hợp lệ: {req.get('op')}")
+        result = handler(req.get("args") or {})
+        resp = {"id": req_id, "ok": True, "result": result}
+    except Exception as e:
+        resp = {"id": req_id, "ok": False, "error": str(e)}
+    return json.dumps(resp, ensure_ascii=False)
+
+
+def warmup():
+    # Load sẵn mọi model vào registry, mở sẵn 1 kết nối DB
+    for name in ("intent", "linucb", "risk_tgn"):
+        registry.get(name)
+    db = SessionLocal()
+    try:
+        db.connection()
+    except Exception as e:
+        logger.warning(f"Không kết nối được DB lúc warmup: {e}")
+    finally:
+        db.close()
+
+
+def serve_stdio():
+    stdin = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        _PROTOCOL_OUT.write(handle_line(line) + "\n")
+
+
+class _LineHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            line = raw.decode('utf-8').strip()
+            if not line:
+                continue
+            self.wfile.write((handle_line(line) + "\n").encode('utf-8'))
+            self.wfile.flush()
+
+
+class _ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve_socket(path: str):
+    if os.path.exists(path):
+        os.unlink(path)
+    with _ThreadingUnixServer(path, _LineHandler) as server:
+        logger.info(f"AI worker lắng nghe tại {path}")
+        server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI worker (JSON lines)")
+    parser.add_argument("--socket", help="Đường dẫn unix socket; bỏ trống → dùng stdin/stdout")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--applier", action="store_true", help="Chạy RewardApplier nền trong worker này")
+    parser.add_argument("--risk-refresher", action="store_true", help="Chạy RiskRefresher nền trong worker này")
+    parser.add_argument("--change-listener", action="store_true",
+                        help="Bật cache thứ tự task / context task, index ứng viên theo thông báo DB (LISTEN)")
+    args = parser.parse_args()
+
+    if not args.no_warmup:
+        warmup()  # migrate .pkl → .lucb trước khi applier ghi store
+    if args.applier:
+        RewardApplier().start()
+    if args.risk_refresher:
+        RiskRefresher(SessionLocal).start()
+    if args.change_listener:
+        start_listener()
+    # Báo cho phía Node biết worker đã sẵn sàng
+    _PROTOCOL_OUT.write(json.dumps({"id": None, "ok": True, "result": "ready"}) + "\n")
+
+    if args.socket:
+        serve_socket(args.socket)
+    else:
+        serve_stdio()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench/bench_context_parity.py
+# Parity feature LinUCB: get_context_matrix (1 task × mọi user, set-based) và get_context_pairs (cặp bất kỳ,
+# dùng khi retrain) phải ra đúng vector của get_context_vector (5 truy vấn / cặp) cho từng (user, task).
+# Dữ liệu: workload.py (seed cố định) trong schema riêng, xóa khi xong (--keep để giữ).
+# Thoát mã 1 nếu lệch tuyệt đối lớn nhất > --tolerance (mặc định 1e-9) hoặc thiếu / thừa user.
+# Chạy từ thư mục ai_assistant: python bench/bench_context_parity.py --users 200 --tasks 30
+import sys
+import os
+import time
+import json
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for p in (ROOT_DIR, BENCH_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import numpy as np
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from config import settings
+import workload
+from ai.assignment_bandit import get_context_vector, get_context_matrix, get_context_pairs
+
+SCHEMA = "bench_context_parity"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=30, help="Số task lấy mẫu để so")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    with engine.begin() as conn:
+        workload.generate(conn, SCHEMA, args.users, seed=args.seed)
+    workload.vacuum(engine, SCHEMA)
+
+    failures = []
+    try:
+        with Session(engine) as db:
+            all_tasks = [r[0] for r in db.execute(text("SELECT task_id FROM Tasks ORDER BY task_id")).fetchall()]
+            rng = np.random.default_rng(args.seed)
+            task_ids = sorted(rng.choice(all_tasks, min(args.tasks, len(all_tasks)), replace=False).tolist())
+            matrix_diff = pairs_diff = 0.0
+            pairs = 0
+            t_vector = t_matrix = t_pairs = 0.0
+            for tid in task_ids:
+                t0 = time.perf_counter()
+                user_ids, X = get_context_matrix(db, tid)
+                t_matrix += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                expected = np.array([get_context_vector(db, uid, tid) for uid in user_ids.tolist()]).reshape(-1, 5)
+                t_vector += time.perf_counter() - t0
+                t0 = time.perf_counter()
+                P = get_context_pairs(db, user_ids, np.full(len(user_ids), tid))
+                t_pairs += time.perf_counter() - t0
+                if len(user_ids) != args.users:
+                    failures.append(f"task {tid}: get_context_matrix trả {len(user_ids)} / {args.users} user")
+                if len(user_ids):
+                    matrix_diff = max(matrix_diff, float(np.abs(X - expected).max()))
+                    pairs_diff = max(pairs_diff, float(np.abs(P - expected).max()))
+                pairs += len(user_ids)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    for name, diff in (("get_context_matrix", matrix_diff), ("get_context_pairs", pairs_diff)):
+        if not diff <= args.tolerance:
+            failures.append(f"{name}: lệch tối đa {diff:.3e} > {args.tolerance:g}")
+    result = {
+        "tasks": len(task_ids), "pairs": pairs,
+        "matrix_max_abs_diff": matrix_diff, "pairs_max_abs_diff": pairs_diff,
+        "vector_ms": round(t_vector * 1000, 1), "matrix_ms": round(t_matrix * 1000, 1),
+        "pairs_ms": round(t_pairs * 1000, 1),
+        "failures": failures,
+    }
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# bench/bench_intent.py
+# So sánh IntentScorer (numpy, file .npz) với model scikit-learn gốc (pickle):
+#   - parity: nhãn + xác suất trên TRAIN_DATA và các biến thể sinh ngẫu nhiên — thoát mã 1 nếu có nhãn khác
+#     hoặc xác suất lệch > --tolerance (mặc định 1e-9)
+#   - throughput: sklearn từng tin (predict_proba + predict như code cũ), sklearn batch, numpy batch
+# Chạy từ thư mục ai_assistant: python bench/bench_intent.py --messages 20000
+import sys
+import os
+import time
+import json
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from ai.intent_classifier import TRAIN_DATA, _load_pickles
+from ai.intent_scorer import IntentScorer, export_intent_model
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def make_messages(n: int, rng) -> list:
+    base = [text for text, _ in TRAIN_DATA]
+    extra = ["task", "rủi ro", "ai", "làm", "trước", "tuần này", "deadline", "giúp", "xin chào", "hôm nay", "?", "!!"]
+    out = []
+    for _ in range(n):
+        words = rng.choice(base).split() + list(rng.choice(extra, size=rng.integers(0, 4)))
+        rng.shuffle(words)
+        out.append(" ".join(words))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tolerance", type=float, default=1e-9)
+    args = parser.parse_args()
+
+    model, vectorizer = _load_pickles()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "intent_model.npz")
+        export_intent_model(model, vectorizer, path)
+        scorer = IntentScorer(path)
+
+    rng = np.random.default_rng(args.seed)
+    messages = [t.lower().strip() for t in make_messages(args.messages, rng)]
+    parity_msgs = [t.lower().strip() for t, _ in TRAIN_DATA] + messages[:2000] + ["", "!!!", "từ hoàn toàn mới"]
+
+    sk_proba = model.predict_proba(vectorizer.transform(parity_msgs))
+    np_proba = scorer.predict_proba(parity_msgs)
+    sk_labels = model.classes_[sk_proba.argmax(axis=1)]
+    np_labels = [label for label, _ in scorer.predict(parity_msgs)]
+    mismatches = int(sum(a != b for a, b in zip(sk_labels, np_labels)))
+    max_diff = float(np.abs(sk_proba - np_proba).max())
+    failures = []
+    if mismatches:
+        failures.append(f"{mismatches} / {len(parity_msgs)} tin khác nhãn")
+    if not max_diff <= args.tolerance:
+        failures.append(f"xác suất lệch tối đa {max_diff:.3e} > {args.tolerance:g}")
+
+    def sklearn_single():
+        for m in messages:
+            X = vectorizer.transform([m])
+            model.predict_proba(X)[0]
+            model.predict(X)[0]
+
+    _, t_sk_single = timed(sklearn_single)
+    _, t_sk_batch = timed(lambda: model.predict_proba(vectorizer.transform(messages)))
+    _, t_np_batch = timed(lambda: scorer.predict(messages))
+    _, t_np_single = timed(lambda: [scorer.predict([m]) for m in messages[:2000]])
+
+    n = len(messages)
+    print(json.dumps({
+        "messages": n,
+        "parity": {
+            "checked": len(parity_msgs),
+            "label_mismatches": mismatches,
+            "max_proba_diff": max_diff,
+        },
+        "msgs_per_s": {
+            "sklearn_single_old_path": round(n / t_sk_single),
+            "sklearn_batch": round(n / t_sk_batch),
+            "numpy_batch": round(n / t_np_batch),
+            "numpy_single": round(2000 / t_np_single),
+        },
+        "speedup_vs_old_path": round(t_sk_single / max(t_np_batch, 1e-9), 1),
+        "failures": failures,
+    }, indent=2, ensure_ascii=False))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# bench/bench_linucb.py
+# So sánh LinUCB cũ (dict + np.linalg.inv mỗi lần) với BatchLinUCB (mảng + Sherman–Morrison).
+# Chạy: python bench/bench_linucb.py --users 2000 --updates 20000
+import sys
+import os
+import time
+import json
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from ai.assignment_bandit import LinUCB
+from ai.linucb_engine import BatchLinUCB
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--updates", type=int, default=20000)
+    parser.add_argument("--features", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    d = args.features
+    upd_users = rng.integers(1, args.users + 1, size=args.updates)
+    upd_X = rng.random((args.updates, d))
+    upd_r = rng.random(args.updates)
+    cand = np.arange(1, args.users + 1)
+    cand_X = rng.random((args.users, d))
+
+    old = LinUCB(n_features=d, alpha=1.5)
+    new = BatchLinUCB(n_features=d, alpha=1.5)
+
+    def old_update():
+        for u, x, r in zip(upd_users.tolist(), upd_X, upd_r):
+            old.update(u, x, r)
+
+    _, t_old_upd = timed(old_update)
+    _, t_new_upd = timed(lambda: new.update_batch(upd_users, upd_X, upd_r))
+
+    old_scores, t_old_pred = timed(lambda: np.array([old.predict(u, x) for u, x in zip(cand.tolist(), cand_X)]))
+    new_scores, t_new_pred = timed(lambda: new.predict_batch(cand, cand_X))
+
+    # Round-trip qua file .pkl theo cả 2 chiều
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "linucb.pkl")
+        new.save(path)
+        via_old = LinUCB.load(path)
+        old.save(path)
+        via_new = BatchLinUCB.load(path)
+    rt_old = np.array([via_old.predict(u, x) for u, x in zip(cand.tolist(), cand_X)])
+    rt_new = via_new.predict_batch(cand, cand_X)
+
+    print(json.dumps({
+        "users": args.users,
+        "updates": args.updates,
+        "update_s": {"linucb": round(t_old_upd, 4), "batch": round(t_new_upd, 4),
+                     "speedup": round(t_old_upd / max(t_new_upd, 1e-9), 1)},
+        "predict_s": {"linucb": round(t_old_pred, 4), "batch": round(t_new_pred, 4),
+                      "speedup": round(t_old_pred / max(t_new_pred, 1e-9), 1)},
+        "max_score_diff": float(np.abs(old_scores - new_scores).max()),
+        "max_roundtrip_diff": float(max(np.abs(rt_old - old_scores).max(), np.abs(rt_new - old_scores).max())),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
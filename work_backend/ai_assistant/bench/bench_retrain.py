@@ -0,0 +1,200 @@
+# bench/bench_retrain.py
+# So sánh retrain LinUCB từ Taskhistories:
+#   - bandit_old : fetchall() lịch sử + get_context_matrix mỗi task + update_batch (assignment_bandit cũ)
+#   - rl_old     : get_context_vector (5 truy vấn) + cập nhật A, b cho từng dòng (assignment_rl cũ, bỏ LIMIT 1000)
+#   - *_full     : ai/bandit_retrain.py — stream theo chunk, feature set-based / chunk, nghịch đảo 1 lần
+#   - bandit_incr: thêm --new-rows dòng lịch sử rồi retrain tiếp từ watermark (assignment_rl luôn train lại
+#                  từ đầu — chung file / watermark với assignment_bandit)
+# Kèm parity: A, b của bản mới == bản cũ; kết quả không phụ thuộc chunk size; incremental == model trước
+# + thống kê riêng phần lịch sử mới. (Không so incremental với full: full tính lại feature của dòng cũ
+# theo dữ liệu hiện tại — workload / past_success đổi khi có lịch sử mới.)
+# Dữ liệu sinh bởi bench/workload.py trong schema riêng (xóa khi xong, --keep để giữ); model ghi vào
+# thư mục tạm, không đụng models/ thật.
+# Chạy từ thư mục ai_assistant: python bench/bench_retrain.py --users 300
+import sys
+import os
+import time
+import json
+import shutil
+import argparse
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for p in (ROOT_DIR, BENCH_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import numpy as np
+from sqlalchemy import create_engine, text, event
+from sqlalchemy.orm import Session
+from config import settings
+import workload
+from ai.bandit_retrain import retrain_from_history
+
+SCHEMA = "bench_retrain"
+RL_ACTIONS = ["Hoàn thành", "Cập nhật tiến độ", "Quá hạn", "update_status"]
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def stats_of(user_ids, A, b) -> dict:
+    return {int(u): (np.asarray(A[i]), np.asarray(b[i]).ravel()) for i, u in enumerate(np.asarray(user_ids).tolist())}
+
+
+def diff(x: dict, y: dict) -> float:
+    if set(x) != set(y):
+        return float("inf")
+    return max((max(np.abs(x[u][0] - y[u][0]).max(), np.abs(x[u][1] - y[u][1]).max()) for u in x), default=0.0)
+
+
+def bandit_old(db: Session) -> dict:
+    from ai.assignment_bandit import get_context_matrix
+    from ai.linucb_engine import BatchLinUCB
+    history = db.execute(text("""
+        SELECT ta.user_id, th.task_id,
+               CASE WHEN th.status_after_update = 'done' THEN 1.0
+                    WHEN th.status_after_update = 'in_progress' THEN 0.5
+                    ELSE 0.0 END AS reward
+        FROM TaskAssignments ta
+        JOIN Taskhistories th ON ta.task_id = th.task_id AND ta.user_id = th.user_id
+        WHERE th.status_after_update IS NOT NULL
+    """)).fetchall()
+    by_task = {}
+    for row in history:
+        by_task.setdefault(row.task_id, set()).add(row.user_id)
+    contexts = {}
+    for task_id, uids in by_task.items():
+        user_ids, X = get_context_matrix(db, task_id, sorted(uids))
+        for user_id, context in zip(user_ids.tolist(), X):
+            contexts[(user_id, task_id)] = context
+    agent = BatchLinUCB(n_features=5, alpha=1.5)
+    agent.update_batch([r.user_id for r in history], np.stack([contexts[(r.user_id, r.task_id)] for r in history]),
+                       [float(r.reward) for r in history])
+    n = agent.n_users
+    return stats_of(agent.user_ids[:n], agent.A[:n], agent.b[:n])
+
+
+def rl_old(db: Session) -> dict:
+    from ai.assignment_rl import LinUCB, get_context_vector
+    agent = LinUCB(n_features=5, alpha=1.5)
+    history = db.execute(text("""
+        SELECT th.task_id, ta.user_id,
+               CASE WHEN th.status_after_update = 'done' AND th.action LIKE '%Hoàn thành%' THEN 1 ELSE 0 END
+        FROM Taskhistories th
+        JOIN TaskAssignments ta ON th.task_id = ta.task_id AND ta.user_id = th.user_id
+        WHERE th.action IN ('Hoàn thành', 'Cập nhật tiến độ', 'Quá hạn')
+    """)).fetchall()
+    for task_id, user_id, success in history:
+        context = get_context_vector(db, user_id, task_id)
+        A, b = agent._get_user_params(user_id)
+        A += np.outer(context, context)
+        b += (1.0 if success else 0.1) * context.reshape(-1, 1)
+    return {u: (agent.A[u], agent.b[u].ravel()) for u in agent.A}
+
+
+def store_stats(path: str) -> dict:
+    from ai.bandit_store import BanditStore
+    s = BanditStore(path)
+    return stats_of(s.user_ids, s.A, s.b)
+
+
+def new_rows_stats(db: Session, module, before: dict, after: int) -> dict:
+    # Model trước (A, b theo user) + Σ xxᵀ, Σ r·x của các dòng history_id > after, tính thẳng từng dòng
+    rows = db.execute(module.HISTORY_QUERY, {"after": after}).fetchall()
+    X = np.asarray(module.get_context_pairs(db, [r[1] for r in rows], [r[2] for r in rows]), dtype=float)
+    out = {u: (A.copy(), b.copy()) for u, (A, b) in before.items()}
+    d = X.shape[1] if len(X) else 5
+    for (_, user_id, _, reward), x in zip(rows, X):
+        A, b = out.setdefault(int(user_id), (np.eye(d), np.zeros(d)))
+        A += np.outer(x, x)
+        b += float(reward) * x
+    return out
+
+
+def add_history(conn, rows: int):
+    # Thêm dòng lịch sử mới (history_id tiếp theo sequence) cho các cặp task / người được giao có sẵn
+    conn.execute(text("""
+        INSERT INTO Taskhistories (task_id, user_id, action, status_after_update, created_at)
+        SELECT ta.task_id, ta.user_id, (:actions)[1 + floor(random() * 4)::int],
+               (ARRAY['pending', 'in_progress', 'review', 'done'])[1 + floor(random() * 4)::int], now()
+        FROM TaskAssignments ta
+        ORDER BY random()
+        LIMIT :n
+    """), {"n": rows, "actions": RL_ACTIONS})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--new-rows", type=int, default=500)
+    parser.add_argument("--skip-old", action="store_true", help="Không chạy bản cũ (chậm ở --users lớn)")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    queries = [0]
+    event.listen(engine, "before_cursor_execute", lambda *a: queries.__setitem__(0, queries[0] + 1))
+
+    with engine.begin() as conn:
+        counts = workload.generate(conn, SCHEMA, args.users, seed=args.seed)
+        # workload.py chỉ sinh action 'update_status' → gán action mà assignment_rl đọc
+        conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000})
+        conn.execute(text("UPDATE Taskhistories SET action = (:actions)[1 + floor(random() * 4)::int]"),
+                     {"actions": RL_ACTIONS})
+    workload.vacuum(engine, SCHEMA)
+
+    cwd = os.getcwd()
+    sandbox = tempfile.mkdtemp(prefix="bench_retrain_")
+    os.chdir(sandbox)  # STORE_PATH tương đối "models/..." → file model nằm trong thư mục tạm
+    os.makedirs("models", exist_ok=True)
+    results = {"users": args.users, "history_rows": counts["Taskhistories"]}
+    try:
+        from ai import assignment_bandit, assignment_rl
+        full_retrain = {"bandit": lambda db: assignment_bandit.retrain_bandit_from_history(db, full=True),
+                        "rl": assignment_rl.retrain_bandit_from_history}  # rl: luôn train lại từ đầu
+        for name, module, old in [("bandit", assignment_bandit, bandit_old), ("rl", assignment_rl, rl_old)]:
+            path = module.STORE_PATH
+            if os.path.exists(path):
+                os.remove(path)
+            with Session(engine) as db:
+                queries[0] = 0
+                summary, t_full = timed(lambda: full_retrain[name](db))
+                results[f"{name}_full"] = {"seconds": round(t_full, 3), "queries": queries[0], **summary}
+                full_stats = store_stats(path)
+                retrain_from_history(db, module.HISTORY_QUERY, module.get_context_pairs, path, None,
+                                     full=True, chunk_size=97)
+                results[f"{name}_chunk_max_abs_diff"] = diff(full_stats, store_stats(path))
+                if not args.skip_old:
+                    queries[0] = 0
+                    old_stats, t_old = timed(lambda: old(db))
+                    results[f"{name}_old"] = {"seconds": round(t_old, 3), "queries": queries[0]}
+                    results[f"{name}_parity_max_abs_diff"] = diff(full_stats, old_stats)
+
+            if name != "bandit":
+                continue
+            with engine.begin() as conn:
+                add_history(conn, args.new_rows)
+            with Session(engine) as db:
+                queries[0] = 0
+                summary, t_incr = timed(lambda: module.retrain_bandit_from_history(db))
+                results[f"{name}_incr"] = {"seconds": round(t_incr, 3), "queries": queries[0], **summary}
+                expected = new_rows_stats(db, module, full_stats, after=results[f"{name}_full"]["watermark"])
+                results[f"{name}_incr_max_abs_diff"] = diff(store_stats(path), expected)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(sandbox, ignore_errors=True)
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
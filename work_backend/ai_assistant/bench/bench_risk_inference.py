@@ -0,0 +1,176 @@
+# bench/bench_risk_inference.py
+# So sánh các cách serving model rủi ro trên graph task đang mở (build_risk_graph) của workload giả lập:
+#   - eager       : TGNRiskPredictor (torch_geometric) load từ .pth — cách serving cũ
+#   - script_fp32 : RiskScorer TorchScript, không lượng tử hóa (ai/risk_inference.py, quantize=False)
+#   - script_int8 : bản export serving thật (Linear int8 nếu lệch cho phép)
+# Mỗi bản chạy trong 1 process riêng: thời gian load, forward cả graph (bulk) và graph 1 task (p50 / p95 ms),
+# RSS đỉnh, torch_geometric có bị import không. Lệch điểm so với eager: max / mean |Δ| và tỉ lệ task đổi mức
+# rủi ro (Thấp / Trung bình / Cao).
+# Model train nhanh trên chính workload (ai/risk_train.py, --signal như bench_risk_train.py) → trọng số thật,
+# không phải khởi tạo ngẫu nhiên. Dữ liệu trong schema riêng (xóa khi xong, --keep để giữ); model, graph
+# snapshot ghi vào thư mục tạm, không đụng models/.
+# Chạy từ thư mục ai_assistant: python bench/bench_risk_inference.py --users 2000
+import sys
+import os
+import time
+import json
+import shutil
+import argparse
+import resource
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for p in (ROOT_DIR, BENCH_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+import numpy as np
+
+SCHEMA = "bench_risk_inference"
+VARIANTS = ["eager", "script_fp32", "script_int8"]
+
+
+def percentiles(samples) -> dict:
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p95_ms": round(float(np.percentile(ms, 95)), 3)}
+
+
+def load_variant(variant: str, workdir: str):
+    import torch
+    if variant == "eager":
+        from ai.risk_model import TGNRiskPredictor
+        model = TGNRiskPredictor(node_dim=64, heads=4)
+        model.load_state_dict(torch.load(os.path.join(workdir, "risk_tgn.pth"), map_location="cpu"))
+        return model.eval()
+    from ai.risk_inference import load_risk_scorer
+    return load_risk_scorer(os.path.join(workdir, f"{variant}.pt"))
+
+
+def child(variant: str, workdir: str, repeat: int):
+    # Process con: chỉ import thứ bản này cần → RSS / module so được giữa các bản
+    t0 = time.perf_counter()
+    import torch
+    model = load_variant(variant, workdir)
+    load_s = time.perf_counter() - t0
+    with np.load(os.path.join(workdir, "graph.npz")) as z:
+        x, edge_index, mask = (torch.from_numpy(z[k]) for k in ("x", "edge_index", "task_mask"))
+    one = (torch.tensor([0, 1]), torch.tensor([[0, 1], [1, 0]]), torch.tensor([True, False]))
+    with torch.no_grad():
+        scores = model(x, edge_index, mask).numpy()
+        bulk, single = [], []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            model(x, edge_index, mask)
+            bulk.append(time.perf_counter() - t0)
+        for _ in range(repeat * 20):
+            t0 = time.perf_counter()
+            model(*one).item()
+            single.append(time.perf_counter() - t0)
+    np.save(os.path.join(workdir, f"scores_{variant}.npy"), scores)
+    print(json.dumps({
+        "load_ms": round(load_s * 1000, 1),
+        "bulk": percentiles(bulk),
+        "single_task": percentiles(single),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "torch_geometric_loaded": "torch_geometric" in sys.modules,
+    }))
+
+
+def prepare(args, workdir: str) -> dict:
+    # Sinh workload, train model, export 2 bản TorchScript, lưu graph task đang mở để các process con dùng
+    import torch
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.orm import Session
+    from config import settings
+    import workload
+    from bench_risk_train import PLANT_SIGNAL
+    from ai import risk_train
+    from ai.risk_inference import export_risk_model
+    from ai.risk_tgn import build_risk_graph
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    with engine.begin() as conn:
+        workload.generate(conn, SCHEMA, args.users, seed=args.seed)
+        conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000})
+        conn.execute(PLANT_SIGNAL)
+    workload.vacuum(engine, SCHEMA)
+    try:
+        with Session(engine) as db:
+            graph, seeds, labels = risk_train.load_training_data(db)
+            model, summary = risk_train.train_model(graph, seeds, labels, max_epochs=args.epochs)
+            state = model.state_dict()
+            torch.save(state, os.path.join(workdir, "risk_tgn.pth"))
+            probe = risk_train.probe_batch(graph, seeds)
+            export = {
+                "script_fp32": export_risk_model(state, os.path.join(workdir, "script_fp32.pt"), probe, quantize=False),
+                "script_int8": export_risk_model(state, os.path.join(workdir, "script_int8.pt"), probe),
+            }
+            data, task_ids = build_risk_graph(db)
+        np.savez(os.path.join(workdir, "graph.npz"), x=data.x.numpy(), edge_index=data.edge_index.numpy(),
+                 task_mask=data.task_mask.numpy())
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    return {
+        "open_tasks": len(task_ids), "graph_nodes": int(data.x.shape[0]), "graph_edges": int(data.edge_index.shape[1]),
+        "val_auc": summary["val_auc"], "export": export,
+        "model_bytes": {name: os.path.getsize(os.path.join(workdir, f)) for name, f in
+                        [("pth", "risk_tgn.pth"), ("script_fp32", "script_fp32.pt"), ("script_int8", "script_int8.pt")]},
+    }
+
+
+def risk_level(scores: np.ndarray) -> np.ndarray:
+    # Cùng ngưỡng với _risk_result trong ai/risk_tgn.py
+    return np.digitize(scores, [0.4, 0.7], right=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--keep", action="store_true")
+    parser.add_argument("--child", choices=VARIANTS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.workdir, args.repeat)
+        return
+
+    cwd = os.getcwd()
+    sandbox = tempfile.mkdtemp(prefix="bench_risk_inference_")
+    os.chdir(sandbox)  # snapshot graph "models/..." → nằm trong thư mục tạm
+    try:
+        results = prepare(args, sandbox)
+        for variant in VARIANTS:
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", variant,
+                                   "--workdir", sandbox, "--repeat", str(args.repeat)],
+                                  cwd=ROOT_DIR, capture_output=True, text=True)
+            if proc.returncode != 0:
+                lines = [l for l in proc.stderr.splitlines() if l.strip()]
+                results[variant] = {"error": lines[-1] if lines else f"exit {proc.returncode}"}
+                continue
+            results[variant] = json.loads(proc.stdout.strip().splitlines()[-1])
+        eager = np.load(os.path.join(sandbox, "scores_eager.npy"))
+        for variant in VARIANTS[1:]:
+            path = os.path.join(sandbox, f"scores_{variant}.npy")
+            if os.path.exists(path):
+                scores = np.load(path)
+                results[variant]["drift"] = {
+                    "max_abs": float(np.abs(scores - eager).max()),
+                    "mean_abs": float(np.abs(scores - eager).mean()),
+                    "level_changed": float((risk_level(scores) != risk_level(eager)).mean()),
+                }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
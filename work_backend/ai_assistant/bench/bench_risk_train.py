@@ -0,0 +1,97 @@
+# bench/bench_risk_train.py
+# Train model rủi ro (ai/risk_train.py) trên workload giả lập: thời gian dựng graph / train, số epoch,
+# AUC validation, số node lớn nhất của 1 batch (bị chặn bởi batch_size * fanout) và peak RSS.
+# workload.py sinh thời điểm 'done' ngẫu nhiên, không liên quan graph → AUC ~0.5. --signal gài quan hệ:
+# task cần nhiều skill / nhiều người làm dễ trễ hạn hơn (sửa lần chuyển 'done' cuối sang trước / sau hạn)
+# → model học được thì AUC phải rõ ràng > 0.5.
+# Dữ liệu trong schema riêng (xóa khi xong, --keep để giữ); model ghi vào thư mục tạm, không đụng models/.
+# Chạy từ thư mục ai_assistant: python bench/bench_risk_train.py --users 20000 --signal   (100k task)
+import sys
+import os
+import time
+import json
+import shutil
+import argparse
+import resource
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+for p in (ROOT_DIR, BENCH_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from config import settings
+import workload
+
+SCHEMA = "bench_risk_train"
+
+PLANT_SIGNAL = text("""
+    WITH f AS (
+        SELECT t.task_id, t.due_date,
+               (SELECT count(*) FROM Task_Required_Skills s WHERE s.task_id = t.task_id) AS n_skills,
+               (SELECT count(*) FROM TaskAssignments a WHERE a.task_id = t.task_id) AS n_users
+        FROM Tasks t
+        JOIN TaskStatuses ts ON ts.task_id = t.task_id AND ts.is_current AND ts.status_name = 'done'
+        WHERE t.due_date IS NOT NULL
+    ), last_done AS (
+        SELECT DISTINCT ON (task_id) task_id, history_id
+        FROM Taskhistories
+        WHERE status_after_update = 'done'
+        ORDER BY task_id, created_at DESC, history_id DESC
+    )
+    UPDATE Taskhistories h
+    SET created_at = f.due_date + interval '1 day' * (1 + random() * 10) *
+        CASE WHEN random() < 1 / (1 + exp(2.0 - 0.9 * (f.n_skills - 1) - 0.6 * (f.n_users - 1))) THEN 1 ELSE -1 END
+    FROM last_done JOIN f USING (task_id)
+    WHERE h.history_id = last_done.history_id
+""")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000, help="Số task = users * 5")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--signal", action="store_true", help="Gài quan hệ trễ hạn ~ số skill / người làm")
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    engine = create_engine(settings.DATABASE_URL, connect_args={"options": f"-csearch_path={SCHEMA}"})
+    t0 = time.perf_counter()
+    with engine.begin() as conn:
+        counts = workload.generate(conn, SCHEMA, args.users, seed=args.seed)
+        if args.signal:
+            conn.execute(text("SELECT setseed(:s)"), {"s": (args.seed % 1000) / 1000})
+            conn.execute(PLANT_SIGNAL)
+    workload.vacuum(engine, SCHEMA)
+    results = {"tasks": counts["Tasks"], "histories": counts["Taskhistories"], "signal": args.signal,
+               "setup_s": round(time.perf_counter() - t0, 2)}
+
+    cwd = os.getcwd()
+    sandbox = tempfile.mkdtemp(prefix="bench_risk_train_")
+    os.chdir(sandbox)  # MODEL_PATH tương đối "models/..." → file model nằm trong thư mục tạm
+    try:
+        from ai.risk_tgn import train_risk_model
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        with Session(engine) as db:
+            t0 = time.perf_counter()
+            summary = train_risk_model(db, model_path=os.path.join("models", "risk_tgn.pth"))
+            results["total_s"] = round(time.perf_counter() - t0, 2)
+        results["train"] = summary
+        results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+        results["rss_before_train_mb"] = round(rss_before, 1)
+        results["model_bytes"] = os.path.getsize(os.path.join("models", "risk_tgn.pth")) if summary else None
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(sandbox, ignore_errors=True)
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
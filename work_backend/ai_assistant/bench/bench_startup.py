@@ -0,0 +1,138 @@
+# bench/bench_startup.py
+# Đo cold start của từng entry point (main.py, *_wrapper.py, ai_worker.py):
+#   mỗi entry point import trong 1 process Python mới (không chạy main) → thời gian import,
+#   RSS đỉnh, số module đã load và các thư viện nặng (torch, sklearn, ollama...) bị kéo theo.
+# Lấy min qua --repeat lần chạy. --check: fail nếu thư viện nặng bị import lúc khởi động;
+# --baseline file.json: fail nếu import_ms / rss_mb tăng quá --tolerance so với lần đo trước.
+# Chạy từ thư mục ai_assistant: python bench/bench_startup.py --repeat 5 --check
+import sys
+import os
+import json
+import argparse
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENTRY_POINTS = [
+    "main",
+    "assignment_suggester_wrapper",
+    "intent_classifier_wrapper",
+    "risk_predictor_wrapper",
+    "task_ordering_wrapper",
+    "ai_worker",
+]
+
+# Chỉ được load khi thật sự cần (model được gọi lần đầu), không phải lúc import
+HEAVY_MODULES = ["torch", "torch_geometric", "sklearn", "scipy", "ollama", "pandas"]
+
+CHILD = r"""
+import sys, time, json, resource, importlib
+sys.argv = [sys.argv[0]]
+out_path, name = {out!r}, {name!r}
+before = set(sys.modules)
+t0 = time.perf_counter()
+error = None
+try:
+    if name:
+        importlib.import_module(name)
+except BaseException as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - t0
+heavy = [m for m in {heavy!r} if m in sys.modules]
+with open(out_path, "w") as f:
+    json.dump({{
+        "import_ms": elapsed * 1000,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "modules": len(set(sys.modules) - before),
+        "heavy": heavy,
+        "error": error,
+    }}, f)
+"""
+
+
+def run_once(name: str) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+        out_path = tmp.name
+    try:
+        code = CHILD.format(out=out_path, name=name, heavy=HEAVY_MODULES)
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=300)
+        with open(out_path) as f:
+            return json.load(f)
+    finally:
+        os.unlink(out_path)
+
+
+def measure(name: str, repeat: int) -> dict:
+    runs = [run_once(name) for _ in range(repeat)]
+    return {
+        "import_ms": round(min(r["import_ms"] for r in runs), 1),
+        "rss_mb": round(min(r["rss_mb"] for r in runs), 1),
+        "modules": runs[0]["modules"],
+        "heavy": runs[0]["heavy"],
+        "error": runs[0]["error"],
+    }
+
+
+def top_imports(name: str, n: int) -> list:
+    # -X importtime: các module tốn nhiều thời gian nhất (cumulative, µs)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {name}"], cwd=ROOT_DIR,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=300)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        module = parts[2].strip()
+        if parts[1].isdigit() and "." not in module and module not in (name, "ai"):
+            rows.append((int(parts[1]), module))
+    rows.sort(reverse=True)
+    return [{"module": m, "cumulative_ms": round(us / 1000, 1)} for us, m in rows[:n]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--entry", action="append", help="Chỉ đo entry point này (lặp lại được)")
+    parser.add_argument("--top", type=int, default=0, help="In N package top-level import chậm nhất (ngoài chính entry point và ai)")
+    parser.add_argument("--check", action="store_true", help="Fail nếu thư viện nặng bị load lúc import")
+    parser.add_argument("--baseline", help="File JSON kết quả lần đo trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    entries = args.entry or ENTRY_POINTS
+    result = {"python": measure("", args.repeat), "entry_points": {}}
+    for name in entries:
+        result["entry_points"][name] = measure(name, args.repeat)
+        if args.top:
+            result["entry_points"][name]["top_imports"] = top_imports(name, args.top)
+
+    failures = []
+    for name, r in result["entry_points"].items():
+        if r["error"]:
+            failures.append(f"{name}: import lỗi ({r['error']})")
+        if args.check and r["heavy"]:
+            failures.append(f"{name}: load sẵn {', '.join(r['heavy'])}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)["entry_points"]
+        for name, r in result["entry_points"].items():
+            if name not in base:
+                continue
+            for key in ("import_ms", "rss_mb"):
+                if r[key] > base[name][key] * (1 + args.tolerance):
+                    failures.append(f"{name}: {key} {base[name][key]} → {r[key]}")
+    result["failures"] = failures
+
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
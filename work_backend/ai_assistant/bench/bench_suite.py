@@ -0,0 +1,304 @@
+# bench/bench_suite.py
+# Bộ benchmark các đường nóng của AI trên dữ liệu giả lập (bench/workload.py), theo tier số user:
+#   100 / 1k / 10k user (Tasks = users * --tasks-per-user, Taskhistories = Tasks * --histories-per-task).
+# Mỗi tier chạy trong 1 process riêng, cwd là thư mục tạm có models/ riêng (intent, risk_tgn.pth / .pt trỏ tới
+# models/ thật, bandit / graph snapshot ghi vào thư mục tạm) → không đụng model thật, cache / RSS không lẫn
+# giữa các tier. Truy vấn qua engine riêng với search_path = schema giả lập.
+#
+# Mỗi hàm: lần gọi đầu (cold_ms: load model, dựng index / batch...) tách riêng, sau đó --repeat lượt trên
+# --samples input ngẫu nhiên (seed) → p50 / p95 / mean ms, số truy vấn SQL / lần gọi, đỉnh bộ nhớ Python
+# (tracemalloc) / lần gọi, RSS của process sau khi đo.
+# Kết quả JSON (kèm commit git) → so sánh giữa các commit: --baseline file.json fail nếu p50 tăng quá
+# --tolerance hoặc số truy vấn / lần gọi tăng.
+# Chạy từ thư mục ai_assistant: python bench/bench_suite.py --tiers 100,1k,10k --output bench_result.json
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+TIERS = {"100": 100, "1k": 1000, "10k": 10000}
+
+FUNCTIONS = [
+    "retrain_bandit_from_history",
+    "suggest_assignee_bandit",
+    "get_context_vector",
+    "predict_risk_advanced",
+    "get_task_context",
+    "suggest_task_order",
+    "predict_intent",
+]
+
+# Model chỉ đọc, dùng chung với models/ thật
+SHARED_MODELS = ["intent_model", "risk_tgn.pth", "risk_tgn.pt"]
+
+INTENT_TEMPLATES = [
+    "task {t} tiến độ thế nào", "rủi ro task {t}", "ai nên làm task {t}", "tôi nên làm task nào trước",
+    "task {t} còn bao nhiêu ngày", "deadline task {t} là khi nào", "phân công task {t} cho ai",
+    "task {t} có trễ hạn không", "xin chào", "báo cáo tuần này",
+]
+
+
+# ---------------------------------------------------------------- đo trong process con
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentiles(samples: list) -> dict:
+    import numpy as np
+    a = np.asarray(samples)
+    return {"p50_ms": round(float(np.percentile(a, 50)), 3), "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "mean_ms": round(float(a.mean()), 3)}
+
+
+def measure(fn, inputs: list, repeat: int, queries: list) -> dict:
+    rss_before = _rss_mb()
+    q0 = queries[0]
+    t0 = time.perf_counter()
+    fn(inputs[0])
+    result = {"cold_ms": round((time.perf_counter() - t0) * 1000, 3), "cold_queries": queries[0] - q0}
+
+    samples = []
+    q0 = queries[0]
+    for _ in range(repeat):
+        for x in inputs:
+            t0 = time.perf_counter()
+            fn(x)
+            samples.append((time.perf_counter() - t0) * 1000)
+    if samples:
+        result.update(_percentiles(samples))
+        result["calls"] = len(samples)
+        result["queries_per_call"] = round((queries[0] - q0) / len(samples), 2)
+
+    # tracemalloc làm chậm → đo riêng trên vài input, không tính vào latency
+    tracemalloc.start()
+    peak = 0
+    for x in inputs[:5]:
+        tracemalloc.reset_peak()
+        fn(x)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    result["py_peak_kb"] = round(peak / 1024, 1)
+    result["rss_mb"] = round(_rss_mb(), 1)
+    result["rss_delta_mb"] = round(result["rss_mb"] - rss_before, 1)
+    return result
+
+
+def run_tier(args) -> dict:
+    import numpy as np
+    from sqlalchemy import create_engine, event, text
+    from sqlalchemy.orm import Session
+    from config import settings
+    import workload
+
+    schema = f"bench_suite_{args.child}"
+    engine = create_engine(settings.DATABASE_URL, connect_args={"options": f"-csearch_path={schema}"})
+    t0 = time.perf_counter()
+    with engine.connect() as conn:
+        rows = workload.generate(conn, schema, TIERS[args.child], args.seed, args.tasks_per_user,
+                                 args.histories_per_task)
+        conn.commit()
+    workload.vacuum(engine, schema)
+    setup_s = time.perf_counter() - t0
+
+    queries = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(*_):
+        queries[0] += 1
+
+    from ai.assignment_bandit import suggest_assignee_bandit, get_context_vector, retrain_bandit_from_history
+    from ai.risk_tgn import predict_risk_advanced
+    from ai.db_integration import get_task_context
+    from ai.task_ordering import suggest_task_order
+    from ai.intent_classifier import predict_intent
+
+    rng = np.random.default_rng(args.seed + 1)
+    with engine.connect() as conn:
+        open_tasks = [r[0] for r in conn.execute(text("""
+            SELECT task_id FROM TaskStatuses WHERE is_current AND status_name <> 'done' ORDER BY task_id
+        """))]
+        busy_users = [r[0] for r in conn.execute(text("SELECT DISTINCT user_id FROM TaskAssignments ORDER BY 1"))]
+    task_sample = rng.choice(open_tasks, args.samples).tolist()
+    user_sample = rng.choice(busy_users, args.samples).tolist()
+    pairs = list(zip(user_sample, task_sample))
+    messages = [INTENT_TEMPLATES[i % len(INTENT_TEMPLATES)].format(t=t)
+                for i, t in enumerate(rng.integers(1, len(open_tasks) + 1, args.samples))]
+
+    def with_db(fn):
+        # Session mới mỗi lần gọi như 1 request (loader context theo Session không bị dùng lại)
+        def call(x):
+            with Session(engine) as db:
+                return fn(db, x)
+        return call
+
+    cases = {
+        "retrain_bandit_from_history": (with_db(lambda db, _: retrain_bandit_from_history(db, full=True)), [None], 0),
+        "suggest_assignee_bandit": (with_db(lambda db, t: suggest_assignee_bandit(t, db)), task_sample, args.repeat),
+        "get_context_vector": (with_db(lambda db, p: get_context_vector(db, p[0], p[1])), pairs, args.repeat),
+        "predict_risk_advanced": (with_db(lambda db, t: predict_risk_advanced(t, db)), task_sample, args.repeat),
+        "get_task_context": (with_db(get_task_context), task_sample, args.repeat),
+        "suggest_task_order": (with_db(lambda db, u: suggest_task_order(u, db)), user_sample, args.repeat),
+        "predict_intent": (predict_intent, messages, args.repeat),
+    }
+
+    functions = {}
+    for name in args.functions:
+        fn, inputs, repeat = cases[name]
+        try:
+            functions[name] = measure(fn, inputs, repeat, queries)
+        except Exception as e:
+            functions[name] = {"error": f"{type(e).__name__}: {e}"}
+
+    if not args.keep:
+        with engine.connect() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+            conn.commit()
+    engine.dispose()
+    return {"users": TIERS[args.child], "rows": rows, "setup_s": round(setup_s, 2), "functions": functions}
+
+
+# ---------------------------------------------------------------- process cha
+
+def _sandbox() -> str:
+    path = tempfile.mkdtemp(prefix="bench_suite_")
+    os.makedirs(os.path.join(path, "models"))
+    for name in SHARED_MODELS:
+        src = os.path.join(ROOT_DIR, "models", name)
+        if os.path.exists(src):
+            os.symlink(src, os.path.join(path, "models", name))
+    return path
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_child(tier: str, args) -> dict:
+    import shutil
+    sandbox = _sandbox()
+    out_path = os.path.join(sandbox, "result.json")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", tier, "--child-output", out_path,
+           "--samples", str(args.samples), "--repeat", str(args.repeat), "--seed", str(args.seed),
+           "--tasks-per-user", str(args.tasks_per_user), "--histories-per-task", str(args.histories_per_task),
+           "--functions", ",".join(args.functions)] + (["--keep"] if args.keep else [])
+    from config import settings  # .env đọc theo cwd → truyền DATABASE_URL đã đọc ở đây cho process con
+    env = dict(os.environ, DATABASE_URL=settings.DATABASE_URL,
+               PYTHONPATH=os.pathsep.join([ROOT_DIR, os.path.dirname(os.path.abspath(__file__))]))
+    try:
+        proc = subprocess.run(cmd, cwd=sandbox, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                              text=True, timeout=args.timeout)
+        if not os.path.exists(out_path):
+            # Dòng exception cuối (SQLAlchemy thêm dòng "(Background on this error ...)" phía sau)
+            lines = [l for l in (proc.stderr or "").strip().splitlines() if l.strip() and not l.startswith("(Background")]
+            return {"error": lines[-1] if lines else "không có kết quả"}
+        with open(out_path) as f:
+            return json.load(f)
+    except subprocess.TimeoutExpired:
+        return {"error": f"quá {args.timeout}s"}
+    finally:
+        shutil.rmtree(sandbox, ignore_errors=True)
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    failures = []
+    for tier, r in result["tiers"].items():
+        base_tier = baseline.get("tiers", {}).get(tier, {}).get("functions", {})
+        for name, m in r.get("functions", {}).items():
+            b = base_tier.get(name)
+            if not b or "error" in b or "error" in m:
+                continue
+            key = "p50_ms" if "p50_ms" in m and "p50_ms" in b else "cold_ms"
+            if m[key] > b[key] * (1 + tolerance):
+                failures.append(f"{tier}/{name}: {key} {b[key]} → {m[key]}")
+            if m.get("queries_per_call", 0) > b.get("queries_per_call", 0):
+                failures.append(f"{tier}/{name}: queries_per_call {b['queries_per_call']} → {m['queries_per_call']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tiers", default="100,1k,10k", help=f"Trong {', '.join(TIERS)}, cách nhau dấu phẩy")
+    parser.add_argument("--functions", default=",".join(FUNCTIONS))
+    parser.add_argument("--samples", type=int, default=30, help="Số input ngẫu nhiên / hàm")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tasks-per-user", type=int, default=5)
+    parser.add_argument("--histories-per-task", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=1800, help="Giây tối đa cho 1 tier")
+    parser.add_argument("--keep", action="store_true", help="Giữ schema dữ liệu sinh sau khi chạy")
+    parser.add_argument("--baseline", help="File JSON kết quả lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--output", help="Ghi kết quả ra file JSON")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.functions = [f for f in args.functions.split(",") if f]
+    unknown = set(args.functions) - set(FUNCTIONS)
+    if unknown:
+        parser.error(f"hàm không có trong bộ đo: {', '.join(sorted(unknown))}")
+
+    if args.child:
+        result = run_tier(args)
+        with open(args.child_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    tiers = [t for t in args.tiers.split(",") if t]
+    for t in tiers:
+        if t not in TIERS:
+            parser.error(f"tier không hợp lệ: {t}")
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "samples": args.samples,
+            "repeat": args.repeat,
+            "tasks_per_user": args.tasks_per_user,
+            "histories_per_task": args.histories_per_task,
+        },
+        "tiers": {},
+    }
+    for tier in tiers:
+        result["tiers"][tier] = run_child(tier, args)
+
+    failures = [f"{t}: {r['error']}" for t, r in result["tiers"].items() if "error" in r]
+    failures += [f"{t}/{n}: {m['error']}" for t, r in result["tiers"].items()
+                 for n, m in r.get("functions", {}).items() if "error" in m]
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(result, json.load(f), args.tolerance)
+    result["failures"] = failures
+
+    out = json.dumps(result, indent=2, ensure_ascii=False)
+    print(out)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(out)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# bench/bench_task_context.py
+# So sánh cách lấy context task:
+#   - per_task_old : 2 truy vấn / task (subquery tương quan trên TaskAssignments + câu kỹ năng riêng) — cách cũ
+#   - per_task_new : TASK_CONTEXTS_QUERY cho 1 task (1 truy vấn)
+#   - batch_new    : TASK_CONTEXTS_QUERY cho --batch task 1 lần (so với --batch lần per_task_old)
+#   - chat_request : 1 request /chat đường sync — router + llm_client cùng hỏi 1 task (cũ: 4 truy vấn, mới: 1)
+#   - cache_hit    : TaskContextCache đã có (như khi ChangeListener đang chạy)
+# Kèm parity: context mới == context cũ cho mọi task (kỹ năng so theo tập, bản mới sắp theo tên).
+# Dữ liệu sinh ngẫu nhiên (seed) trong schema riêng bench_task_context, xóa khi xong (--keep để giữ).
+# Chạy từ thư mục ai_assistant: python bench/bench_task_context.py --tasks 20000 --batch 50
+import sys
+import os
+import time
+import json
+import argparse
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from sqlalchemy import text, event
+from sqlalchemy.orm import Session
+from database import engine
+from ai.db_integration import TaskContextLoader, TaskContextCache, get_task_context
+
+SCHEMA = "bench_task_context"
+
+OLD_CONTEXT_QUERY = text("""
+    SELECT
+        t.title, t.due_date, t.priority,
+        COALESCE(tp.percentage_complete, 0) as progress,
+        u.first_name || ' ' || u.last_name as assignee
+    FROM Tasks t
+    LEFT JOIN Taskprogresses tp ON t.task_id = tp.task_id AND tp.user_id IN (
+        SELECT user_id FROM TaskAssignments WHERE task_id = t.task_id AND is_main_assignee
+    )
+    LEFT JOIN TaskAssignments ta ON t.task_id = ta.task_id AND ta.is_main_assignee
+    LEFT JOIN Users u ON ta.user_id = u.user_id
+    WHERE t.task_id = :tid
+""")
+OLD_SKILLS_QUERY = text("SELECT skill_name, required_level FROM Task_Required_Skills WHERE task_id = :tid")
+
+
+def old_context(db: Session, task_id: int) -> dict:
+    result = db.execute(OLD_CONTEXT_QUERY, {"tid": task_id}).fetchone()
+    if not result:
+        return {}
+    skills = db.execute(OLD_SKILLS_QUERY, {"tid": task_id}).fetchall()
+    due_in = (result.due_date.date() - datetime.now().date()).days if result.due_date else None
+    return {
+        "title": result.title,
+        "progress": result.progress,
+        "due_in_days": due_in,
+        "priority": result.priority,
+        "assignee": result.assignee or "Chưa có",
+        "required_skills": [f"{s[0]} ≥ {s[1]}" for s in skills]
+    }
+
+
+def setup(conn, tasks: int, users: int, seed: int):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}"))
+    # Chỉ các cột truy vấn dùng tới; index giống workdb.sql
+    conn.execute(text("""
+        CREATE TABLE Users (user_id INTEGER PRIMARY KEY, first_name VARCHAR(50), last_name VARCHAR(50));
+        CREATE TABLE Tasks (task_id INTEGER PRIMARY KEY, title VARCHAR(255), priority VARCHAR(10), due_date TIMESTAMPTZ);
+        CREATE TABLE TaskAssignments (assignment_id SERIAL PRIMARY KEY, task_id INTEGER, user_id INTEGER,
+                                      is_main_assignee BOOLEAN, UNIQUE (task_id, user_id));
+        CREATE TABLE Taskprogresses (progress_id SERIAL PRIMARY KEY, task_id INTEGER, user_id INTEGER,
+                                     percentage_complete INTEGER, updated_at TIMESTAMPTZ DEFAULT now());
+        CREATE TABLE Task_Required_Skills (task_id INTEGER, skill_name VARCHAR(100), required_level INTEGER,
+                                           PRIMARY KEY (task_id, skill_name));
+        CREATE INDEX ON TaskAssignments(task_id);
+        CREATE INDEX ON TaskAssignments(user_id);
+        CREATE INDEX ON Taskprogresses(task_id, user_id);
+    """))
+    rng = np.random.default_rng(seed)
+    uids = np.arange(1, users + 1)
+    conn.execute(text("""
+        INSERT INTO Users SELECT u, 'User', 'U' || u FROM unnest(CAST(:u AS INTEGER[])) AS x(u)
+    """), {"u": uids.tolist()})
+    ids = np.arange(1, tasks + 1)
+    conn.execute(text("""
+        INSERT INTO Tasks (task_id, title, priority, due_date)
+        SELECT id, 'Task ' || id, p, now() + d * interval '1 day'
+        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:p AS TEXT[]), CAST(:d AS FLOAT8[])) AS x(id, p, d)
+    """), {"ids": ids.tolist(), "p": rng.choice(["Low", "Medium", "High"], tasks).tolist(),
+           "d": rng.uniform(-30, 60, tasks).tolist()})
+    # 90% task có 1 người làm chính + 0..3 người phụ; người làm chính có 1 dòng tiến độ
+    main = rng.random(tasks) < 0.9
+    owner = rng.integers(1, users + 1, tasks)
+    conn.execute(text("""
+        INSERT INTO TaskAssignments (task_id, user_id, is_main_assignee)
+        SELECT id, u, TRUE FROM unnest(CAST(:ids AS INTEGER[]), CAST(:u AS INTEGER[])) AS x(id, u)
+    """), {"ids": ids[main].tolist(), "u": owner[main].tolist()})
+    extra = rng.integers(0, 4, tasks)
+    ex_ids = np.repeat(ids, extra)
+    conn.execute(text("""
+        INSERT INTO TaskAssignments (task_id, user_id, is_main_assignee)
+        SELECT id, u, FALSE FROM unnest(CAST(:ids AS INTEGER[]), CAST(:u AS INTEGER[])) AS x(id, u)
+        ON CONFLICT DO NOTHING
+    """), {"ids": ex_ids.tolist(), "u": rng.integers(1, users + 1, len(ex_ids)).tolist()})
+    conn.execute(text("""
+        INSERT INTO Taskprogresses (task_id, user_id, percentage_complete)
+        SELECT task_id, user_id, (random() * 100)::int FROM TaskAssignments
+    """))
+    skills = [f"Skill {i}" for i in range(30)]
+    n_sk = rng.integers(0, 4, tasks)
+    sk_ids = np.repeat(ids, n_sk)
+    conn.execute(text("""
+        INSERT INTO Task_Required_Skills
+        SELECT id, s, l FROM unnest(CAST(:ids AS INTEGER[]), CAST(:s AS TEXT[]), CAST(:l AS INTEGER[])) AS x(id, s, l)
+        ON CONFLICT DO NOTHING
+    """), {"ids": sk_ids.tolist(), "s": rng.choice(skills, len(sk_ids)).tolist(),
+           "l": rng.integers(1, 11, len(sk_ids)).tolist()})
+
+
+def vacuum():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as c:
+        c.execute(text(f"VACUUM ANALYZE {SCHEMA}.Users, {SCHEMA}.Tasks, {SCHEMA}.TaskAssignments, "
+                       f"{SCHEMA}.Taskprogresses, {SCHEMA}.Task_Required_Skills"))
+
+
+def time_calls(fn, args, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        for a in args:
+            t0 = time.perf_counter()
+            fn(a)
+            samples.append((time.perf_counter() - t0) * 1000)
+    a = np.asarray(samples)
+    return {"p50_ms": round(float(np.percentile(a, 50)), 3), "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "mean_ms": round(float(a.mean()), 3)}
+
+
+def normalized(ctx: dict) -> dict:
+    return {**ctx, "required_skills": sorted(ctx["required_skills"])} if ctx else ctx
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=50)
+    parser.add_argument("--samples", type=int, default=200, help="Số task_id ngẫu nhiên để đo")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Giữ schema dữ liệu sinh sau khi chạy")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        t0 = time.perf_counter()
+        setup(conn, args.tasks, args.users, args.seed)
+        conn.commit()
+        vacuum()
+        setup_s = time.perf_counter() - t0
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+
+        queries = [0]
+
+        @event.listens_for(conn, "before_cursor_execute")
+        def count(*_):
+            queries[0] += 1
+
+        rng = np.random.default_rng(args.seed + 1)
+        # + vài task_id không tồn tại
+        sample = rng.integers(1, args.tasks + 20, args.samples).tolist()
+        cold = TaskContextCache()  # listening = False → loader luôn đọc DB
+
+        def fresh() -> Session:
+            return Session(bind=conn)
+
+        mismatches = 0
+        for tid in sorted(set(sample)):
+            db = fresh()
+            new = TaskContextLoader(cold).load(db, tid)
+            if normalized(new) != normalized(old_context(db, tid)):
+                mismatches += 1
+            db.close()
+
+        batches = [sample[i:i + args.batch] for i in range(0, len(sample), args.batch)]
+
+        def old_request(tid):
+            # router (action info) + llm_client._build: mỗi chỗ tự truy vấn
+            db = fresh()
+            old_context(db, tid)
+            old_context(db, tid)
+            db.close()
+
+        def new_request(tid):
+            db = fresh()
+            db.info["task_context_loader"] = TaskContextLoader(cold)
+            get_task_context(db, tid)
+            get_task_context(db, tid)
+            db.close()
+
+        def measure_queries(fn, arg) -> int:
+            before = queries[0]
+            fn(arg)
+            return queries[0] - before
+
+        result = {
+            "tasks": args.tasks,
+            "batch": args.batch,
+            "setup_s": round(setup_s, 2),
+            "context_mismatches": mismatches,
+            "queries": {
+                "chat_request_old": measure_queries(old_request, sample[0]),
+                "chat_request_new": measure_queries(new_request, sample[0]),
+                "batch_old": measure_queries(lambda b: [old_context(conn, t) for t in b], batches[0]),
+                "batch_new": measure_queries(lambda b: TaskContextLoader(cold).load_many(fresh(), b), batches[0]),
+            },
+            "latency": {},
+        }
+        lat = result["latency"]
+        lat["per_task_old"] = time_calls(lambda t: old_context(conn, t), sample, args.repeat)
+        lat["per_task_new"] = time_calls(lambda t: TaskContextLoader(cold).load(fresh(), t), sample, args.repeat)
+        lat["chat_request_old"] = time_calls(old_request, sample, args.repeat)
+        lat["chat_request_new"] = time_calls(new_request, sample, args.repeat)
+        lat["batch_old"] = time_calls(lambda b: [old_context(conn, t) for t in b], batches, args.repeat)
+        lat["batch_new"] = time_calls(lambda b: TaskContextLoader(cold).load_many(fresh(), b), batches, args.repeat)
+
+        warm = TaskContextCache()
+        warm.listening = True
+        TaskContextLoader(warm).load_many(fresh(), sample)
+        lat["cache_hit"] = time_calls(lambda t: TaskContextLoader(warm).load(fresh(), t), sample, args.repeat)
+        result["cache"] = warm.stats()
+        result["speedup_p50"] = {
+            "per_task": round(lat["per_task_old"]["p50_ms"] / max(lat["per_task_new"]["p50_ms"], 1e-6), 1),
+            "chat_request": round(lat["chat_request_old"]["p50_ms"] / max(lat["chat_request_new"]["p50_ms"], 1e-6), 1),
+            "batch": round(lat["batch_old"]["p50_ms"] / max(lat["batch_new"]["p50_ms"], 1e-6), 1),
+            "cache_hit": round(lat["per_task_old"]["p50_ms"] / max(lat["cache_hit"]["p50_ms"], 1e-6), 1),
+        }
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
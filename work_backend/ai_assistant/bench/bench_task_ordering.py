@@ -0,0 +1,191 @@
+# bench/bench_task_ordering.py
+# So sánh latency gợi ý thứ tự task cho user có hàng nghìn task:
+#   - python_loop : kéo mọi task đang mở của user về Python, chấm điểm từng task rồi lấy top 5 (cách cũ)
+#   - sql_topk    : điểm tính trong SQL + ORDER BY / LIMIT (chưa có index mới)
+#   - sql_topk_idx: như trên + idx_taskassignments_user_task, idx_taskstatuses_current_status
+#   - cache_hit   : TaskOrderCache trả kết quả đã có
+# Dữ liệu sinh ngẫu nhiên (seed) trong schema riêng bench_task_ordering, xóa khi xong (--keep để giữ).
+# Chạy từ thư mục ai_assistant: python bench/bench_task_ordering.py --users 20 --tasks-per-user 5000
+import sys
+import os
+import time
+import json
+import argparse
+from datetime import datetime, timezone
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from database import engine
+from ai.task_ordering import suggest_task_order, order_cache, INDEX_SQL
+
+SCHEMA = "bench_task_ordering"
+
+OLD_QUERY = text("""
+    SELECT t.task_id, t.title, t.due_date, t.priority
+    FROM TaskAssignments ta
+    JOIN Tasks t ON ta.task_id = t.task_id
+    WHERE ta.user_id = :uid AND NOT EXISTS (
+        SELECT 1 FROM TaskStatuses ts
+        WHERE ts.task_id = t.task_id AND ts.is_current AND ts.status_name = 'done'
+    )
+    ORDER BY t.due_date
+""")
+
+
+def python_loop(db: Session, user_id: int) -> list:
+    tasks = db.execute(OLD_QUERY, {"uid": user_id}).fetchall()
+    now = datetime.now(timezone.utc)
+    scored = []
+    for t in tasks:
+        days_left = (t.due_date - now).days if t.due_date else 999
+        priority_score = {"High": 3, "Medium": 2, "Low": 1}.get(t.priority, 1)
+        score = priority_score * 10 + max(0, 10 - days_left)
+        scored.append({"task_id": t.task_id, "title": t.title, "score": score})
+    return sorted(scored, key=lambda x: x["score"], reverse=True)[:5]
+
+
+def setup(conn, users: int, tasks_per_user: int, seed: int):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}"))
+    # Chỉ các cột truy vấn dùng tới; index giống workdb.sql trước thay đổi này
+    conn.execute(text("""
+        CREATE TABLE Tasks (task_id INTEGER PRIMARY KEY, title VARCHAR(255), priority VARCHAR(10), due_date TIMESTAMPTZ);
+        CREATE TABLE TaskAssignments (assignment_id SERIAL PRIMARY KEY, task_id INTEGER, user_id INTEGER,
+                                      is_main_assignee BOOLEAN, UNIQUE (task_id, user_id));
+        CREATE TABLE TaskStatuses (status_id SERIAL PRIMARY KEY, task_id INTEGER, status_name VARCHAR(50),
+                                   is_current BOOLEAN);
+        CREATE INDEX ON TaskAssignments(task_id);
+        CREATE INDEX ON TaskAssignments(user_id);
+        CREATE INDEX ON Tasks(due_date);
+        CREATE INDEX ON TaskStatuses(task_id) WHERE is_current = TRUE;
+    """))
+    rng = np.random.default_rng(seed)
+    n = users * tasks_per_user
+    ids = np.arange(1, n + 1)
+    owner = rng.integers(1, users + 1, n)
+    priority = rng.choice(["Low", "Medium", "High"], n)
+    due_offset = rng.uniform(-30, 60, n)  # ngày so với hiện tại
+    has_due = rng.random(n) > 0.05
+    status = rng.choice(["pending", "in_progress", "review", "done"], n, p=[0.3, 0.3, 0.1, 0.3])
+    extra = rng.random(n) < 0.1  # 10% task có thêm 1 người phụ
+    extra_user = (owner % users) + 1
+
+    conn.execute(text("""
+        INSERT INTO Tasks (task_id, title, priority, due_date)
+        SELECT id, 'Task ' || id, p, CASE WHEN hd THEN now() + d * interval '1 day' END
+        FROM unnest(CAST(:ids AS INTEGER[]), CAST(:p AS TEXT[]), CAST(:d AS FLOAT8[]), CAST(:hd AS BOOLEAN[]))
+             AS x(id, p, d, hd)
+    """), {"ids": ids.tolist(), "p": priority.tolist(), "d": due_offset.tolist(), "hd": has_due.tolist()})
+    conn.execute(text("""
+        INSERT INTO TaskAssignments (task_id, user_id, is_main_assignee)
+        SELECT id, u, TRUE FROM unnest(CAST(:ids AS INTEGER[]), CAST(:u AS INTEGER[])) AS x(id, u)
+    """), {"ids": ids.tolist(), "u": owner.tolist()})
+    conn.execute(text("""
+        INSERT INTO TaskAssignments (task_id, user_id, is_main_assignee)
+        SELECT id, u, FALSE FROM unnest(CAST(:ids AS INTEGER[]), CAST(:u AS INTEGER[])) AS x(id, u)
+        ON CONFLICT DO NOTHING
+    """), {"ids": ids[extra].tolist(), "u": extra_user[extra].tolist()})
+    # Mỗi task: 1 trạng thái cũ (không current) + 1 trạng thái hiện tại
+    conn.execute(text("""
+        INSERT INTO TaskStatuses (task_id, status_name, is_current)
+        SELECT id, 'pending', FALSE FROM unnest(CAST(:ids AS INTEGER[])) AS x(id)
+        UNION ALL
+        SELECT id, s, TRUE FROM unnest(CAST(:ids AS INTEGER[]), CAST(:s AS TEXT[])) AS x(id, s)
+    """), {"ids": ids.tolist(), "s": status.tolist()})
+
+
+def vacuum():
+    # Như autovacuum trên DB thật: visibility map cho index-only scan + thống kê cho planner
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as c:
+        c.execute(text(f"VACUUM ANALYZE {SCHEMA}.Tasks, {SCHEMA}.TaskAssignments, {SCHEMA}.TaskStatuses"))
+
+
+def time_calls(fn, user_ids, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        for uid in user_ids:
+            t0 = time.perf_counter()
+            fn(uid)
+            samples.append((time.perf_counter() - t0) * 1000)
+    a = np.asarray(samples)
+    return {"p50_ms": round(float(np.percentile(a, 50)), 3), "p95_ms": round(float(np.percentile(a, 95)), 3),
+            "mean_ms": round(float(a.mean()), 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks-per-user", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="Giữ schema dữ liệu sinh sau khi chạy")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        t0 = time.perf_counter()
+        setup(conn, args.users, args.tasks_per_user, args.seed)
+        conn.commit()
+        vacuum()
+        setup_s = time.perf_counter() - t0
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        db = Session(bind=conn)
+        user_ids = list(range(1, args.users + 1))
+        open_per_user = conn.execute(text("""
+            SELECT avg(c) FROM (SELECT ta.user_id, count(*) c FROM TaskAssignments ta
+            WHERE NOT EXISTS (SELECT 1 FROM TaskStatuses ts WHERE ts.task_id = ta.task_id AND ts.is_current
+                              AND ts.status_name = 'done') GROUP BY ta.user_id) x
+        """)).scalar()
+
+        # Parity: cùng dãy điểm top 5 (thứ tự task cùng điểm có thể khác giữa 2 cách)
+        mismatches = 0
+        for uid in user_ids:
+            old = python_loop(db, uid)
+            new = suggest_task_order(uid, db)
+            if [r["score"] for r in old] != [r["score"] for r in new]:
+                mismatches += 1
+
+        result = {
+            "users": args.users,
+            "tasks_per_user": args.tasks_per_user,
+            "avg_open_tasks_per_user": round(float(open_per_user or 0), 1),
+            "setup_s": round(setup_s, 2),
+            "score_mismatches": mismatches,
+            "latency": {},
+        }
+        order_cache.listening = False  # đo truy vấn thật, không qua cache
+        result["latency"]["python_loop"] = time_calls(lambda u: python_loop(db, u), user_ids, args.repeat)
+        result["latency"]["sql_topk"] = time_calls(lambda u: suggest_task_order(u, db), user_ids, args.repeat)
+        for stmt in INDEX_SQL:
+            conn.execute(text(stmt))
+        conn.commit()
+        vacuum()
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        result["latency"]["sql_topk_idx"] = time_calls(lambda u: suggest_task_order(u, db), user_ids, args.repeat)
+
+        # Cache: bật như khi ChangeListener đang chạy, lần đầu điền cache rồi đo các lần trúng
+        order_cache.listening = True
+        for uid in user_ids:
+            suggest_task_order(uid, db)
+        result["latency"]["cache_hit"] = time_calls(lambda u: suggest_task_order(u, db), user_ids, args.repeat)
+        result["cache"] = order_cache.stats()
+        order_cache.listening = False
+        order_cache.clear()
+
+        base = result["latency"]["python_loop"]["p50_ms"]
+        result["speedup_p50"] = {k: round(base / max(v["p50_ms"], 1e-6), 1) for k, v in result["latency"].items()}
+        db.close()
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
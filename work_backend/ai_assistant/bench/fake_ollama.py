@@ -0,0 +1,122 @@
+# bench/fake_ollama.py
+# Server giả lập Ollama /api/generate để test client async + /chat/stream mà không cần model thật.
+# Trả về câu trả lời cố định, tách theo từ, mỗi token cách nhau --delay giây.
+#
+#   python bench/fake_ollama.py --port 11500 --delay 0.05
+#   OLLAMA_HOST=http://127.0.0.1:11500 uvicorn main:app
+#
+#   python bench/fake_ollama.py --check      # tự chạy server + bắn N request song song qua AsyncOllamaClient
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REPLY = "- Task đang đúng tiến độ.\n- Nên cập nhật trạng thái hằng ngày.\n- Ưu tiên các việc sắp đến hạn."
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    delay = 0.05
+    active = 0
+    max_active = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        cls = type(self)
+        with cls._lock:
+            cls.active += 1
+            cls.max_active = max(cls.max_active, cls.active)
+        try:
+            tokens = [w + " " for w in REPLY.split(" ")]
+            if body.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                for tok in tokens:
+                    time.sleep(self.delay)
+                    self.wfile.write((json.dumps({"model": body.get("model"), "response": tok, "done": False}) + "\n").encode())
+                    self.wfile.flush()
+                self.wfile.write((json.dumps({"model": body.get("model"), "response": "", "done": True}) + "\n").encode())
+            else:
+                time.sleep(self.delay * len(tokens))
+                data = json.dumps({"model": body.get("model"), "response": "".join(tokens), "done": True}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client đã hủy (vd. test timeout)
+        finally:
+            with cls._lock:
+                cls.active -= 1
+
+
+def serve(port: int, delay: float) -> ThreadingHTTPServer:
+    FakeOllamaHandler.delay = delay
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def _check(port: int, n: int, concurrency: int):
+    from ai.llm_async import AsyncOllamaClient, LLMError
+    client = AsyncOllamaClient(host=f"http://127.0.0.1:{port}", max_concurrency=concurrency)
+
+    t0 = time.perf_counter()
+    first_token = None
+    parts = []
+    async for tok in client.stream("ping"):
+        if first_token is None:
+            first_token = time.perf_counter() - t0
+        parts.append(tok)
+    total = time.perf_counter() - t0
+    assert "".join(parts).strip() == REPLY, "stream trả sai nội dung"
+    print(f"stream: first token {first_token * 1000:.0f} ms, total {total * 1000:.0f} ms")
+
+    t0 = time.perf_counter()
+    replies = await asyncio.gather(*(client.generate("ping") for _ in range(n)))
+    assert all(r == REPLY for r in replies)
+    print(f"generate x{n}: {time.perf_counter() - t0:.2f}s, max đồng thời ở server = "
+          f"{FakeOllamaHandler.max_active} (giới hạn {concurrency})")
+    assert FakeOllamaHandler.max_active <= concurrency
+
+    try:
+        await client.generate("ping", timeout=0.01)
+        raise AssertionError("timeout không có tác dụng")
+    except LLMError as e:
+        print(f"timeout: {type(e).__name__}")
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--delay", type=float, default=0.05)
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("-n", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.delay)
+    if args.check:
+        asyncio.run(_check(args.port, args.n, args.concurrency))
+        server.shutdown()
+    else:
+        print(f"Fake Ollama: http://127.0.0.1:{args.port}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,258 @@
+# bench/workload.py
+# Sinh dữ liệu giả lập (seed cố định → chạy lại ra đúng dữ liệu đó) cho các bảng AI đọc, trong 1 schema riêng
+# của Postgres local. DDL (CREATE TABLE + CREATE INDEX) lấy thẳng từ workdb.sql → đúng cột, ràng buộc, index
+# như DB thật; FK trỏ tới bảng cùng schema.
+# Quy mô theo số user (tier 100 / 1k / 10k), các bảng khác theo tỉ lệ:
+#   Departments ~ users/25, Projects ~ users/20 (4 ProjectParts / project),
+#   Tasks = users * tasks_per_user, 1-3 Task_Required_Skills / task, 2-6 User_skills / user,
+#   1 người làm chính + 0-2 người phụ / task (mỗi người 1 dòng Taskprogresses),
+#   1 trạng thái hiện tại (+ 1 trạng thái cũ) / task, histories_per_task dòng Taskhistories / task.
+# Dùng từ script khác: generate(conn, schema, users) rồi SET search_path TO schema.
+# Chạy riêng (giữ schema để tự truy vấn): python bench/workload.py --users 1000 --schema bench_1k
+import sys
+import os
+import re
+import json
+import time
+import argparse
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import numpy as np
+from sqlalchemy import text
+
+WORKDB_SQL = os.path.join(ROOT_DIR, "..", "..", "workdb.sql")
+
+# Thứ tự tạo / nạp theo FK
+TABLES = [
+    "Departments", "Users", "User_skills", "Projects", "ProjectParts", "Tasks", "Task_Required_Skills",
+    "TaskAssignments", "TaskStatuses", "Taskprogresses", "Taskhistories",
+]
+
+SKILLS = [
+    "Python", "Java", "Node.js", "React", "Vue", "Angular", "SQL", "PostgreSQL", "MongoDB", "Docker",
+    "Kubernetes", "AWS", "Linux", "Git", "CI/CD", "Figma", "UI/UX Design", "Photoshop", "Testing",
+    "Automation Test", "Cryptography", "Networking", "Security", "Machine Learning", "Data Analysis",
+    "Excel", "Communication", "Project Management", "Scrum", "Technical Writing", "C#", ".NET", "Go",
+    "Rust", "Kotlin", "Swift", "Flutter", "GraphQL", "Redis", "Kafka",
+]
+STATUSES = ["pending", "in_progress", "review", "done"]
+STATUS_P = [0.25, 0.35, 0.1, 0.3]
+
+
+def schema_ddl(path: str = WORKDB_SQL) -> list:
+    # CREATE TABLE của TABLES (đúng thứ tự) + CREATE INDEX trên các bảng đó, bỏ comment đầu câu
+    with open(path, encoding="utf-8") as f:
+        sql = f.read()
+    tables, indexes = {}, []
+    wanted = {t.lower() for t in TABLES}
+    for stmt in sql.split(";"):
+        stmt = re.sub(r"^(\s*--[^\n]*\n)*\s*", "", stmt)
+        m = re.match(r"CREATE TABLE (?:IF NOT EXISTS )?(\w+)\s*\(", stmt, re.I)
+        if m and m.group(1).lower() in wanted:
+            tables[m.group(1).lower()] = stmt
+            continue
+        m = re.match(r"CREATE (?:UNIQUE )?INDEX .*? ON (\w+)\s*\(", stmt, re.I | re.S)
+        if m and m.group(1).lower() in wanted:
+            indexes.append(stmt)
+    missing = wanted - set(tables)
+    if missing:
+        raise RuntimeError(f"workdb.sql thiếu CREATE TABLE: {sorted(missing)}")
+    return [tables[t.lower()] for t in TABLES] + indexes
+
+
+def _insert(conn, table: str, columns: dict):
+    # columns: tên cột → (mảng numpy / list, kiểu SQL); nạp 1 câu INSERT ... SELECT FROM unnest(...).
+    # Kiểu "EPOCH": giây epoch (NaN = NULL) → TIMESTAMPTZ
+    params, arrays, exprs = {}, [], []
+    for i, (values, sql_type) in enumerate(columns.values()):
+        params[f"c{i}"] = values.tolist() if hasattr(values, "tolist") else list(values)
+        if sql_type == "EPOCH":
+            arrays.append(f"CAST(:c{i} AS FLOAT8[])")
+            exprs.append(f"to_timestamp(NULLIF(x.c{i}, 'NaN'))")
+        else:
+            arrays.append(f"CAST(:c{i} AS {sql_type}[])")
+            exprs.append(f"x.c{i}")
+    aliases = ", ".join(f"c{i}" for i in range(len(columns)))
+    conn.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(exprs)} "
+                      f"FROM unnest({', '.join(arrays)}) AS x({aliases})"), params)
+
+
+def generate(conn, schema: str, users: int, seed: int = 42, tasks_per_user: int = 5,
+             histories_per_task: int = 4) -> dict:
+    rng = np.random.default_rng(seed)
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {schema}"))
+    conn.execute(text(f"SET search_path TO {schema}"))
+    for stmt in schema_ddl():
+        conn.execute(text(stmt))
+
+    now = time.time()
+    day = 86400.0
+
+    n_dept = max(1, users // 25)
+    dept_ids = np.arange(1, n_dept + 1)
+    _insert(conn, "Departments", {
+        "department_id": (dept_ids, "INTEGER"),
+        "department_name": ([f"Phòng {i}" for i in dept_ids], "TEXT"),
+    })
+
+    user_ids = np.arange(1, users + 1)
+    user_dept = rng.integers(1, n_dept + 1, users)
+    _insert(conn, "Users", {
+        "user_id": (user_ids, "INTEGER"),
+        "first_name": ([f"User{i}" for i in user_ids], "TEXT"),
+        "last_name": ([f"Test{i % 97}" for i in user_ids], "TEXT"),
+        "status": (np.where(rng.random(users) < 0.95, "Active", "Inactive"), "TEXT"),
+        "department_id": (user_dept, "INTEGER"),
+    })
+
+    # 2-6 skill khác nhau / user
+    n_us = rng.integers(2, 7, users)
+    us_user = np.repeat(user_ids, n_us)
+    us_skill = np.concatenate([rng.choice(len(SKILLS), k, replace=False) for k in n_us])
+    _insert(conn, "User_skills", {
+        "skill_id": (np.arange(1, len(us_user) + 1), "INTEGER"),
+        "user_id": (us_user, "INTEGER"),
+        "skill_name": (np.asarray(SKILLS)[us_skill], "TEXT"),
+        "level": (rng.integers(1, 11, len(us_user)), "INTEGER"),
+    })
+
+    n_proj = max(1, users // 20)
+    proj_ids = np.arange(1, n_proj + 1)
+    _insert(conn, "Projects", {
+        "project_id": (proj_ids, "INTEGER"),
+        "project_name": ([f"Dự án {i}" for i in proj_ids], "TEXT"),
+        "status": (np.full(n_proj, "Active"), "TEXT"),
+        "created_by": (rng.integers(1, users + 1, n_proj), "INTEGER"),
+    })
+    part_ids = np.arange(1, n_proj * 4 + 1)
+    _insert(conn, "ProjectParts", {
+        "part_id": (part_ids, "INTEGER"),
+        "project_id": (np.repeat(proj_ids, 4), "INTEGER"),
+        "part_name": ([f"Phần {i % 4 + 1}" for i in range(len(part_ids))], "TEXT"),
+        "status": (np.full(len(part_ids), "Active"), "TEXT"),
+        "department_id": (rng.integers(1, n_dept + 1, len(part_ids)), "INTEGER"),
+    })
+
+    n_tasks = users * tasks_per_user
+    task_ids = np.arange(1, n_tasks + 1)
+    start = now - rng.uniform(0, 120, n_tasks) * day
+    due = start + rng.uniform(1, 90, n_tasks) * day
+    has_due = rng.random(n_tasks) > 0.05
+    _insert(conn, "Tasks", {
+        "task_id": (task_ids, "INTEGER"),
+        "title": ([f"Task {i}" for i in task_ids], "TEXT"),
+        "priority": (rng.choice(["Low", "Medium", "High"], n_tasks, p=[0.3, 0.5, 0.2]), "TEXT"),
+        "created_by": (rng.integers(1, users + 1, n_tasks), "INTEGER"),
+        "assigned_by": (rng.integers(1, users + 1, n_tasks), "INTEGER"),
+        "part_id": (rng.integers(1, len(part_ids) + 1, n_tasks), "INTEGER"),
+        "start_date": (start, "EPOCH"),
+        "due_date": (np.where(has_due, due, np.nan), "EPOCH"),
+        "updated_at": (start, "EPOCH"),
+    })
+
+    n_trs = rng.integers(1, 4, n_tasks)
+    trs_task = np.repeat(task_ids, n_trs)
+    trs_skill = np.concatenate([rng.choice(len(SKILLS), k, replace=False) for k in n_trs])
+    _insert(conn, "Task_Required_Skills", {
+        "task_id": (trs_task, "INTEGER"),
+        "skill_name": (np.asarray(SKILLS)[trs_skill], "TEXT"),
+        "required_level": (rng.integers(1, 11, len(trs_task)), "INTEGER"),
+    })
+
+    # Người làm chính + 0-2 người phụ (khác nhau trong 1 task)
+    n_as = rng.integers(1, 4, n_tasks)
+    as_task = np.repeat(task_ids, n_as)
+    as_user = np.concatenate([rng.choice(users, k, replace=False) + 1 for k in n_as])
+    as_main = np.concatenate([[True] + [False] * (k - 1) for k in n_as])
+    _insert(conn, "TaskAssignments", {
+        "assignment_id": (np.arange(1, len(as_task) + 1), "INTEGER"),
+        "task_id": (as_task, "INTEGER"),
+        "user_id": (as_user, "INTEGER"),
+        "is_main_assignee": (as_main, "BOOLEAN"),
+    })
+
+    # unique (task_id, is_current): tối đa 1 trạng thái cũ + 1 trạng thái hiện tại / task
+    status = rng.choice(STATUSES, n_tasks, p=STATUS_P)
+    old = status != "pending"
+    st_task = np.concatenate([task_ids[old], task_ids])
+    _insert(conn, "TaskStatuses", {
+        "status_id": (np.arange(1, len(st_task) + 1), "INTEGER"),
+        "task_id": (st_task, "INTEGER"),
+        "status_name": (np.concatenate([np.full(old.sum(), "pending"), status]), "TEXT"),
+        "is_current": (np.concatenate([np.zeros(old.sum(), bool), np.ones(n_tasks, bool)]), "BOOLEAN"),
+    })
+
+    pct = np.where(status == "done", 100, np.where(status == "pending", 0, rng.integers(5, 96, n_tasks)))
+    _insert(conn, "Taskprogresses", {
+        "progress_id": (np.arange(1, len(as_task) + 1), "INTEGER"),
+        "task_id": (as_task, "INTEGER"),
+        "user_id": (as_user, "INTEGER"),
+        "percentage_complete": (np.repeat(pct, n_as), "INTEGER"),
+    })
+
+    # Lịch sử: chủ yếu người làm chính, thời điểm tăng dần từ start_date tới hiện tại
+    first_as = np.concatenate([[0], np.cumsum(n_as)[:-1]])
+    h_task_idx = np.repeat(np.arange(n_tasks), histories_per_task)
+    pick = rng.integers(0, 3, len(h_task_idx)) % n_as[h_task_idx]
+    h_user = as_user[first_as[h_task_idx] + pick]
+    frac = np.sort(rng.random((n_tasks, histories_per_task)), axis=1).ravel()
+    h_time = start[h_task_idx] + frac * (now - start[h_task_idx])
+    h_status = rng.choice(STATUSES, len(h_task_idx), p=STATUS_P)
+    h_status[histories_per_task - 1::histories_per_task] = status  # lịch sử cuối = trạng thái hiện tại
+    _insert(conn, "Taskhistories", {
+        "history_id": (np.arange(1, len(h_task_idx) + 1), "INTEGER"),
+        "task_id": (task_ids[h_task_idx], "INTEGER"),
+        "user_id": (h_user, "INTEGER"),
+        "action": (np.full(len(h_task_idx), "update_status"), "TEXT"),
+        "new_percentage_complete": (rng.integers(0, 101, len(h_task_idx)), "INTEGER"),
+        "status_after_update": (h_status, "TEXT"),
+        "created_at": (h_time, "EPOCH"),
+    })
+
+    # Serial: id sinh ra ở trên đã chiếm chỗ → nextval tiếp sau max id
+    for table, col in [("Departments", "department_id"), ("Users", "user_id"), ("User_skills", "skill_id"),
+                       ("Projects", "project_id"), ("ProjectParts", "part_id"), ("Tasks", "task_id"),
+                       ("TaskAssignments", "assignment_id"), ("TaskStatuses", "status_id"),
+                       ("Taskprogresses", "progress_id"), ("Taskhistories", "history_id")]:
+        conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{schema}.{table}', '{col}'), "
+                          f"(SELECT COALESCE(MAX({col}), 1) FROM {table}))"))
+
+    return {t: conn.execute(text(f"SELECT count(*) FROM {t}")).scalar() for t in TABLES}
+
+
+def vacuum(engine, schema: str):
+    # Như autovacuum trên DB thật: visibility map + thống kê cho planner
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as c:
+        c.execute(text(f"VACUUM ANALYZE {', '.join(f'{schema}.{t}' for t in TABLES)}"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--schema", default="bench_workload")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tasks-per-user", type=int, default=5)
+    parser.add_argument("--histories-per-task", type=int, default=4)
+    parser.add_argument("--drop", action="store_true", help="Xóa schema rồi thoát")
+    args = parser.parse_args()
+
+    from database import engine
+    with engine.connect() as conn:
+        if args.drop:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+            conn.commit()
+            return
+        t0 = time.perf_counter()
+        counts = generate(conn, args.schema, args.users, args.seed, args.tasks_per_user, args.histories_per_task)
+        conn.commit()
+    vacuum(engine, args.schema)
+    print(json.dumps({"schema": args.schema, "setup_s": round(time.perf_counter() - t0, 2), "rows": counts},
+                     indent=2))
+
+
+if __name__ == "__main__":
+    main()
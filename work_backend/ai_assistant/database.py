@@ -1,11 +1,23 @@
 # database.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+import asyncio
 
 # THAY ĐỔI: XÓA dấu chấm
 from config import settings  # ← ĐÚNG
+from metrics import instrument_engine
 
-engine = create_engine(settings.DATABASE_URL)
+POOL_ARGS = dict(
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+
+engine = create_engine(settings.DATABASE_URL, **POOL_ARGS)
+instrument_engine(engine)  # đếm truy vấn / thời gian SQL theo request (metrics.py)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -13,4 +25,55 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# ----- Engine async (asyncpg): tạo ở lần dùng đầu, import sqlalchemy.ext.asyncio / asyncpg khi cần -----
+_async_engine = None
+_AsyncSessionLocal = None
+
+def async_database_url():
+    url = make_url(settings.ASYNC_DATABASE_URL or settings.DATABASE_URL)
+    if url.drivername in ("postgresql", "postgresql+psycopg2", "postgres"):
+        url = url.set(drivername="postgresql+asyncpg")
+    # asyncpg prepare mỗi câu SQL 1 lần / kết nối rồi dùng lại; cache theo chuỗi SQL
+    return url.update_query_dict({"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)})
+
+def get_async_sessionmaker():
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        _async_engine = create_async_engine(async_database_url(), **POOL_ARGS)
+        instrument_engine(_async_engine)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def close_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _AsyncSessionLocal = None
+
+class SessionRunner:
+    # Mỗi truy vấn lấy 1 session riêng từ pool → nhiều truy vấn trong 1 request gather() song song được
+    # (1 AsyncSession / Session không được dùng đồng thời từ nhiều coroutine / thread)
+
+    async def query(self, fn, *args):
+        # fn(async_db, *args) là coroutine truy vấn qua asyncpg
+        async with get_async_sessionmaker()() as db:
+            return await fn(db, *args)
+
+    async def call(self, fn, *args):
+        # fn(db, *args) sync (model, graph...) chạy trong thread với Session sync riêng
+        def run():
+            db = SessionLocal()
+            try:
+                return fn(db, *args)
+            finally:
+                db.close()
+        return await asyncio.to_thread(run)
+
+runner = SessionRunner()
@@ -1,10 +1,39 @@
 # main.py
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from router import router
+from config import settings
+import metrics
+from ai.llm_async import llm
+from database import close_async_engine
+from ai.change_listener import start_listener
 import uvicorn
 
 app = FastAPI(title="Work AI Assistant")
 app.include_router(router)
+# Số truy vấn SQL + thời gian từng bước của mỗi request → histogram ở /metrics
+app.add_middleware(metrics.MetricsMiddleware, debug_header=settings.METRICS_DEBUG_HEADER)
+
+_change_listener = None
+
+@app.on_event("startup")
+def start_background():
+    # Cache thứ tự task theo user + cache context task: bỏ entry khi DB báo thay đổi; index ứng viên
+    # refresh ngay khi skill / user đổi (LISTEN task_order_changed, task_context_changed, candidates_changed)
+    global _change_listener
+    _change_listener = start_listener()
+
+@app.on_event("shutdown")
+async def close_clients():
+    if _change_listener is not None:
+        _change_listener.stop()
+    await llm.aclose()
+    await close_async_engine()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    # Định dạng text của Prometheus (text/plain; version=0.0.4)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def home():
@@ -0,0 +1,198 @@
+# metrics.py
+# Đo theo request: số truy vấn SQL + thời gian DB (event của engine SQLAlchemy, cả sync lẫn asyncpg)
+# và thời gian từng bước của /chat (rule, intent, action, prompt, llm); trong ai/ các bước con tách
+# đọc feature (features.*) với chạy model (inference.*) — nằm lồng trong stage của router.
+#   - RequestMetrics của request hiện tại nằm trong ContextVar: threadpool (anyio), asyncio.to_thread,
+#     task của gather đều copy context → truy vấn / stage chạy ở đó vẫn cộng vào đúng request
+#   - Mọi số đo vào Histogram trong process, GET /metrics trả dạng text Prometheus (không cần prometheus_client)
+#   - settings.METRICS_DEBUG_HEADER → thêm header Server-Timing tóm tắt stage + số truy vấn của request
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+
+class Histogram:
+    # Bucket cố định, cộng dồn kiểu Prometheus (le = "nhỏ hơn hoặc bằng"), 1 chuỗi số / bộ giá trị label
+    def __init__(self, name: str, help: str, buckets: Sequence[float], labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series: Dict[tuple, list] = {}  # labels → [counts theo bucket (+Inf cuối), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(s[0]), s[1], s[2]) for labels, s in sorted(self._series.items())]
+        for labels, counts, total, count in series:
+            base = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels)]
+            cumulative = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                lab = ",".join(base + [f'le="{"+Inf" if le == float("inf") else repr(le)}"'])
+                lines.append(f"{self.name}_bucket{{{lab}}} {cumulative}")
+            lab = "{" + ",".join(base) + "}" if base else ""
+            lines.append(f"{self.name}_sum{lab} {total}")
+            lines.append(f"{self.name}_count{lab} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Thời gian xử lý request (tới byte cuối của body)",
+                            LATENCY_BUCKETS, ("method", "route", "status"))
+STAGE_SECONDS = Histogram("chat_stage_duration_seconds", "Thời gian từng bước của pipeline chat",
+                          LATENCY_BUCKETS, ("stage",))
+QUERY_SECONDS = Histogram("db_query_duration_seconds", "Thời gian 1 truy vấn SQL", QUERY_BUCKETS)
+REQUEST_QUERIES = Histogram("db_queries_per_request", "Số truy vấn SQL trong 1 request", COUNT_BUCKETS, ("route",))
+REQUEST_DB_SECONDS = Histogram("db_time_per_request_seconds", "Tổng thời gian SQL trong 1 request",
+                               LATENCY_BUCKETS, ("route",))
+HISTOGRAMS = (REQUEST_SECONDS, STAGE_SECONDS, QUERY_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.stages: Dict[str, float] = {}  # stage lặp lại (batch) → cộng dồn
+        self._lock = threading.Lock()       # truy vấn của 1 request có thể chạy song song ở nhiều thread
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    def add_stage(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        # https://www.w3.org/TR/server-timing/ — dur tính bằng ms, DevTools hiện sẵn
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+            parts.append(f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"')
+        parts.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+def current() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    # with stage("intent"): ... → histogram theo stage + cộng vào request hiện tại (nếu có)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, name)
+        m = _current.get()
+        if m is not None:
+            m.add_stage(name, elapsed)
+
+
+async def astage(name: str, aw):
+    # Bản cho awaitable: await astage("llm", agenerate_response(...))
+    with stage(name):
+        return await aw
+
+
+# ----- SQLAlchemy -----
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_SECONDS.observe(elapsed)
+    m = _current.get()
+    if m is not None:
+        m.add_query(elapsed)
+
+
+def instrument_engine(engine):
+    # engine sync, hoặc AsyncEngine (event gắn vào sync_engine bên trong)
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+# ----- ASGI -----
+class MetricsMiddleware:
+    # ASGI thuần (không BaseHTTPMiddleware): bọc send để gắn header lúc response.start và ghi thời gian
+    # ở byte cuối của body → response stream (SSE / NDJSON) tính đủ thời gian sinh.
+    # Header chỉ có số đo tới lúc gửi header: với response stream, stage "llm" chưa nằm trong đó.
+    def __init__(self, app, debug_header: bool = False):
+        self.app = app
+        self.debug_header = debug_header
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        m = RequestMetrics()
+        token = _current.set(m)
+        status = [500]
+        finished = [False]
+
+        def finish():
+            if finished[0]:
+                return
+            finished[0] = True
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - m.started, scope["method"], route, str(status[0]))
+            REQUEST_QUERIES.observe(m.queries, route)
+            REQUEST_DB_SECONDS.observe(m.db_seconds, route)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if self.debug_header:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", m.server_timing().encode("latin-1")))
+                    message = dict(message, headers=headers)
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            _current.reset(token)
+
+
+def render() -> str:
+    return "\n".join(h.render() for h in HISTOGRAMS) + "\n"
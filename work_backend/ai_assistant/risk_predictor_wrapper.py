@@ -2,18 +2,33 @@
 import sys
 import io
 sys.path.append('ai')
-from ai.risk_tgn import predict_risk_advanced
+from ai.risk_tgn import predict_risk_advanced, predict_risk_bulk
 from database import SessionLocal
 
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-task_id = int(sys.argv[1])
-db = SessionLocal()
-try:
-    result = predict_risk_advanced(task_id, db)
-    score = result.get('risk_score', 0.5)
-    level = result.get('risk_level', 'Thấp')  # Dùng risk_level thay vì tính lại
-    print(f"{score},{level}")
-except Exception as e:
-    print(f"0.5,Thấp")  # Fallback nếu lỗi
-finally:
-    db.close()
\ No newline at end of file
+def main():
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+    # --all: mỗi dòng "task_id,score,level" cho mọi task đang mở (1 lần forward trên cả graph)
+    if sys.argv[1] == "--all":
+        db = SessionLocal()
+        try:
+            for tid, result in predict_risk_bulk(db).items():
+                print(f"{tid},{result['risk_score']},{result['risk_level']}")
+        finally:
+            db.close()
+        return
+
+    task_id = int(sys.argv[1])
+    db = SessionLocal()
+    try:
+        result = predict_risk_advanced(task_id, db)
+        score = result.get('risk_score', 0.5)
+        level = result.get('risk_level', 'Thấp')  # Dùng risk_level thay vì tính lại
+        print(f"{score},{level}")
+    except Exception as e:
+        print(f"0.5,Thấp")  # Fallback nếu lỗi
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,279 @@
 # router.py
-from fastapi import APIRouter, Depends
+import json
+import asyncio
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from database import get_db
-from schemas import ChatMessage, AIResponse
+from database import get_db, runner
+from config import settings
+from schemas import ChatMessage, AIResponse, ChatBatchRequest, ChatBatchItem, ChatBatchResponse
 from utils import extract_task_id
+from metrics import stage, astage
 
 # CHỈ IMPORT 2 HÀM MỚI
 from ai import (
-    apply_rules, predict_intent,
-    predict_risk_advanced as predict_risk,
-    suggest_assignee_rl as suggest_assignee,
-    suggest_task_order,
-    get_task_context, generate_response
+    apply_rules, apply_rules_batch, predict_intent, predict_intents,
+    predict_risk_bulk,
+    suggest_assignee_bandit as suggest_assignee,
 )
+from ai.llm_client import (
+    PromptLoads, prepare_prompt, aprompt_inputs, finish_prompt, agenerate_response, astream_response,
+    extract_task_id as prompt_task_id,
+)
+from ai.llm_async import llm
+from ai.llm_cache import llm_cache
+from ai.model_registry import registry
+from ai.rule_engine import rule_stats
+from ai.risk_tgn import graph_store, apredict_risk_advanced
+from ai.task_ordering import asuggest_task_order, order_cache
+from ai.db_integration import TaskContextLoader, context_cache
+from ai.risk_scores import get_task_risks
+from ai.candidate_index import candidate_index
 
 router = APIRouter()
 
-@router.post("/chat", response_model=AIResponse)
-def chat(msg: ChatMessage, db: Session = Depends(get_db)):
+def _action_for(message: str, intent: str) -> str:
+    text = message.lower()
+    # RỦI RO → dùng TGN
+    if "rủi ro" in text or intent == "task_risk_query":
+        return "risk"
+    # PHÂN CÔNG → dùng RL
+    if "ai nên làm" in text or intent == "task_assignment":
+        return "assignment"
+    # SẮP XẾP TASK
+    if "làm task nào trước" in text or intent == "task_ordering":
+        return "ordering"
+    # THÔNG TIN TASK (mặc định)
+    return "info"
+
+def _action_data(action: str, task_id: int, user_id: int, loads: PromptLoads):
+    # loads dùng chung với prompt: task / user đã đọc cho action không phải đọc lại
+    if action == "risk":
+        return loads.risk(task_id)
+    if action == "assignment":
+        return loads.assignment(task_id)
+    if action == "ordering":
+        return {"priority": loads.ordering(user_id)}
+    return loads.context(task_id)
+
+def _prepare_chat(msg: ChatMessage, db: Session):
+    # Phần đồng bộ của /chat: rule → intent → model → prompt + tra cache.
+    # Trả về (reply của rule | None, action, data, PreparedPrompt | None)
     message = msg.message.strip()
     user_id = msg.user_id
     task_id = extract_task_id(message) or 1
 
     # 1. Rule engine
-    ruled, reply = apply_rules(message)
+    with stage("rules"):
+        ruled, reply = apply_rules(message)
     if ruled:
-        return AIResponse(reply=reply)
+        return reply, None, None, None
 
-    # 2. Intent
-    intent, prob = predict_intent(message)
-    data = {}
-    action = None
+    # 2. Intent → action
+    with stage("intent"):
+        predicted = predict_intent(message)
+    action = _action_for(message, predicted[0])
+    loads = PromptLoads(db)
+    with stage(f"action.{action}"):
+        data = _action_data(action, task_id, user_id, loads)
 
-    # RỦI RO → dùng TGN
-    if "rủi ro" in message.lower() or intent == "task_risk_query":
-        data = predict_risk(task_id, db)
-        action = "risk"
+    # 3. Prompt cho LLM (kèm kết quả tra cache)
+    with stage("prompt"):
+        prepared = prepare_prompt(message, data, db, predicted, loads)
+    return None, action, data, prepared
 
-    # PHÂN CÔNG → dùng RL
-    elif "ai nên làm" in message.lower() or intent == "task_assignment":
-        data = suggest_assignee(task_id, db)
-        action = "assignment"
+def _prepare_chat_batch(msgs: List[ChatMessage], db: Session) -> list:
+    # Như _prepare_chat cho cả batch: rule và intent chạy 1 lượt cho mọi câu, context / version của mọi
+    # task được nhắc tới gom 1 truy vấn mỗi loại, model (risk / phân công / thứ tự) mỗi task_id / user_id
+    # chạy 1 lần cho cả batch (PromptLoads dùng chung). Trả về list cùng thứ tự msgs như _prepare_chat
+    messages = [m.message.strip() for m in msgs]
+    with stage("rules"):
+        ruled = apply_rules_batch(messages)
+    todo = [i for i, (hit, _) in enumerate(ruled) if not hit]
+    with stage("intent"):
+        predicted = dict(zip(todo, predict_intents([messages[i] for i in todo])))
 
-    # SẮP XẾP TASK
-    elif "làm task nào trước" in message.lower() or intent == "task_ordering":
-        data = {"priority": suggest_task_order(user_id, db)}
-        action = "ordering"
+    loads = PromptLoads(db)
+    plans = {}
+    for i in todo:
+        task_id = extract_task_id(messages[i]) or 1
+        plans[i] = (task_id, _action_for(messages[i], predicted[i][0]))
+    # Task cần context / version: của action "info" (router) và của prompt (llm_client đọc task_id riêng)
+    loads.prime([tid for tid, action in plans.values() if action == "info"] +
+                [prompt_task_id(messages[i]) for i in todo])
 
-    # THÔNG TIN TASK (mặc định)
+    results = []
+    for i, msg in enumerate(msgs):
+        hit, reply = ruled[i]
+        if hit:
+            results.append((reply, None, None, None))
+            continue
+        task_id, action = plans[i]
+        with stage(f"action.{action}"):
+            data = _action_data(action, task_id, msg.user_id, loads)
+        with stage("prompt"):
+            prepared = prepare_prompt(messages[i], data, db, predicted[i], loads)
+        results.append((None, action, data, prepared))
+    return results
+
+async def _aprepare_chat(msg: ChatMessage):
+    # Như _prepare_chat nhưng truy vấn qua engine asyncpg: data của action và các input của prompt
+    # (context, version cache, model theo intent) chạy song song, mỗi việc 1 kết nối riêng từ pool
+    message = msg.message.strip()
+    user_id = msg.user_id
+    task_id = extract_task_id(message) or 1
+
+    with stage("rules"):
+        ruled, reply = apply_rules(message)
+    if ruled:
+        return reply, None, None, None
+
+    with stage("intent"):
+        intent, prob = predict_intent(message)
+    action = _action_for(message, intent)
+    loader = TaskContextLoader()  # action "info" và prompt cùng cần context của task_id → 1 lần đọc
+    if action == "risk":
+        job = apredict_risk_advanced(task_id, runner)
+    elif action == "assignment":
+        job = runner.call(lambda db: suggest_assignee(task_id, db))
+    elif action == "ordering":
+        job = runner.query(asuggest_task_order, user_id)
     else:
-        data = get_task_context(db, task_id)
-        action = "info"
+        job = loader.aload(runner, task_id)
+
+    # 2 stage chạy song song → thời gian của chúng chồng lên nhau
+    data, inputs = await asyncio.gather(astage(f"action.{action}", job),
+                                        astage("prompt", aprompt_inputs(message, runner, loader=loader)))
+    if action == "ordering":
+        data = {"priority": data}
+    return None, action, data, finish_prompt(message, data, inputs)
+
+async def _chat_inputs(msg: ChatMessage, db: Session):
+    if settings.DB_ASYNC:
+        return await _aprepare_chat(msg)
+    return await run_in_threadpool(_prepare_chat, msg, db)
+
+@router.post("/chat", response_model=AIResponse)
+async def chat(msg: ChatMessage, db: Session = Depends(get_db)):
+    reply, action, data, prepared = await _chat_inputs(msg, db)
+    if prepared is None:
+        return AIResponse(reply=reply)
+
+    # 4. LLM sinh câu trả lời tự nhiên (không giữ worker thread trong lúc chờ), trúng cache thì trả luôn
+    reply = await astage("llm", agenerate_response(prepared))
+    return AIResponse(reply=reply, action=action, data=data)
+
+@router.post("/chat/batch", response_model=ChatBatchResponse)
+async def chat_batch(req: ChatBatchRequest, db: Session = Depends(get_db)):
+    # Nhiều câu hỏi 1 request (vd. tổng hợp standup cả team): phần rule / intent / DB / model gom theo batch,
+    # LLM sinh tối đa CHAT_BATCH_CONCURRENCY câu cùng lúc; câu trùng prompt (cùng cache key) chỉ sinh 1 lần.
+    # stream=False → trả cùng thứ tự messages; stream=True → NDJSON, mỗi dòng 1 ChatBatchItem khi xong
+    prepared_items = await run_in_threadpool(_prepare_chat_batch, req.messages, db)
+    sem = asyncio.Semaphore(settings.CHAT_BATCH_CONCURRENCY)
+    generating = {}
+
+    async def generate(prepared):
+        async with sem:
+            return await astage("llm", agenerate_response(prepared))
+
+    async def answer(index: int, item) -> ChatBatchItem:
+        reply, action, data, prepared = item
+        if prepared is not None:
+            if prepared.cached is not None:
+                reply = prepared.cached
+            else:
+                job = generating.get(prepared.cache_key)
+                if job is None:
+                    job = generating[prepared.cache_key] = asyncio.ensure_future(generate(prepared))
+                reply = await asyncio.shield(job)
+        return ChatBatchItem(index=index, reply=reply, action=action, data=data)
+
+    jobs = [asyncio.ensure_future(answer(i, item)) for i, item in enumerate(prepared_items)]
+    if not req.stream:
+        results = await asyncio.gather(*jobs)
+        return ChatBatchResponse(results=[AIResponse(**r.model_dump(exclude={"index"})) for r in results])
+
+    async def lines():
+        try:
+            for done in asyncio.as_completed(jobs):
+                item = await done
+                yield json.dumps(item.model_dump(), ensure_ascii=False, default=str) + "\n"
+        finally:
+            # Client ngắt giữa chừng → không sinh tiếp phần còn lại
+            for job in list(jobs) + list(generating.values()):
+                job.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _sse(event: str, payload) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream(msg: ChatMessage, db: Session = Depends(get_db)):
+    # Server-Sent Events: "meta" (action + data) → nhiều "token" → "done" (reply đầy đủ)
+    reply, action, data, prepared = await _chat_inputs(msg, db)
+
+    async def events():
+        yield _sse("meta", {"action": action, "data": data})
+        if prepared is None:
+            yield _sse("token", {"text": reply})
+            yield _sse("done", {"reply": reply})
+            return
+        parts = []
+        with stage("llm"):
+            async for token in astream_response(prepared):
+                parts.append(token)
+                yield _sse("token", {"text": token})
+        yield _sse("done", {"reply": "".join(parts).strip()})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/risk")
+def risk_all(db: Session = Depends(get_db)):
+    # Rủi ro mọi task đang mở, tính trong 1 lần forward trên graph toàn hệ thống
+    return predict_risk_bulk(db)
+
+@router.get("/risk/scores")
+def risk_scores(task_ids: List[int] = Query(...), max_staleness: Optional[float] = None,
+                db: Session = Depends(get_db)):
+    # Điểm tính sẵn trong Task_Risk_Scores; cũ hơn max_staleness (giây) → tính lại trước khi trả
+    return get_task_risks(db, task_ids, max_staleness)
+
+@router.get("/risk/graph")
+def risk_graph_stats():
+    # Kích thước graph thời gian, watermark và số sự kiện mới ở lần refresh gần nhất
+    return graph_store().stats()
+
+@router.get("/models")
+def models_status():
+    # Số lần load / reload và thời gian load của từng model trong process này
+    return registry.stats()
+
+@router.get("/rules/stats")
+def rules_stats():
+    # Số lần khớp của từng rule (bảng rule tự load lại khi ai/rules.json đổi)
+    return rule_stats()
+
+@router.get("/candidates/stats")
+def candidate_index_stats():
+    # Tỉ lệ ứng viên bị loại trước khi chấm điểm và latency ước tính tiết kiệm được
+    return candidate_index.stats()
+
+@router.get("/ordering/stats")
+def ordering_cache_stats():
+    # Cache thứ tự task theo user: hit rate, số lần bị bỏ do DB báo thay đổi
+    return order_cache.stats()
 
-    # 3. LLM sinh câu trả lời tự nhiên
-    reply = generate_response(message, data, db)
+@router.get("/context/stats")
+def context_cache_stats():
+    # Cache context task dùng chung giữa các request: hit rate, số entry bị bỏ do DB báo thay đổi
+    return context_cache.stats()
 
-    return AIResponse(reply=reply, action=action, data=data)
\ No newline at end of file
+@router.get("/llm/stats")
+def llm_stats():
+    # Client Ollama + cache câu trả lời (hit rate, thời gian sinh tiết kiệm được)
+    return {"client": llm.stats(), "cache": llm_cache.stats()}
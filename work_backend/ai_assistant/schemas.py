@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Union
+from config import settings
 
 class ChatMessage(BaseModel):
     user_id: int
@@ -8,4 +9,14 @@ class ChatMessage(BaseModel):
 class AIResponse(BaseModel):
     reply: str
     action: Optional[str] = None
-    data: Optional[Dict] = None
\ No newline at end of file
+    data: Optional[Union[Dict, List]] = None  # action "assignment" trả danh sách ứng viên
+
+class ChatBatchRequest(BaseModel):
+    messages: List[ChatMessage] = Field(..., min_length=1, max_length=settings.CHAT_BATCH_MAX_MESSAGES)
+    stream: bool = False  # True → NDJSON, mỗi dòng 1 kết quả (kèm index) ngay khi xong
+
+class ChatBatchItem(AIResponse):
+    index: int
+
+class ChatBatchResponse(BaseModel):
+    results: List[AIResponse]  # cùng thứ tự với messages
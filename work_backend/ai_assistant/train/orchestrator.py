@@ -0,0 +1,238 @@
+# train/orchestrator.py
+# Chạy các job train độc lập (intent, bandit, risk) song song, tối đa --workers process cùng lúc:
+#   - mỗi job 1 process mới (spawn) + Session / kết nối DB riêng → job lỗi (kể cả bị OOM kill) không kéo
+#     job khác, peak RSS đo được là của riêng job đó
+#   - trạng thái từng job ghi vào models/train_runs/<run_id>/state.json (ghi atomic sau mỗi bước):
+#       pending → running → trained (artifact nằm trong staging) → published  |  failed
+#     chạy lại với --resume: job published bỏ qua, job trained chỉ publish, còn lại train lại
+#   - job ghi model vào thư mục staging của run; chỉ khi job xong không lỗi mới os.replace sang models/
+#     (registry của các process đang serve thấy file đổi → load bản mới). Riêng bandit tự publish dưới
+#     store_lock (phải giữ reward log / watermark nhất quán, xem ai/bandit_retrain.py); watermark
+#     history_id chính là checkpoint của nó — chạy lại chỉ đọc phần lịch sử chưa cộng
+#
+# Chạy: python train/train_intent.py [--jobs intent,bandit,risk] [--workers 3] [--resume] [--full]
+import os
+import sys
+import json
+import time
+import logging
+import traceback
+import multiprocessing
+from datetime import datetime
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    import resource
+except ImportError:  # Windows: không có getrusage, bỏ qua peak RSS
+    resource = None
+
+from ai.model_registry import atomic_write
+
+logger = logging.getLogger(__name__)
+
+RUNS_DIR = os.path.join("models", "train_runs")
+JOBS = ["intent", "bandit", "risk"]
+
+
+# ----- job (chạy trong process con) -----
+def _intent_job(stage_dir: str, full: bool) -> dict:
+    from ai.intent_classifier import train_intent_model, MODEL_DIR
+    paths = train_intent_model(model_dir=os.path.join(stage_dir, "intent_model"))
+    # serving chỉ theo dõi bản export (.npz) — publish sau cùng, pickle chỉ để train / export lại
+    return {"artifacts": [[str(p), str(MODEL_DIR / p.name)] for p in paths]}
+
+
+def _bandit_job(stage_dir: str, full: bool) -> dict:
+    from database import SessionLocal
+    from ai.assignment_bandit import retrain_bandit_from_history
+    db = SessionLocal()
+    try:
+        return {"summary": retrain_bandit_from_history(db, full=full), "artifacts": []}
+    finally:
+        db.close()
+
+
+def _risk_job(stage_dir: str, full: bool) -> dict:
+    from database import SessionLocal
+    from ai.risk_tgn import train_risk_model, export_path_for, MODEL_PATH, EXPORT_PATH
+    staged = os.path.join(stage_dir, os.path.basename(MODEL_PATH))
+    db = SessionLocal()
+    try:
+        summary = train_risk_model(db, model_path=staged)
+    finally:
+        db.close()
+    if summary is None:  # chưa đủ nhãn → không có model mới
+        return {"summary": {"skipped": True}, "artifacts": []}
+    # bản export publish sau cùng → không bao giờ cũ hơn .pth (xem _load_risk_model)
+    return {"summary": summary, "artifacts": [[staged, MODEL_PATH], [export_path_for(staged), EXPORT_PATH]]}
+
+
+JOB_FUNCS = {"intent": _intent_job, "bandit": _bandit_job, "risk": _risk_job}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(kb / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)  # macOS trả byte
+
+
+def _run_job(name: str, stage_dir: str, full: bool):
+    # Entry point trong process con: kết quả (kể cả lỗi) ghi ra stage_dir/result.json cho parent;
+    # process chết giữa chừng → không có file, parent lấy exitcode
+    logging.basicConfig(level=logging.INFO)
+    os.makedirs(stage_dir, exist_ok=True)
+    t0 = time.perf_counter()
+    try:
+        result = JOB_FUNCS[name](stage_dir, full)
+        result["status"] = "trained"
+    except Exception as e:
+        result = {"status": "failed", "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc()}
+    result["duration_s"] = round(time.perf_counter() - t0, 3)
+    result["peak_rss_mb"] = _peak_rss_mb()
+    data = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+    atomic_write(os.path.join(stage_dir, "result.json"), lambda f: f.write(data))
+
+
+# ----- trạng thái run -----
+class TrainRun:
+    def __init__(self, run_dir: str, state: dict):
+        self.run_dir = run_dir
+        self.state = state
+
+    @property
+    def jobs(self) -> Dict[str, dict]:
+        return self.state["jobs"]
+
+    @classmethod
+    def create(cls, jobs: List[str], full: bool, runs_dir: str = RUNS_DIR) -> "TrainRun":
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        run = cls(os.path.join(runs_dir, run_id), {
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "full": full,
+            "jobs": {name: {"status": "pending"} for name in jobs},
+        })
+        run.save()
+        return run
+
+    @classmethod
+    def load(cls, run_dir: str) -> "TrainRun":
+        with open(os.path.join(run_dir, "state.json"), encoding="utf-8") as f:
+            return cls(run_dir, json.load(f))
+
+    @classmethod
+    def latest(cls, runs_dir: str = RUNS_DIR) -> Optional["TrainRun"]:
+        # Run gần nhất còn job chưa publish
+        if not os.path.isdir(runs_dir):
+            return None
+        for run_id in sorted(os.listdir(runs_dir), reverse=True):
+            path = os.path.join(runs_dir, run_id, "state.json")
+            if os.path.exists(path):
+                run = cls.load(os.path.dirname(path))
+                if not run.finished():
+                    return run
+        return None
+
+    def finished(self) -> bool:
+        return all(j["status"] == "published" for j in self.jobs.values())
+
+    def stage_dir(self, name: str) -> str:
+        return os.path.join(self.run_dir, "staging", name)
+
+    def update(self, name: str, **fields):
+        self.jobs[name].update(fields)
+        self.save()
+
+    def save(self):
+        os.makedirs(self.run_dir, exist_ok=True)
+        data = json.dumps(self.state, ensure_ascii=False, indent=2).encode("utf-8")
+        atomic_write(os.path.join(self.run_dir, "state.json"), lambda f: f.write(data))
+
+    def publish(self, name: str):
+        # Artifact trong staging → models/ (os.replace, cùng filesystem → atomic từng file, theo thứ tự job trả về)
+        for src, dst in self.jobs[name].get("artifacts", []):
+            if not os.path.exists(src):
+                if os.path.exists(dst):
+                    continue  # đã chuyển ở lần chạy trước (bị ngắt giữa lúc publish)
+                raise FileNotFoundError(src)
+            os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+            os.replace(src, dst)
+        self.update(name, status="published", published_at=datetime.now().isoformat(timespec="seconds"))
+
+
+def _finish(run: TrainRun, name: str, exitcode: int, elapsed: float):
+    result_path = os.path.join(run.stage_dir(name), "result.json")
+    if os.path.exists(result_path):
+        with open(result_path, encoding="utf-8") as f:
+            result = json.load(f)
+    else:
+        result = {"status": "failed", "error": f"process thoát với mã {exitcode} (bị kill / hết bộ nhớ?)",
+                  "duration_s": round(elapsed, 3), "peak_rss_mb": None}
+    run.update(name, **result)
+    if result["status"] == "failed":
+        logger.error(f"Job {name} lỗi: {result['error']}")
+        return
+    try:
+        run.publish(name)
+    except Exception as e:
+        run.update(name, status="failed", error=f"publish: {type(e).__name__}: {e}")
+        logger.error(f"Job {name} publish lỗi: {e}")
+        return
+    logger.info(f"Job {name} xong: {result['duration_s']}s, peak RSS {result['peak_rss_mb']} MB")
+
+
+def train_all(jobs: Optional[List[str]] = None, workers: Optional[int] = None, resume: bool = False,
+              full: bool = False) -> dict:
+    jobs = jobs or JOBS
+    run = TrainRun.latest() if resume else None
+    if run is None:
+        run = TrainRun.create(jobs, full)
+    else:
+        logger.info(f"Tiếp tục run {run.state['run_id']}")
+        for name in jobs:
+            run.jobs.setdefault(name, {"status": "pending"})
+
+    todo = []
+    for name in jobs:
+        status = run.jobs[name]["status"]
+        if status == "published":
+            continue
+        if status == "trained":
+            run.publish(name)  # đã train xong ở lần trước, chỉ còn bước publish
+            continue
+        todo.append(name)
+
+    ctx = multiprocessing.get_context("spawn")  # không fork process đang giữ kết nối DB / thread
+    workers = max(1, workers or len(todo))
+    running = {}
+    try:
+        while todo or running:
+            while todo and len(running) < workers:
+                name = todo.pop(0)
+                result_path = os.path.join(run.stage_dir(name), "result.json")
+                if os.path.exists(result_path):
+                    os.remove(result_path)
+                proc = ctx.Process(target=_run_job, args=(name, run.stage_dir(name), run.state["full"]),
+                                   name=f"train-{name}")
+                proc.start()
+                running[name] = (proc, time.perf_counter())
+                run.update(name, status="running", started_at=datetime.now().isoformat(timespec="seconds"),
+                           error=None, traceback=None)
+            for name in [n for n, (p, _) in running.items() if not p.is_alive()]:
+                proc, started = running.pop(name)
+                proc.join()
+                _finish(run, name, proc.exitcode, time.perf_counter() - started)
+            time.sleep(0.2)
+    finally:
+        for proc, _ in running.values():  # Ctrl+C → dừng job đang chạy, state giữ "running" → --resume chạy lại
+            proc.terminate()
+            proc.join()
+
+    summary = {name: {k: v for k, v in run.jobs[name].items() if k not in ("traceback", "artifacts")} for name in jobs}
+    logger.info(f"Run {run.state['run_id']}: " + json.dumps(summary, ensure_ascii=False))
+    return run.state
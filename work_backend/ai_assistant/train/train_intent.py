@@ -1,41 +1,42 @@
 # train/train_intent.py
 import sys
 import os
+import argparse
+import logging
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-if ROOT_DIR not in sys.path:
-    sys.path.insert(0, ROOT_DIR)
+TRAIN_DIR = os.path.dirname(os.path.abspath(__file__))
+for p in (ROOT_DIR, TRAIN_DIR):
+    if p not in sys.path:
+        sys.path.insert(0, p)
 
-print(f"Project root: {ROOT_DIR}")
+# Import model (torch, sklearn...) nằm trong từng job ở process con (train/orchestrator.py),
+# process này chỉ điều phối → job lỗi không làm mất kết quả của job khác
+from orchestrator import JOBS, train_all as run_jobs
 
-try:
-    from ai.intent_classifier import train_intent_model
-    from ai.assignment_bandit import retrain_bandit_from_history  # SỬA: Import hàm đúng để retrain
-    from ai.risk_tgn import train_risk_model
-    from database import SessionLocal
-    print("Import tất cả module thành công!")
-except Exception as e:
-    print(f"Lỗi import: {e}")
-    sys.exit(1)
 
-def train_all():
+def train_all(jobs=None, workers=None, resume: bool = False, full: bool = False) -> dict:
     print("\nBắt đầu train toàn bộ AI models...\n")
+    state = run_jobs(jobs, workers=workers, resume=resume, full=full)
+    for name, job in state["jobs"].items():
+        line = f"  {name:<7} {job['status']:<10} {job.get('duration_s', '-')}s  peak RSS {job.get('peak_rss_mb', '-')} MB"
+        if job.get("error"):
+            line += f"  ({job['error']})"
+        print(line)
+    return state
 
-    print("1. Training Intent Classifier...")
-    train_intent_model()
-
-    db = SessionLocal()
-    try:
-        print("2. Training Assignment Bandit Agent...")
-        retrain_bandit_from_history(db)  # SỬA: Gọi hàm retrain đúng, không phải suggest_assignee_bandit
-
-        print("3. Training Risk TGN Model...")
-        train_risk_model(db)  # ĐÃ FIX → CHẠY MƯỢT
-    except Exception as e:
-        print(f"Lỗi khi train model dùng DB: {e}")
-        print("   → Có thể chưa có dữ liệu lịch sử. Vẫn tiếp tục...")
-    finally:
-        db.close()
 
 if __name__ == "__main__":
-    train_all()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", default=",".join(JOBS), help=f"Trong {', '.join(JOBS)}, cách nhau dấu phẩy")
+    parser.add_argument("--workers", type=int, help="Số job chạy cùng lúc (mặc định: tất cả)")
+    parser.add_argument("--resume", action="store_true", help="Tiếp tục run gần nhất chưa xong")
+    parser.add_argument("--full", action="store_true", help="Bandit train lại từ đầu thay vì từ watermark")
+    args = parser.parse_args()
+    jobs = [j for j in args.jobs.split(",") if j]
+    unknown = set(jobs) - set(JOBS)
+    if unknown:
+        parser.error(f"job không hợp lệ: {', '.join(sorted(unknown))}")
+    state = train_all(jobs, workers=args.workers, resume=args.resume, full=args.full)
+    sys.exit(0 if all(j["status"] == "published" for j in state["jobs"].values()) else 1)
@@ -1,10 +1,99 @@
 // src/services/ai.services.ts
 import { pool } from '../config/database';
-import { exec } from 'child_process';
-import { promisify } from 'util';
+import { spawn, ChildProcess } from 'child_process';
+import { createConnection, Socket } from 'net';
+import { createInterface } from 'readline';
 import axios from 'axios';
 
-const execAsync = promisify(exec);
+interface PendingCall {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
+// Client cho ai_assistant/ai_worker.py: giữ 1 process Python sống lâu (model + DB pool load sẵn),
+// gửi request JSON theo từng dòng qua stdin/stdout, hoặc qua unix socket nếu có AI_WORKER_SOCKET.
+class AiWorkerClient {
+  private proc: ChildProcess | null = null;
+  private socket: Socket | null = null;
+  private pending = new Map<number, PendingCall>();
+  private nextId = 1;
+
+  constructor(
+    private readonly socketPath = process.env.AI_WORKER_SOCKET,
+    private readonly timeoutMs = Number(process.env.AI_WORKER_TIMEOUT_MS ?? 30000),
+  ) {}
+
+  private ensureStarted(): NodeJS.WritableStream {
+    if (this.socketPath) {
+      if (!this.socket || this.socket.destroyed) {
+        this.socket = createConnection(this.socketPath);
+        this.attach(this.socket);
+        this.socket.on('error', (err) => this.failAll(err));
+        this.socket.on('close', () => {
+          this.socket = null;
+          this.failAll(new Error('AI worker socket closed'));
+        });
+      }
+      return this.socket;
+    }
+
+    if (!this.proc || this.proc.exitCode !== null) {
+      const proc = spawn(process.env.AI_PYTHON ?? 'python', ['ai_assistant/ai_worker.py'], {
+        stdio: ['pipe', 'pipe', 'inherit'],
+      });
+      this.attach(proc.stdout!);
+      proc.on('exit', (code) => {
+        this.proc = null;
+        this.failAll(new Error(`AI worker exited (code ${code})`));
+      });
+      this.proc = proc;
+    }
+    return this.proc.stdin!;
+  }
+
+  private attach(stream: NodeJS.ReadableStream) {
+    const rl = createInterface({ input: stream });
+    rl.on('line', (line) => {
+      let msg: any;
+      try {
+        msg = JSON.parse(line);
+      } catch {
+        console.warn('AI worker output invalid:', line.substring(0, 200));
+        return;
+      }
+      const call = this.pending.get(msg.id);
+      if (!call) return; // "ready" hoặc response đã timeout
+      this.pending.delete(msg.id);
+      clearTimeout(call.timer);
+      if (msg.ok) call.resolve(msg.result);
+      else call.reject(new Error(msg.error ?? 'AI worker error'));
+    });
+  }
+
+  private failAll(err: Error) {
+    for (const [id, call] of this.pending) {
+      clearTimeout(call.timer);
+      call.reject(err);
+      this.pending.delete(id);
+    }
+  }
+
+  call<T = any>(op: string, args: Record<string, unknown>): Promise<T> {
+    const input = this.ensureStarted();
+    const id = this.nextId++;
+    return new Promise<T>((resolve, reject) => {
+      const timer = setTimeout(() => {
+        this.pending.delete(id);
+        reject(new Error(`AI worker timeout (${op})`));
+      }, this.timeoutMs);
+      this.pending.set(id, { resolve, reject, timer });
+      input.write(JSON.stringify({ id, op, args }) + '\n');
+    });
+  }
+}
+
+const aiWorker = new AiWorkerClient();
 
 async function queryOllama(prompt: string): Promise<string> {
   try {
@@ -35,10 +124,7 @@ export class AiService {
   async handleChat(userId: number, message: string): Promise<string> {
     let client: any = null;
     try {
-      const { stdout: intentStdout } = await execAsync(
-        `python ai_assistant/intent_classifier_wrapper.py "${message.replace(/"/g, '\\"')}"`,
-      );
-      const { intent } = JSON.parse(intentStdout.trim());
+      const { intent } = await aiWorker.call<{ intent: string }>('intent', { message });
 
       switch (intent) {
         case 'greeting':
@@ -70,16 +156,14 @@ export class AiService {
 
   async suggestAssignment(taskId: string): Promise<string> {
     try {
-      const { stdout } = await execAsync(
-        `python ai_assistant/assignment_suggester_wrapper.py ${taskId}`,
+      const suggestions = await aiWorker.call<{ name: string; ucb_score: number; reason: string }[]>(
+        'assignment',
+        { task_id: taskId },
       );
-      const output = stdout.trim();
-      if (!output.startsWith('[')) {
-        console.warn('Suggest output invalid:', output);
-        return `Lỗi dữ liệu: ${output.substring(0, 200)}`;
+      if (!Array.isArray(suggestions)) {
+        console.warn('Suggest output invalid:', suggestions);
+        return `Lỗi dữ liệu: ${JSON.stringify(suggestions).substring(0, 200)}`;
       }
-
-      const suggestions: { name: string; ucb_score: number; reason: string }[] = JSON.parse(output);
       if (!suggestions.length) return 'Không có gợi ý phù hợp cho task này.';
 
       const top = suggestions[0];
@@ -105,10 +189,8 @@ export class AiService {
   async predictTaskRisk(taskId: string): Promise<string> {
     let client: any = null;
     try {
-      const { stdout } = await execAsync(
-        `python ai_assistant/risk_predictor_wrapper.py ${taskId}`,
-      );
-      const [probStr, level] = stdout.trim().split(',');
+      const output = await aiWorker.call<string>('risk', { task_id: taskId });
+      const [probStr, level] = output.trim().split(',');
       const prob = parseFloat(probStr);
 
       client = await pool.connect();
@@ -149,10 +231,7 @@ export class AiService {
 
   async suggestTaskOrder(userId: string): Promise<string> {
     try {
-      const { stdout } = await execAsync(
-        `python ai_assistant/task_ordering_wrapper.py ${userId}`,
-      );
-      const tasks: TaskOrderItem[] = JSON.parse(stdout.trim());
+      const tasks = await aiWorker.call<TaskOrderItem[]>('ordering', { user_id: userId });
 
       if (!tasks.length) return 'Bạn hiện không có task nào cần ưu tiên.';
 
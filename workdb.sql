@@ -15,6 +15,7 @@ DROP TABLE IF EXISTS Messages CASCADE;
 DROP TABLE IF EXISTS ChatroomMembers CASCADE;
 DROP TABLE IF EXISTS Chatrooms CASCADE;
 
+DROP TABLE IF EXISTS Task_Risk_Scores CASCADE;
 DROP TABLE IF EXISTS Taskhistories CASCADE;
 DROP TABLE IF EXISTS Taskprogresses CASCADE;
 DROP TABLE IF EXISTS TaskStatuses CASCADE;
@@ -799,10 +800,14 @@ CREATE INDEX IF NOT EXISTS idx_tasks_priority      ON Tasks(priority);
 -- TaskAssignments
 CREATE INDEX IF NOT EXISTS idx_taskassignments_task_id ON TaskAssignments(task_id);
 CREATE INDEX IF NOT EXISTS idx_taskassignments_user_id ON TaskAssignments(user_id);
+-- Thứ tự task theo user (ai/task_ordering.py): join user → task chỉ đọc index
+CREATE INDEX IF NOT EXISTS idx_taskassignments_user_task ON TaskAssignments(user_id, task_id);
 
 -- TaskStatuses
 CREATE INDEX IF NOT EXISTS idx_taskstatuses_task_current 
     ON TaskStatuses(task_id) WHERE is_current = TRUE;
+CREATE INDEX IF NOT EXISTS idx_taskstatuses_current_status
+    ON TaskStatuses(task_id, status_name) WHERE is_current;
 
 -- Taskprogresses
 CREATE INDEX IF NOT EXISTS idx_taskprogresses_task_user 
@@ -1028,6 +1033,48 @@ BEGIN
     RETURN NEW;
 END;
 $$ LANGUAGE plpgsql;
+-- 6. notify_task_order_changed: báo cho AI service (LISTEN task_order_changed, ai/task_ordering.py)
+--    danh sách user_id có thứ tự task cần tính lại; quá dài → '*' (tính lại tất cả)
+CREATE OR REPLACE FUNCTION notify_task_order_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    users TEXT;
+BEGIN
+    IF TG_TABLE_NAME = 'taskassignments' THEN
+        IF TG_OP = 'DELETE' THEN
+            users := OLD.user_id::TEXT;
+        ELSIF TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id THEN
+            users := OLD.user_id || ',' || NEW.user_id;
+        ELSE
+            users := NEW.user_id::TEXT;
+        END IF;
+    ELSE
+        SELECT string_agg(user_id::TEXT, ',') INTO users
+        FROM TaskAssignments
+        WHERE task_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.task_id ELSE NEW.task_id END;
+    END IF;
+
+    IF users IS NOT NULL THEN
+        PERFORM pg_notify('task_order_changed', CASE WHEN length(users) > 7900 THEN '*' ELSE users END);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_taskassignments_order_changed
+AFTER INSERT OR UPDATE OR DELETE ON TaskAssignments
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_order_changed();
+
+CREATE TRIGGER trg_taskstatuses_order_changed
+AFTER INSERT OR UPDATE OF status_name, is_current OR DELETE ON TaskStatuses
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_order_changed();
+
+CREATE TRIGGER trg_tasks_order_changed
+AFTER UPDATE OF title, priority, due_date ON Tasks
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_order_changed();
 
 ALTER TABLE Accounts
 ALTER COLUMN user_id DROP NOT NULL;
@@ -1085,4 +1132,96 @@ INSERT INTO Task_Required_Skills (task_id, skill_name, required_level) VALUES
 -- Task 2: "Nghiên cứu bcrypt" → cần Node.js level 7+
 INSERT INTO Task_Required_Skills (task_id, skill_name, required_level) VALUES
 (2, 'Node.js', 7),
-(2, 'Cryptography', 5);
\ No newline at end of file
+(2, 'Cryptography', 5);
+
+-- Điểm rủi ro tính sẵn cho từng task (ai_assistant/ai/risk_scores.py).
+-- input_fingerprint = hash các input của model (tiến độ, trạng thái, hạn chót, phân công)
+-- → bộ refresh chỉ tính lại task có fingerprint hoặc model_version thay đổi.
+CREATE TABLE IF NOT EXISTS Task_Risk_Scores (
+    task_id INTEGER PRIMARY KEY,
+    risk_score REAL NOT NULL CHECK (risk_score BETWEEN 0 AND 1),
+    risk_level VARCHAR(20) NOT NULL,
+    top_factors JSONB NOT NULL DEFAULT '[]',
+    model_version VARCHAR(64) NOT NULL,
+    input_fingerprint CHAR(32) NOT NULL,
+    computed_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (task_id) REFERENCES Tasks(task_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_task_risk_scores_level ON Task_Risk_Scores(risk_level, risk_score DESC);
+
+-- 7. notify_task_context_changed: báo cho AI service (LISTEN task_context_changed, ai/db_integration.py)
+--    task_id có context (title, hạn chót, người làm chính, tiến độ, kỹ năng cần) cần đọc lại;
+--    đổi tên user → mọi task user đó làm chính, quá dài → '*' (đọc lại tất cả)
+CREATE OR REPLACE FUNCTION notify_task_context_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    tasks TEXT;
+BEGIN
+    IF TG_TABLE_NAME = 'users' THEN
+        SELECT string_agg(task_id::TEXT, ',') INTO tasks
+        FROM TaskAssignments
+        WHERE user_id = NEW.user_id AND is_main_assignee;
+    ELSIF TG_OP = 'DELETE' THEN
+        tasks := OLD.task_id::TEXT;
+    ELSIF TG_OP = 'UPDATE' AND OLD.task_id IS DISTINCT FROM NEW.task_id THEN
+        tasks := OLD.task_id || ',' || NEW.task_id;
+    ELSE
+        tasks := NEW.task_id::TEXT;
+    END IF;
+
+    IF tasks IS NOT NULL THEN
+        PERFORM pg_notify('task_context_changed', CASE WHEN length(tasks) > 7900 THEN '*' ELSE tasks END);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_tasks_context_changed
+AFTER INSERT OR UPDATE OF title, priority, due_date OR DELETE ON Tasks
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_context_changed();
+
+CREATE TRIGGER trg_taskassignments_context_changed
+AFTER INSERT OR UPDATE OR DELETE ON TaskAssignments
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_context_changed();
+
+CREATE TRIGGER trg_taskprogresses_context_changed
+AFTER INSERT OR UPDATE OR DELETE ON Taskprogresses
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_context_changed();
+
+CREATE TRIGGER trg_task_required_skills_context_changed
+AFTER INSERT OR UPDATE OR DELETE ON Task_Required_Skills
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_context_changed();
+
+CREATE TRIGGER trg_users_context_changed
+AFTER UPDATE OF first_name, last_name ON Users
+FOR EACH ROW
+EXECUTE PROCEDURE notify_task_context_changed();
+
+-- 8. notify_candidates_changed: báo cho AI service (LISTEN candidates_changed, ai/candidate_index.py)
+--    user_id có skill / trạng thái / phòng ban đổi; xóa dòng → '*' (index dựng lại toàn bộ)
+CREATE OR REPLACE FUNCTION notify_candidates_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.user_id IS DISTINCT FROM NEW.user_id) THEN
+        PERFORM pg_notify('candidates_changed', '*');
+    ELSE
+        PERFORM pg_notify('candidates_changed', NEW.user_id::TEXT);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_user_skills_candidates_changed
+AFTER INSERT OR UPDATE OR DELETE ON User_skills
+FOR EACH ROW
+EXECUTE PROCEDURE notify_candidates_changed();
+
+CREATE TRIGGER trg_users_candidates_changed
+AFTER INSERT OR UPDATE OF status, department_id OR DELETE ON Users
+FOR EACH ROW
+EXECUTE PROCEDURE notify_candidates_changed();